@@ -1,6 +1,8 @@
 from app import create_app
 
-app = create_app()
+# profiling workers are spawned and import this file again as __mp_main__; they need no app
+if __name__ != '__mp_main__':
+    app = create_app()
 
 # This is the entry point for Vercel
 if __name__ == '__main__':
@@ -1,14 +1,60 @@
 import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from . import serialize, shared
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 db = SQLAlchemy()
 
 
-def create_app():
+def ensure_schema(version):
+    """Create missing tables and indexes unless the SQLite file already records this schema version
+
+    Returns the version the file had before, or None for other databases.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        db.create_all()
+        return None
+    with db.engine.connect() as conn:
+        current = conn.exec_driver_sql('PRAGMA user_version').scalar()
+        if current == version:
+            return current
+        db.create_all()
+        # create_all skips indexes added to tables that already exist
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        conn.exec_driver_sql(f'PRAGMA user_version = {int(version)}')
+        conn.commit()
+    return current
+
+
+def engine_options(uri, pool_size):
+    """SQLAlchemy engine options; SQLite waits for locks instead of failing at once"""
+    if not uri.startswith('sqlite:///') or uri in ('sqlite:///', 'sqlite:///:memory:'):
+        # other databases keep their defaults; in-memory SQLite lives on one connection
+        return {}
+    return {'pool_size': pool_size, 'max_overflow': pool_size, 'connect_args': {'timeout': 30}}
+
+
+def tune_sqlite(engine):
+    """Open every SQLite connection in WAL mode, so readers never wait for the writer"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'connect')
+    def _connected(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        # with WAL, NORMAL only syncs at checkpoints and stays safe against corruption
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+
+def create_app(config=None):
     app = Flask(__name__, static_folder="static", template_folder="templates")
+    # responses serialize NumPy arrays directly, with orjson when it is installed
+    app.json = serialize.JSONProvider(app)
 
     root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     
@@ -30,14 +76,51 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['UPLOAD_FOLDER'] = upload_path
+    # byte budget for parsed columns kept in memory by each worker process
+    app.config['FRAME_CACHE_BYTES'] = int(os.environ.get('FRAME_CACHE_BYTES', 256 * 1024 * 1024))
+    # byte budget for columns memory-mapped by every worker from one shared copy; 0 turns sharing off,
+    # as a serverless instance is a single process
+    app.config['SHARED_CACHE_BYTES'] = int(os.environ.get('SHARED_CACHE_BYTES',
+                                                          0 if is_vercel else 1024 * 1024 * 1024))
+    # largest number of labels a /api/query response carries unless the request sends a limit
+    app.config['CHART_MAX_POINTS'] = int(os.environ.get('CHART_MAX_POINTS', 1000))
+    # above this many rows histograms and quartiles are streamed unless exact=true is sent
+    app.config['EXACT_MAX_ROWS'] = int(os.environ.get('EXACT_MAX_ROWS', 1000000))
+    # total size of serialized chart, predict and analyze responses kept in the database
+    app.config['RESULT_CACHE_BYTES'] = int(os.environ.get('RESULT_CACHE_BYTES', 64 * 1024 * 1024))
+    # uploads and "async" analyses run on this many background threads per worker process;
+    # serverless hosts stop work once the response is sent, so jobs run inline there
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+    app.config['JOBS_INLINE'] = os.environ.get('JOBS_INLINE', '1' if is_vercel else '0') == '1'
+    # hash tables of the smaller inputs to /api/query above this size are joined partition by partition
+    app.config['QUERY_MEMORY_BYTES'] = int(os.environ.get('QUERY_MEMORY_BYTES', 256 * 1024 * 1024))
+    # requests and jobs slower than this many milliseconds keep a cProfile report; 0 turns profiling off
+    app.config['PROFILE_SLOW_MS'] = int(os.environ.get('PROFILE_SLOW_MS', 0))
+    # processes profiling the columns of large uploads in parallel; 0 or 1 profiles in the job thread
+    app.config['PROFILING_WORKERS'] = int(os.environ.get('PROFILING_WORKERS',
+                                                         0 if is_vercel else min(os.cpu_count() or 1, 4)))
+    # pooled database connections per worker process, shared by requests and job threads
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+    # explicit overrides, e.g. a scratch database and upload folder for benchmarks
+    if config:
+        app.config.update(config)
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # where the shared columns live; by default in shared memory, one directory per upload folder
+    app.config.setdefault('SHARED_CACHE_DIR', os.environ.get('SHARED_CACHE_DIR') or
+                          shared.default_root(app.config['UPLOAD_FOLDER']))
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI'],
+                                                                      app.config['DB_POOL_SIZE']))
 
     db.init_app(app)
 
     with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            tune_sqlite(db.engine)
         # import routes and models so they are registered
         from . import models  # noqa: F401
         from . import routes  # noqa: F401
-        db.create_all()
+        models.migrate(ensure_schema(models.SCHEMA_VERSION))
+        # jobs left queued or running by processes that have since stopped
+        routes.job_runner.recover()
 
     return app
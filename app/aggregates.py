@@ -0,0 +1,129 @@
+import json
+import numpy as np
+import pandas as pd
+from sqlalchemy.exc import IntegrityError
+from . import db, metrics
+from .models import Aggregate
+
+# x columns with at most this many distinct values are summarised at upload
+EAGER_MAX_GROUPS = 50
+EAGER_MAX_PAIRS = 100
+
+
+class GroupSummary:
+    """Per-group count/sum/sum-of-squares/min/max of y for every value of x
+
+    Groups are kept in groupby order (sorted by the x value) and labelled with
+    the x value as a string, the same labels the chart endpoints return.
+    """
+
+    FIELDS = ('count', 'sum', 'sumsq', 'min', 'max')
+
+    def __init__(self, labels, count, total, sumsq, minimum, maximum):
+        self.labels = list(labels)
+        self.count = np.asarray(count, dtype=np.float64)
+        self.total = np.asarray(total, dtype=np.float64)
+        self.sumsq = np.asarray(sumsq, dtype=np.float64)
+        self.minimum = np.asarray(minimum, dtype=np.float64)
+        self.maximum = np.asarray(maximum, dtype=np.float64)
+
+    @classmethod
+    def from_frame(cls, df, xcol, ycol):
+        y = df[ycol].astype(np.float64)
+        # observed=True leaves out categories of a categorical x with no rows
+        grouped = y.groupby(df[xcol], observed=True)
+        stats = grouped.agg(['count', 'sum', 'min', 'max'])
+        sumsq = (y * y).groupby(df[xcol], observed=True).sum()
+        return cls(stats.index.astype(str), stats['count'], stats['sum'], sumsq,
+                   stats['min'], stats['max'])
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        return cls(data['labels'], *(data[f] for f in cls.FIELDS))
+
+    def to_json(self):
+        arrays = (self.count, self.total, self.sumsq, self.minimum, self.maximum)
+        data = {'labels': self.labels}
+        data.update({f: a.tolist() for f, a in zip(self.FIELDS, arrays)})
+        return json.dumps(data)
+
+    def _series(self, values):
+        return pd.Series(values, index=pd.Index(self.labels, dtype=object))
+
+    def sum(self):
+        return self._series(self.total)
+
+    def mean(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._series(self.total / self.count)
+
+    def std(self):
+        """Sample standard deviation per group, NaN below two values"""
+        n = self.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = (self.sumsq - self.total * self.total / n) / (n - 1)
+        var = np.where(n > 1, np.maximum(var, 0.0), np.nan)
+        return self._series(np.sqrt(var))
+
+    def range(self):
+        return self._series(self.maximum - self.minimum)
+
+    def pooled(self, indices, stat='mean'):
+        """Sum or mean of y over the rows of several groups taken together"""
+        total = self.total[indices].sum()
+        if stat == 'sum':
+            return total
+        count = self.count[indices].sum()
+        return total / count if count else 0.0
+
+    def top(self, k, stat='mean'):
+        return getattr(self, stat)().nlargest(k)
+
+
+def lookup(ds_id, xcol, ycol):
+    row = Aggregate.query.filter_by(dataset_id=ds_id, x_column=xcol, y_column=ycol).first()
+    return GroupSummary.from_json(row.summary_json) if row is not None else None
+
+
+def save(ds_id, xcol, ycol, summary):
+    db.session.add(Aggregate(dataset_id=ds_id, x_column=xcol, y_column=ycol,
+                             summary_json=summary.to_json()))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # another request stored the same pair first
+        db.session.rollback()
+
+
+def get_summary(ds_id, xcol, ycol, load):
+    """Return the stored summary for (x, y), building it from load() on first use"""
+    def build():
+        frame = load()
+        with metrics.phase('groupby'):
+            return GroupSummary.from_frame(frame, xcol, ycol)
+    return get_stored(ds_id, xcol, ycol, build)
+
+
+def get_stored(ds_id, xcol, ycol, build):
+    """Return the summary stored under (x, y), saving build() on first use"""
+    summary = lookup(ds_id, xcol, ycol)
+    if summary is None:
+        summary = build()
+        save(ds_id, xcol, ycol, summary)
+    return summary
+
+
+def build_eager(ds_id, meta, load):
+    """Summarise low-cardinality categorical x columns against numeric y columns"""
+    columns = meta.get('columns', [])
+    xs = [c['name'] for c in columns
+          if not c['is_numeric'] and c['unique_count'] <= EAGER_MAX_GROUPS]
+    ys = [c['name'] for c in columns if c['is_numeric']]
+    pairs = [(x, y) for x in xs for y in ys][:EAGER_MAX_PAIRS]
+    for xcol in dict.fromkeys(x for x, _ in pairs):
+        df = load([xcol] + [y for x, y in pairs if x == xcol])
+        for ycol in [y for x, y in pairs if x == xcol]:
+            db.session.add(Aggregate(dataset_id=ds_id, x_column=xcol, y_column=ycol,
+                                     summary_json=GroupSummary.from_frame(df, xcol, ycol).to_json()))
+    db.session.commit()
@@ -0,0 +1,276 @@
+import numpy as np
+import pandas as pd
+
+
+def describe_groups(grouped):
+    """Statistics of per-group values shared by the bar, line and pie reports"""
+    quartiles = grouped.quantile([0.25, 0.75])
+    return {
+        'values': grouped,
+        'count': len(grouped),
+        'max': grouped.max(),
+        'min': grouped.min(),
+        'mean': grouped.mean(),
+        'median': grouped.median(),
+        'std': grouped.std(),
+        'sum': grouped.sum(),
+        'q1': quartiles.iloc[0],
+        'q3': quartiles.iloc[1],
+    }
+
+
+def describe_values(values):
+    """Distribution statistics of a numeric column from a single sort
+
+    Sums run over the values in their original order so mean and standard
+    deviation agree bit for bit with the pandas reductions they replace.
+    """
+    values = np.asarray(values)
+    if values.dtype == bool:
+        values = values.astype(np.float64)
+    n = len(values)
+    is_int = values.dtype.kind in 'iu'
+    floats = values.astype(np.float64) if is_int else values
+    mean = values.sum(dtype=np.float64) / n if n else np.nan
+    avg = floats.sum(dtype=np.float64) / n if n else np.nan
+    std = np.sqrt(((avg - floats) ** 2).sum(dtype=np.float64) / (n - 1)) if n > 1 else np.nan
+
+    ordered = np.sort(floats)
+    if n:
+        mid = n // 2
+        median = ordered[mid] if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+        q1, q2, q3 = np.percentile(ordered, [25, 50, 75])
+        # runs of equal values in the sorted array give the mode
+        starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+        runs = np.diff(np.r_[starts, n])
+        mode = ordered[starts[np.argmax(runs)]]
+        iqr = q3 - q1
+        low = np.searchsorted(ordered, q1 - 1.5 * iqr, side='left')
+        high = n - np.searchsorted(ordered, q3 + 1.5 * iqr, side='right')
+        outliers = int(low + high)
+        minimum, maximum = ordered[0], ordered[-1]
+    else:
+        median = q1 = q2 = q3 = mode = minimum = maximum = np.nan
+        outliers = 0
+    return {
+        'count': n,
+        'mean': mean,
+        'median': median,
+        'mode': mode if n else None,
+        'std': std,
+        'min': minimum,
+        'max': maximum,
+        'q1': q1,
+        'q2': q2,
+        'q3': q3,
+        'outliers': outliers,
+    }
+
+
+class AnalysisEngine:
+    """Builds every /analyze report from one grouped summary and one sorted x pass"""
+
+    def __init__(self, xcol, ycol=None, summary=None, x_values=None, x_stats=None):
+        self.xcol = xcol
+        self.ycol = ycol
+        self.means = describe_groups(summary.mean()) if summary is not None else None
+        self.sums = describe_groups(summary.sum()) if summary is not None else None
+        # x_stats comes precomputed when the column was streamed through sketches
+        self.dist = describe_values(x_values) if x_values is not None else x_stats
+
+    def reports(self):
+        reports = []
+        if self.means is not None:
+            reports.append({'serial': 1, 'chart_type': 'Bar Chart', 'icon': '📊',
+                            'analysis': self.bar_chart()})
+            reports.append({'serial': 2, 'chart_type': 'Line Chart', 'icon': '📈',
+                            'analysis': self.line_chart()})
+            reports.append({'serial': 3, 'chart_type': 'Pie Chart', 'icon': '🥧',
+                            'analysis': self.pie_chart()})
+        if self.dist is not None:
+            reports.append({'serial': 4, 'chart_type': 'Histogram', 'icon': '📉',
+                            'analysis': self.histogram()})
+        return reports
+
+    def bar_chart(self):
+        """Analyze bar chart data and generate insights"""
+        stats = self.means
+        grouped = stats['values']
+
+        insights = {
+            'summary': f'Analyzing {stats["count"]} categories by average {self.ycol}',
+            'statistics': {
+                'total_categories': int(stats['count']),
+                'highest_value': float(stats['max']),
+                'lowest_value': float(stats['min']),
+                'average_value': float(stats['mean']),
+                'median_value': float(stats['median']),
+                'std_deviation': float(stats['std'])
+            },
+            'top_performers': [],
+            'bottom_performers': [],
+            'key_insights': []
+        }
+
+        # Top and bottom 3 categories
+        for idx, (category, value) in enumerate(grouped.nlargest(3).items(), 1):
+            insights['top_performers'].append({'rank': idx, 'category': str(category), 'value': float(value)})
+        for idx, (category, value) in enumerate(grouped.nsmallest(3).items(), 1):
+            insights['bottom_performers'].append({'rank': idx, 'category': str(category), 'value': float(value)})
+
+        # Generate key insights
+        value_range = stats['max'] - stats['min']
+        insights['key_insights'].append(f"The data spans a range of {value_range:.2f} units")
+
+        if stats['std'] / stats['mean'] > 0.5:
+            insights['key_insights'].append("High variability detected across categories")
+        else:
+            insights['key_insights'].append("Relatively consistent values across categories")
+
+        # Check for outliers
+        iqr = stats['q3'] - stats['q1']
+        outliers = grouped[(grouped < stats['q1'] - 1.5 * iqr) | (grouped > stats['q3'] + 1.5 * iqr)]
+        if len(outliers) > 0:
+            insights['key_insights'].append(f"Found {len(outliers)} potential outlier(s)")
+
+        return insights
+
+    def line_chart(self):
+        """Analyze line chart data for trends"""
+        stats = self.means
+        # summary groups are already in x order
+        grouped = stats['values']
+
+        insights = {
+            'summary': f'Trend analysis of {self.ycol} over {self.xcol}',
+            'statistics': {
+                'data_points': int(stats['count']),
+                # an empty grouping (e.g. a resample with no dated rows) has no first or last value
+                'starting_value': float(grouped.iloc[0]) if len(grouped) else None,
+                'ending_value': float(grouped.iloc[-1]) if len(grouped) else None,
+                'peak_value': float(stats['max']),
+                'lowest_value': float(stats['min']),
+                'average_value': float(stats['mean'])
+            },
+            'trend_analysis': {},
+            'key_insights': []
+        }
+
+        values = grouped.values
+        if len(values) > 1:
+            slope = np.polyfit(np.arange(len(values)), values, 1)[0]
+            if slope > 0:
+                trend, trend_emoji = 'Upward', '📈'
+            elif slope < 0:
+                trend, trend_emoji = 'Downward', '📉'
+            else:
+                trend, trend_emoji = 'Stable', '➡️'
+
+            change_pct = (grouped.iloc[-1] - grouped.iloc[0]) / grouped.iloc[0] * 100
+            insights['trend_analysis'] = {
+                'direction': trend,
+                'emoji': trend_emoji,
+                'slope': float(slope),
+                'change_rate': f"{change_pct:.2f}%"
+            }
+
+            insights['key_insights'].append(f"Overall change: {change_pct:+.2f}% from start to end")
+            volatility = stats['std'] / stats['mean'] * 100
+            insights['key_insights'].append(f"Volatility index: {volatility:.2f}%")
+            insights['key_insights'].append(f"Peak at {grouped.idxmax()}, Trough at {grouped.idxmin()}")
+
+        return insights
+
+    def pie_chart(self):
+        """Analyze pie chart distribution"""
+        stats = self.sums
+        grouped = stats['values']
+        total = stats['sum']
+
+        insights = {
+            'summary': f'Distribution analysis of {self.ycol} across {self.xcol} categories',
+            'statistics': {
+                'total_value': float(total),
+                'number_of_segments': int(stats['count']),
+                'largest_segment_value': float(stats['max']),
+                'smallest_segment_value': float(stats['min']),
+                'average_segment_value': float(stats['mean'])
+            },
+            'distribution': [],
+            'key_insights': []
+        }
+
+        # Calculate percentages
+        percentages = (grouped / total * 100).sort_values(ascending=False)
+        for idx, (category, pct) in enumerate(percentages.items(), 1):
+            insights['distribution'].append({
+                'rank': idx,
+                'category': str(category),
+                'value': float(grouped[category]),
+                'percentage': f"{pct:.2f}%"
+            })
+
+        top_segment = percentages.iloc[0]
+        insights['key_insights'].append(f"Largest segment: {percentages.index[0]} ({top_segment:.2f}%)")
+
+        top_3_total = percentages.head(3).sum()
+        if top_3_total > 70:
+            insights['key_insights'].append(f"High concentration: Top 3 segments represent {top_3_total:.2f}% of total")
+        else:
+            insights['key_insights'].append(f"Balanced distribution: Top 3 segments represent {top_3_total:.2f}% of total")
+
+        if top_segment > 50:
+            insights['key_insights'].append("Single dominant segment detected (>50%)")
+
+        return insights
+
+    def histogram(self):
+        """Analyze histogram distribution"""
+        d = self.dist
+
+        insights = {
+            'summary': f'Distribution analysis of {self.xcol}',
+            'statistics': {
+                'count': int(d['count']),
+                'mean': float(d['mean']),
+                'median': float(d['median']),
+                'mode': float(d['mode']) if d['mode'] is not None else None,
+                'std_dev': float(d['std']),
+                'min': float(d['min']),
+                'max': float(d['max']),
+                'range': float(d['max'] - d['min'])
+            },
+            'quartiles': {
+                'q1': float(d['q1']),
+                'q2': float(d['q2']),
+                'q3': float(d['q3'])
+            },
+            'key_insights': []
+        }
+        if 'rank_error' in d:
+            insights['approximation'] = {'method': 'KLL sketch', 'rank_error': d['rank_error']}
+
+        # Skewness from mean against median
+        if abs(d['mean'] - d['median']) < d['std'] * 0.1:
+            distribution = 'Normally distributed (symmetric)'
+        elif d['mean'] > d['median']:
+            distribution = 'Right-skewed (positive skew)'
+        else:
+            distribution = 'Left-skewed (negative skew)'
+        insights['key_insights'].append(distribution)
+
+        if d['outliers'] > 0:
+            insights['key_insights'].append(f"Detected {d['outliers']} outliers ({d['outliers']/d['count']*100:.2f}%)")
+        else:
+            insights['key_insights'].append("No significant outliers detected")
+
+        # Coefficient of variation
+        cv = (d['std'] / d['mean']) * 100
+        if cv < 15:
+            insights['key_insights'].append(f"Low variability (CV: {cv:.2f}%)")
+        elif cv < 30:
+            insights['key_insights'].append(f"Moderate variability (CV: {cv:.2f}%)")
+        else:
+            insights['key_insights'].append(f"High variability (CV: {cv:.2f}%)")
+
+        return insights
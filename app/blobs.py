@@ -0,0 +1,110 @@
+import contextlib
+import gzip
+import hashlib
+import os
+import threading
+import uuid
+import numpy as np
+
+# fcntl is POSIX only; without it the locks only hold between threads of one process
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the platform
+    fcntl = None
+
+# Raw uploads are stored once per content, gzip-compressed and named by the
+# SHA-256 of their uncompressed bytes. The file is a series of gzip members of
+# BLOCK_BYTES input each: any gzip reader sees one stream, while a reader that
+# knows where the members start can begin decompressing near any offset.
+BLOB_SUFFIX = '.gz'
+BLOCK_BYTES = 1024 * 1024
+# the upload request waits for compression; level 1 still shrinks CSV text about 2x
+COMPRESS_LEVEL = 1
+# ingest and removal of one blob are serialised between threads and, through a
+# lock file in the upload folder, between worker processes; blobs are spread
+# over a fixed number of locks so lock files never pile up
+LOCK_STRIPES = 64
+LOCK_DIR = '.locks'
+_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+def is_blob(filename):
+    return filename.endswith(BLOB_SUFFIX)
+
+
+def blob_name(digest, ext):
+    """File name of the content with this digest; the extension keeps CSV and TSV reads apart"""
+    return f'{digest}.{ext}{BLOB_SUFFIX}'
+
+
+@contextlib.contextmanager
+def lock(folder, filename):
+    """Lock held while a blob's dataset rows are checked and its files created or removed"""
+    # a stable hash, so every worker process picks the same lock for a blob
+    stripe = int(hashlib.sha256(filename.encode()).hexdigest()[:8], 16) % LOCK_STRIPES
+    with _locks[stripe]:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.join(folder, LOCK_DIR), exist_ok=True)
+        with open(os.path.join(folder, LOCK_DIR, f'{stripe}.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def save(stream, folder, ext):
+    """Compress an upload stream to a temporary file in folder, hashing it on the way
+
+    Returns (temporary path, blob name, members), members being the
+    (compressed, uncompressed) start offsets of every gzip member.
+    """
+    digest = hashlib.sha256()
+    members = []
+    size = 0
+    tmp = os.path.join(folder, f'.upload-{uuid.uuid4().hex}{BLOB_SUFFIX}')
+    try:
+        with open(tmp, 'wb') as out:
+            while True:
+                block = stream.read(BLOCK_BYTES)
+                if not block:
+                    break
+                digest.update(block)
+                members.append((out.tell(), size))
+                out.write(gzip.compress(block, COMPRESS_LEVEL, mtime=0))
+                size += len(block)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return tmp, blob_name(digest.hexdigest(), ext), np.asarray(members, dtype=np.int64).reshape(-1, 2)
+
+
+def decompressed(raw, path):
+    """Binary stream of a file's content over its open raw file, decompressing blobs"""
+    return gzip.GzipFile(fileobj=raw, mode='rb') if is_blob(path) else raw
+
+
+@contextlib.contextmanager
+def open_at(path, offset, members=None):
+    """Binary stream of a file's content from uncompressed byte offset on
+
+    With members a blob is decompressed from the last member starting at or
+    before offset; without, from the start of the file.
+    """
+    with open(path, 'rb') as raw:
+        if not is_blob(path):
+            raw.seek(offset)
+            yield raw
+            return
+        start, skip = 0, offset
+        if members is not None and len(members):
+            member = max(int(np.searchsorted(members[:, 1], offset, side='right')) - 1, 0)
+            start, skip = int(members[member, 0]), offset - int(members[member, 1])
+        raw.seek(start)
+        with gzip.GzipFile(fileobj=raw, mode='rb') as stream:
+            # a forward seek decompresses and discards
+            stream.seek(skip)
+            yield stream
@@ -0,0 +1,98 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+def series_nbytes(series):
+    """Approximate in-memory size of a Series, sampling object values"""
+    size = series.memory_usage(index=False, deep=False)
+    if series.dtype == 'category':
+        # codes are counted above; the categories are shared text
+        size += sum(sys.getsizeof(v) for v in series.cat.categories)
+    elif series.dtype == object and len(series):
+        sample = series.iloc[:: max(len(series) // 1000, 1)]
+        per_item = sum(sys.getsizeof(v) for v in sample) / len(sample)
+        size += int(per_item * len(series))
+    return int(size)
+
+
+class FrameCache:
+    """Process-wide LRU cache of parsed dataset columns bounded by byte size
+
+    Entries are keyed by (dataset id, file mtime, column) so a replaced file
+    never serves stale data. Frames handed out share memory with the cache and
+    must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_frame(self, ds_id, mtime, columns, loader):
+        """Return the requested columns, calling loader(missing) for the rest"""
+        import pandas as pd
+        found = {}
+        missing = None
+        with self._lock:
+            if columns is not None:
+                missing = []
+                for col in columns:
+                    if col is None or col in found or col in missing:
+                        continue
+                    entry = self._entries.get((ds_id, mtime, col))
+                    if entry is None:
+                        self.misses += 1
+                        missing.append(col)
+                    else:
+                        self.hits += 1
+                        self._entries.move_to_end((ds_id, mtime, col))
+                        found[col] = entry[0]
+            else:
+                self.misses += 1
+
+        if missing is None or missing:
+            loaded = loader(missing)
+            with self._lock:
+                for col in loaded.columns:
+                    found[col] = loaded[col]
+                    self._put((ds_id, mtime, col), loaded[col])
+
+        # keep the order the dataset stores its columns in
+        order = list(loaded.columns) if missing is None else [c for c in columns if c in found]
+        return pd.DataFrame({col: found[col] for col in dict.fromkeys(order)}, copy=False)
+
+    def _put(self, key, series):
+        size = series_nbytes(series)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= old[1]
+        self._entries[key] = (series, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted
+            self.evictions += 1
+
+    def invalidate(self, ds_id):
+        """Drop every cached column of a dataset"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == ds_id]:
+                self.current_bytes -= self._entries.pop(key)[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
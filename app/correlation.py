@@ -0,0 +1,194 @@
+import warnings
+import numpy as np
+from .sketches import KLLSketch
+
+# columns per block of the correlation matrix; each block pair is multiplied on its own
+BLOCK_COLUMNS = 64
+# an exact summary holds whole column blocks in float64; blocks shrink to stay under this many cells
+BLOCK_CELLS = 16 * 1024 * 1024
+# pairs listed by strength next to the matrices
+TOP_PAIRS = 20
+
+
+def blocks(width, size):
+    return [slice(start, min(start + size, width)) for start in range(0, width, size)]
+
+
+def stack(chunk, names):
+    """rows x columns float64 array of some columns of a {column: array} chunk; missing values are NaN"""
+    return np.column_stack([np.asarray(chunk[name], dtype=np.float64) for name in names])
+
+
+class Moments:
+    """Count, mean, variance, min and max of several columns, merged chunk by chunk"""
+
+    def __init__(self, width):
+        self.n = np.zeros(width)
+        self.mean = np.zeros(width)
+        self.m2 = np.zeros(width)
+        self.low = np.full(width, np.inf)
+        self.high = np.full(width, -np.inf)
+
+    def update(self, part, values):
+        """Add rows of the columns in part (a slice), given as a rows x columns array"""
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chunk_mean = np.where(present, values, 0.0).sum(axis=0) / count
+            chunk_m2 = (np.where(present, values - chunk_mean, 0.0) ** 2).sum(axis=0)
+            # Chan et al. pairwise update, column by column
+            n = self.n[part]
+            total = n + count
+            delta = chunk_mean - self.mean[part]
+            seen = count > 0
+            self.mean[part] = np.where(seen, self.mean[part] + delta * count / total, self.mean[part])
+            self.m2[part] = np.where(seen, self.m2[part] + chunk_m2 + delta * delta * n * count / total,
+                                     self.m2[part])
+        self.n[part] = total
+        self.low[part] = np.minimum(self.low[part], np.where(present, values, np.inf).min(axis=0, initial=np.inf))
+        self.high[part] = np.maximum(self.high[part], np.where(present, values, -np.inf).max(axis=0, initial=-np.inf))
+
+    def describe(self, index, quartiles):
+        n = int(self.n[index])
+        return {
+            'count': n,
+            'mean': float(self.mean[index]) if n else None,
+            'std': float(np.sqrt(self.m2[index] / (n - 1))) if n > 1 else None,
+            'min': float(self.low[index]) if n else None,
+            'q1': quartiles[0] if n else None,
+            'median': quartiles[1] if n else None,
+            'q3': quartiles[2] if n else None,
+            'max': float(self.high[index]) if n else None,
+        }
+
+
+class PairSums:
+    """Sums giving the correlation of every column pair over the rows where both are present
+
+    Missing values (NaN) drop out of the pairs they belong to only, as with
+    pandas' DataFrame.corr. Each column is shifted by the mean of the first
+    rows seen of it so the sums of squares keep their precision.
+    """
+
+    def __init__(self, width):
+        self.shift = np.full(width, np.nan)
+        self.n = np.zeros((width, width))
+        # sx[i, j] and sxx[i, j]: sum and sum of squares of column i over the rows where j is present too
+        self.sx = np.zeros((width, width))
+        self.sxx = np.zeros((width, width))
+        self.sxy = np.zeros((width, width))
+
+    def _prepare(self, part, values):
+        present = ~np.isnan(values)
+        if np.isnan(self.shift[part]).any():
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                first = np.nan_to_num(np.nanmean(values, axis=0))
+            self.shift[part] = np.where(np.isnan(self.shift[part]), first, self.shift[part])
+        return np.where(present, values - self.shift[part], 0.0), present.astype(np.float64)
+
+    def add(self, a, b, xa, xb):
+        """Add rows of the column blocks a and b (slices), given as rows x columns arrays"""
+        xa, ma = self._prepare(a, xa)
+        xb, mb = (xa, ma) if a == b else self._prepare(b, xb)
+        self.sxy[a, b] += xa.T @ xb
+        self.n[a, b] += ma.T @ mb
+        self.sx[a, b] += xa.T @ mb
+        self.sxx[a, b] += (xa * xa).T @ mb
+        if a != b:
+            self.sx[b, a] += xb.T @ ma
+            self.sxx[b, a] += (xb * xb).T @ ma
+            self.sxy[b, a] = self.sxy[a, b].T
+            self.n[b, a] = self.n[a, b].T
+
+    def matrix(self):
+        """Correlation matrix; NaN where a pair has fewer than two rows or a column is constant"""
+        n = self.n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_x, mean_y = self.sx / n, self.sx.T / n
+            var_x = self.sxx - n * mean_x * mean_x
+            var_y = self.sxx.T - n * mean_y * mean_y
+            r = (self.sxy - n * mean_x * mean_y) / np.sqrt(var_x * var_y)
+        r[(n < 2) | ~(var_x > 0) | ~(var_y > 0)] = np.nan
+        r = np.clip(r, -1.0, 1.0)
+        diagonal = np.arange(len(n))
+        r[diagonal, diagonal] = np.where(np.isnan(r[diagonal, diagonal]), np.nan, 1.0)
+        return r
+
+
+def exact_summary(columns, load, rows):
+    """(describe list, Pearson matrix, Spearman matrix) from whole column blocks
+
+    load(names) returns a DataFrame of those columns. Quartiles and ranks
+    are exact; Spearman ranks each column over its own present values.
+    """
+    width = len(columns)
+    parts = blocks(width, min(BLOCK_COLUMNS, max(1, BLOCK_CELLS // max(rows, 1))))
+    moments, quartiles = Moments(width), np.full((3, width), np.nan)
+    pearson, spearman = PairSums(width), PairSums(width)
+
+    def read(part):
+        frame = load(columns[part])[columns[part]]
+        return frame.to_numpy(dtype=np.float64, na_value=np.nan), frame.rank().to_numpy(dtype=np.float64)
+
+    for i, a in enumerate(parts):
+        xa, ra = read(a)
+        moments.update(a, xa)
+        if len(xa):
+            with warnings.catch_warnings():
+                # a column with no values has no quartiles
+                warnings.simplefilter('ignore', RuntimeWarning)
+                quartiles[:, a] = np.nanpercentile(xa, [25, 50, 75], axis=0)
+        for b in parts[i:]:
+            xb, rb = (xa, ra) if b == a else read(b)
+            pearson.add(a, b, xa, xb)
+            spearman.add(a, b, ra, rb)
+    describe = [moments.describe(j, quartiles[:, j].tolist()) for j in range(width)]
+    return describe, pearson.matrix(), spearman.matrix()
+
+
+def streamed_summary(columns, chunks):
+    """(describe list, Pearson matrix, Spearman matrix) from columns read in chunks
+
+    chunks(names) yields {column: array} chunks of those columns. Moments and
+    Pearson are exact; quartiles come from a KLL sketch per column, and
+    Spearman correlates the ranks the sketches give each value.
+    """
+    width = len(columns)
+    parts = blocks(width, BLOCK_COLUMNS)
+    moments, sketches = Moments(width), [KLLSketch() for _ in columns]
+    pearson, spearman = PairSums(width), PairSums(width)
+
+    def ranks(part, values):
+        return np.column_stack([sketches[j].ranks(values[:, k])
+                                for k, j in enumerate(range(part.start, part.stop))])
+
+    for part in parts:
+        for chunk in chunks(columns[part]):
+            values = stack(chunk, columns[part])
+            moments.update(part, values)
+            for k, j in enumerate(range(part.start, part.stop)):
+                sketches[j].update(values[:, k])
+    for i, a in enumerate(parts):
+        for b in parts[i:]:
+            names = columns[a] if b == a else columns[a] + columns[b]
+            for chunk in chunks(names):
+                xa = stack(chunk, columns[a])
+                xb = xa if b == a else stack(chunk, columns[b])
+                pearson.add(a, b, xa, xb)
+                ra = ranks(a, xa)
+                spearman.add(a, b, ra, ra if b == a else ranks(b, xb))
+    describe = [moments.describe(j, sketches[j].quantiles([0.25, 0.5, 0.75])) for j in range(width)]
+    for entry, sketch in zip(describe, sketches):
+        entry['rank_error'] = sketch.rank_error
+    return describe, pearson.matrix(), spearman.matrix()
+
+
+def strongest_pairs(columns, pearson, spearman, limit=TOP_PAIRS):
+    """Column pairs ordered by their strongest absolute correlation, either method"""
+    rows, cols = np.triu_indices(len(columns), k=1)
+    linear, ranked = pearson[rows, cols], spearman[rows, cols]
+    strength = np.fmax(np.abs(linear), np.abs(ranked))
+    order = [k for k in np.argsort(-strength, kind='stable') if not np.isnan(strength[k])][:limit]
+    return [{'x': columns[rows[k]], 'y': columns[cols[k]],
+             'pearson': float(linear[k]), 'spearman': float(ranked[k])} for k in order]
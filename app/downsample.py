@@ -0,0 +1,64 @@
+import numpy as np
+
+OTHER_LABEL = 'Other'
+
+
+def lttb_indices(values, n):
+    """Largest-Triangle-Three-Buckets: indices of n points keeping the series shape
+
+    Points are treated as evenly spaced on x, which is how the line chart
+    draws its labels.
+    """
+    y = np.asarray(values, dtype=np.float64)
+    length = len(y)
+    if n >= length or n < 3:
+        return np.arange(length)
+
+    every = (length - 2) / (n - 2)
+    selected = np.empty(n, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(n - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, length)
+        if end >= length - 1:
+            avg_x, avg_y = length - 1, y[-1]
+        else:
+            avg_x = (end + next_end - 1) / 2
+            avg_y = y[end:next_end].mean()
+        xs = np.arange(start, end)
+        area = np.abs((a - avg_x) * (y[start:end] - y[a]) - (a - xs) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = length - 1
+    return selected
+
+
+def top_n(values, n):
+    """Indices of the n - 1 largest values in their original order, and the rest"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) <= n:
+        return np.arange(len(values)), np.array([], dtype=np.int64)
+    order = np.argsort(-values, kind='stable')
+    return np.sort(order[:n - 1]), np.sort(order[n - 1:])
+
+
+def reduce_points(chart_type, labels, values, max_points, pool):
+    """Bound a chart series to max_points entries
+
+    Line charts keep the LTTB-selected points; bar and pie charts keep the
+    largest entries plus an "Other" bucket whose value is pool(rest_indices).
+    Returns labels, values (a NumPy array once reduced) and the number of
+    original points not shown.
+    """
+    if max_points is None or len(labels) <= max_points:
+        return labels, values, 0
+    values = np.asarray(values)
+    if chart_type == 'line':
+        keep = lttb_indices(values, max_points)
+        return [labels[i] for i in keep], values[keep], len(labels) - len(keep)
+    keep, rest = top_n(values, max_points)
+    labels = [labels[i] for i in keep] + [OTHER_LABEL]
+    values = np.append(values[keep], float(pool(rest)))
+    return labels, values, len(rest)
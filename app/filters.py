@@ -0,0 +1,210 @@
+import json
+import numpy as np
+import pandas as pd
+
+OPERATORS = ('==', '!=', '<', '<=', '>', '>=', 'between', 'in', 'not in')
+RANGE_OPERATORS = ('<', '<=', '>', '>=', 'between')
+# operators a sorted column answers by binary search
+SEARCH_OPERATORS = ('==',) + RANGE_OPERATORS
+MAX_FILTERS = 20
+
+
+class FilterError(ValueError):
+    """A filter that does not fit the dataset; the message is meant for the client"""
+
+
+class Condition:
+    """One column test; missing values never pass, as in SQL
+
+    Every test on a date column, and range tests on a text column, compare
+    the values as dates.
+    """
+
+    def __init__(self, column, op, value, numeric, datetime=False):
+        self.column = column
+        self.op = op
+        self.numeric = numeric
+        self.dates = datetime or (not numeric and op in RANGE_OPERATORS)
+        self.value = self._parse(value)
+
+    def _parse(self, value):
+        if self.op == 'between':
+            if not isinstance(value, list) or len(value) != 2:
+                raise FilterError(f'between on {self.column!r} needs [low, high]')
+            return [self._scalar(v) for v in value]
+        if self.op in ('in', 'not in'):
+            if not isinstance(value, list) or not value:
+                raise FilterError(f'{self.op} on {self.column!r} needs a non-empty list')
+            return [self._scalar(v) for v in value]
+        return self._scalar(value)
+
+    def _scalar(self, value):
+        if self.numeric:
+            if not isinstance(value, (int, float)):
+                raise FilterError(f'{self.column!r} is numeric; compare it with numbers')
+            return value
+        if self.dates:
+            try:
+                value = pd.Timestamp(value)
+            except (TypeError, ValueError):
+                raise FilterError(f'{value!r} is not a date')
+            if value is pd.NaT:
+                raise FilterError(f'{self.column!r} cannot be compared with a missing date')
+            # stored dates are naive UTC
+            return value.tz_convert(None) if value.tzinfo is not None else value
+        if not isinstance(value, (str, int, float, bool)):
+            raise FilterError(f'cannot compare {self.column!r} with {value!r}')
+        return str(value) if not isinstance(value, bool) else value
+
+    def to_dict(self):
+        value = self.value
+        if self.dates:
+            value = [v.isoformat() for v in value] if isinstance(value, list) else value.isoformat()
+        return {'column': self.column, 'op': self.op, 'value': value}
+
+    def test(self, values):
+        """Boolean mask of the values passing the test"""
+        values = np.asarray(values)
+        if self.dates:
+            if values.dtype.kind != 'M':
+                # unparseable text becomes NaT, which fails every comparison
+                values = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce').to_numpy()
+            value = self._as_datetime64(self.value)
+        else:
+            value = self.value
+        present = ~pd.isna(values)
+        op = self.op
+        if op in ('in', 'not in'):
+            hits = pd.Series(values, dtype=object if values.dtype == object else None).isin(value).to_numpy()
+            return hits & present if op == 'in' else ~hits & present
+        with np.errstate(invalid='ignore'):
+            if op == '==':
+                hits = values == value
+            elif op == '!=':
+                hits = values != value
+            elif op == '<':
+                hits = values < value
+            elif op == '<=':
+                hits = values <= value
+            elif op == '>':
+                hits = values > value
+            elif op == '>=':
+                hits = values >= value
+            else:
+                hits = (values >= value[0]) & (values <= value[1])
+        return np.asarray(hits, dtype=bool) & present
+
+    @staticmethod
+    def _as_datetime64(value):
+        if isinstance(value, list):
+            return [v.to_datetime64() for v in value]
+        return value.to_datetime64()
+
+    def search(self, values):
+        """(start, stop) of the run of passing values in ascending values with none missing"""
+        value = self._as_datetime64(self.value) if self.dates else self.value
+        op = self.op
+        if op == 'between':
+            return (int(np.searchsorted(values, value[0], 'left')),
+                    int(np.searchsorted(values, value[1], 'right')))
+        left = int(np.searchsorted(values, value, 'left'))
+        right = int(np.searchsorted(values, value, 'right'))
+        if op == '==':
+            return left, right
+        if op == '<':
+            return 0, left
+        if op == '<=':
+            return 0, right
+        if op == '>':
+            return right, len(values)
+        return left, len(values)
+
+    def may_match(self, low, high):
+        """False when no value in [low, high] can pass, from a block's min and max"""
+        op, value = self.op, self.value
+        if self.dates:
+            # date columns keep their bounds as nanoseconds since the epoch
+            value = [v.value for v in value] if isinstance(value, list) else value.value
+        if op == '==':
+            return low <= value <= high
+        if op == '!=':
+            return not low == high == value
+        if op == '<':
+            return low < value
+        if op == '<=':
+            return low <= value
+        if op == '>':
+            return high > value
+        if op == '>=':
+            return high >= value
+        if op == 'between':
+            return high >= value[0] and low <= value[1]
+        if op == 'in':
+            return any(low <= v <= high for v in value)
+        return not (low == high and low in value)
+
+
+class Where:
+    """All of a request's filters; a row is kept when every condition passes"""
+
+    def __init__(self, conditions):
+        self.conditions = conditions
+
+    @property
+    def columns(self):
+        return list(dict.fromkeys(c.column for c in self.conditions))
+
+    @property
+    def key(self):
+        """Canonical text of the filters, for keying shared reads"""
+        return json.dumps([c.to_dict() for c in self.conditions], sort_keys=True)
+
+    def skip(self, group, index_of):
+        """True when a row group's statistics show no row can pass
+
+        group is the row group's schema entry: its null counts and, for
+        numeric and date columns, min and max; index_of maps column name to
+        position.
+        """
+        for condition in self.conditions:
+            i = index_of[condition.column]
+            if group['nulls'][i] >= group['rows']:
+                return True
+            lows, highs = group.get('min'), group.get('max')
+            if lows is not None and lows[i] is not None:
+                if not condition.may_match(lows[i], highs[i]):
+                    return True
+        return False
+
+    def mask(self, chunk):
+        """Boolean mask over a chunk given as {column: array}"""
+        mask = None
+        for condition in self.conditions:
+            hits = condition.test(chunk[condition.column])
+            mask = hits if mask is None else mask & hits
+        return mask
+
+
+def parse(filters, columns):
+    """Where for a request's "filters" list, or None when there are none
+
+    Each filter is {"column", "op", "value"}; columns maps column name to its
+    upload metadata.
+    """
+    if filters is None or filters == []:
+        return None
+    if not isinstance(filters, list) or len(filters) > MAX_FILTERS:
+        raise FilterError(f'filters must be a list of at most {MAX_FILTERS} conditions')
+    conditions = []
+    for spec in filters:
+        if not isinstance(spec, dict):
+            raise FilterError('each filter is {"column": ..., "op": ..., "value": ...}')
+        column, op = spec.get('column'), spec.get('op', '==')
+        if column not in columns:
+            raise FilterError(f'filter column {column!r} not found')
+        if op not in OPERATORS:
+            raise FilterError(f'filter op must be one of {", ".join(OPERATORS)}')
+        meta = columns[column]
+        conditions.append(Condition(column, op, spec.get('value'), meta['is_numeric'],
+                                    meta['dtype'].startswith('datetime')))
+    return Where(conditions)
@@ -0,0 +1,177 @@
+import os
+import numpy as np
+import pandas as pd
+from . import blobs, storage
+from .profiling import profile_store
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# a guessed format must name a year, a month and a day to count as dates
+MONTH_CODES = ('%m', '%b', '%B')
+# text is loaded as a categorical when each value appears at least this often on average
+CATEGORY_MIN_REPEATS = 2
+COMPACT_INTS = ('int8', 'int16', 'int32')
+# share of an upload's progress taken by reading the file; profiling the columns takes the rest
+READ_SHARE = 0.8
+
+
+def date_format(series):
+    """Format to parse a text column as dates, guessed from its first value; None if it is not dates"""
+    values = series.dropna()
+    if series.dtype != object or values.empty or not isinstance(values.iloc[0], str):
+        return None
+    fmt = guess_datetime_format(values.iloc[0])
+    if fmt is None or '%Y' not in fmt or '%d' not in fmt or not any(m in fmt for m in MONTH_CODES):
+        return None
+    # ISO dates may leave out the time on some rows, which one fixed format would reject
+    return 'ISO8601' if fmt.startswith('%Y-%m-%d') else fmt
+
+
+def parse_dates(series, fmt):
+    """series as datetime64[ns], offsets converted to naive UTC; None when a value is not a date"""
+    if series.dtype != object and series.notna().any():
+        return None
+    parsed = pd.to_datetime(series, format=fmt, errors='coerce')
+    if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+        parsed = parsed.dt.tz_convert(None)
+    elif parsed.dtype.kind != 'M':
+        # mixed offsets come back as objects
+        return None
+    if parsed.isna().sum() != series.isna().sum():
+        return None
+    return parsed
+
+
+def text_columns(writer):
+    """Indexes of object columns whose row groups were parsed as numbers or dates
+
+    Pandas keeps booleans next to missing values, but any mix involving real
+    numbers, or booleans next to strings, is read back as plain text.
+    """
+    found = []
+    for i, col in enumerate(writer.columns):
+        if col['dtype'] != 'object':
+            continue
+        kinds = set()
+        for g, group in enumerate(writer.row_groups):
+            dtype = group['dtypes'][i]
+            if dtype == 'object':
+                # booleans next to missing values come back as an object chunk
+                values = storage.read_group(writer.path, i, g, dtype)
+                is_bool = pd.api.types.infer_dtype(values, skipna=True) == 'boolean'
+                kinds.add('bool' if is_bool else 'text')
+            elif dtype == 'bool':
+                kinds.add('bool')
+            elif group['nulls'][i] < group['rows']:
+                kinds.add('number')
+        if 'number' in kinds or kinds == {'text', 'bool'}:
+            found.append(i)
+    return found
+
+
+def compact_dtype(writer, index, unique_count):
+    """Narrowest dtype holding a stored column without loss once loaded, or None
+
+    Repeated text becomes a categorical and integers the smallest signed
+    type covering their range. Floats stay float64, as float32 would round
+    most decimal values.
+    """
+    dtype = writer.columns[index]['dtype']
+    groups = writer.row_groups
+    rows = sum(g['rows'] for g in groups)
+    if dtype == 'object':
+        if not rows or unique_count * CATEGORY_MIN_REPEATS > rows:
+            return None
+        for g, group in enumerate(groups):
+            if group['dtypes'][index] == 'object':
+                if not all(isinstance(v, str) for v in storage.read_dictionary(writer.path, index, g)):
+                    return None
+            elif group['nulls'][index] < group['rows']:
+                return None
+        return 'category'
+    if dtype is None or np.dtype(dtype).kind != 'i':
+        return None
+    lows = [g['min'][index] for g in groups if g['min'][index] is not None]
+    if not lows:
+        return None
+    low, high = min(lows), max(g['max'][index] for g in groups if g['max'][index] is not None)
+    for candidate in COMPACT_INTS:
+        info = np.iinfo(candidate)
+        if info.min <= low and high <= info.max:
+            return candidate if np.dtype(candidate).itemsize < np.dtype(dtype).itemsize else None
+    return None
+
+
+def ingest_csv(path, sep, store, chunksize=storage.ROW_GROUP_SIZE, progress=None, members=None, workers=0):
+    """Stream a CSV in chunks into the columnar copy, then profile its columns
+
+    Only one chunk is held in memory at a time. Text columns whose values all
+    parse as dates in the format of the first one are stored as datetime64.
+    Columns are profiled from the finished copy, on a pool of workers
+    processes when workers > 1 (see profiling.profile_store).
+    progress(fraction), if given, is called after each chunk and each group of
+    profiled columns. A compressed upload is decompressed as it is read;
+    members, its gzip member offsets from blobs.save, go next to the row index.
+    Returns the metadata dict stored in Dataset.meta_json.
+    """
+    writer = storage.ColumnWriter(store)
+    dates = {}
+    size = os.path.getsize(path) or 1
+    try:
+        with open(path, 'rb') as raw:
+            for chunk in pd.read_csv(blobs.decompressed(raw, path), sep=sep, chunksize=chunksize):
+                if writer.columns is None:
+                    for col in chunk.columns:
+                        fmt = date_format(chunk[col])
+                        if fmt is not None:
+                            dates[col] = fmt
+                for col, fmt in list(dates.items()):
+                    parsed = parse_dates(chunk[col], fmt)
+                    if parsed is None:
+                        # written as read; the column ends up text and is re-read below
+                        del dates[col]
+                    else:
+                        chunk[col] = parsed
+                writer.append(chunk)
+                if progress is not None:
+                    progress(READ_SHARE * min(raw.tell() / size, 1.0))
+
+        if writer.columns is None:
+            # header-only file: no chunk is produced, read the column names alone
+            writer.append(pd.read_csv(path, sep=sep, nrows=0))
+
+        # row start offsets let previews seek to any page; skipped if the scan
+        # disagrees with pandas, e.g. for files using unusual quoting
+        offsets, rows = storage.row_starts(path)
+        if rows == sum(g['rows'] for g in writer.row_groups):
+            writer.write_row_index(offsets, members=members)
+
+        # a column that turned into strings part-way through, or dates that
+        # stopped parsing, is re-read as text so earlier row groups hold the
+        # same values a full read would give
+        promoted = text_columns(writer)
+        if promoted:
+            names = [writer.columns[i]['name'] for i in promoted]
+            reader = pd.read_csv(path, sep=sep, chunksize=chunksize, usecols=names,
+                                 dtype={name: str for name in names})
+            for group, chunk in enumerate(reader):
+                for i, name in zip(promoted, names):
+                    if writer.row_groups[group]['dtypes'][i] != 'object':
+                        writer.rewrite(i, group, chunk[name])
+        writer.close()
+        profiles = profile_store(store, workers, progress if progress is None else
+                                 lambda fraction: progress(READ_SHARE + (1 - READ_SHARE) * fraction))
+    except Exception:
+        storage.remove_store(store)
+        raise
+
+    meta = {'columns': [profile.to_dict() for profile in profiles]}
+    # the dtypes every later load of the dataset uses
+    for i, column in enumerate(meta['columns']):
+        column['compact_dtype'] = compact_dtype(writer, i, column['unique_count'])
+    meta['rows'] = int(sum(g['rows'] for g in writer.row_groups))
+    meta['cols'] = int(len(profiles))
+    return meta
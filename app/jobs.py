@@ -0,0 +1,218 @@
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from . import db, metrics
+from .models import Job
+
+# fcntl is POSIX only; without it jobs of a stopped process are never recovered
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the platform
+    fcntl = None
+
+# progress is written back to the job row once it has moved by at least this much
+PROGRESS_STEP = 0.01
+STOPPED_ERROR = 'the worker process running this job stopped'
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested"""
+
+
+class JobError(Exception):
+    """A job failed with a message meant for the client"""
+
+
+class JobContext:
+    """Handle a running job uses to report progress and notice cancellation"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.dataset_id = None
+        self._reported = 0.0
+
+    def progress(self, fraction, message=None):
+        """Record progress in [0, 1]; raises JobCancelled if the job was cancelled"""
+        fraction = min(max(float(fraction), 0.0), 1.0)
+        cancelled = db.session.execute(
+            db.select(Job.cancel_requested).filter_by(id=self.job_id)).scalar()
+        if cancelled or cancelled is None:
+            raise JobCancelled()
+        if message is not None or fraction - self._reported >= PROGRESS_STEP:
+            values = {'progress': fraction}
+            if message is not None:
+                values['message'] = message
+            db.session.execute(db.update(Job).filter_by(id=self.job_id).values(**values))
+            self._reported = fraction
+        # end the transaction so requests touching the jobs table are never kept waiting
+        db.session.commit()
+
+
+class JobRunner:
+    """Runs work off the request thread, keeping its state in the jobs table
+
+    Jobs run on a thread pool inside the web process: pandas and numpy drop
+    the GIL for the heavy parts, and threads share the frame cache and the
+    app without pickling. With inline=True (serverless hosts, where nothing
+    may run after the response) jobs run to completion inside submit().
+
+    Each job row records the process that owns it. The process holds a lock
+    file in lock_dir for as long as it lives, so a job whose owner's lock can
+    be taken was lost with a stopped or restarted worker and is failed
+    instead of being polled forever.
+    """
+
+    def __init__(self, app, workers=2, inline=False, registry=None, lock_dir=None):
+        self.app = app
+        self.inline = inline
+        # metrics.Registry recording each job as route "job:<kind>"
+        self.registry = registry
+        self.executor = None if inline else ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.lock_dir = lock_dir
+        self._alive = None
+        self._claim()
+        # a forked worker (gunicorn --preload) owns its jobs under its own lock
+        os.register_at_fork(after_in_child=self._claim)
+
+    def _claim(self):
+        """Take a fresh owner token and hold its lock file until the process exits"""
+        self.owner = uuid.uuid4().hex
+        if self._alive is not None:
+            # the parent's copy; closing it here leaves the parent's lock in place
+            self._alive.close()
+            self._alive = None
+        if self.lock_dir is None or fcntl is None:
+            return
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self._alive = open(self._lock_path(self.owner), 'a')
+        fcntl.flock(self._alive, fcntl.LOCK_EX)
+
+    def _lock_path(self, owner):
+        return os.path.join(self.lock_dir, f'job-{owner}.lock')
+
+    def owner_alive(self, owner):
+        """False once the process that owned a job has stopped; True when that cannot be told"""
+        if owner == self.owner:
+            return True
+        if owner is None:
+            # queued before owners were recorded, so by a process that has since restarted
+            return False
+        if self.lock_dir is None or fcntl is None:
+            return True
+        path = self._lock_path(owner)
+        try:
+            f = open(path, 'r+')
+        except FileNotFoundError:
+            return False
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            os.remove(path)
+        return False
+
+    def recover(self, jobs=None):
+        """Fail unfinished jobs (all of them, or those given) whose owning process has stopped"""
+        if jobs is None:
+            jobs = Job.query.filter(Job.status.in_(('queued', 'running'))).all()
+        stale = [job for job in jobs if not job.finished and not self.owner_alive(job.owner)]
+        for job in stale:
+            job.status = 'failed'
+            job.error = STOPPED_ERROR
+            job.finished_at = datetime.utcnow()
+        if stale:
+            db.session.commit()
+        return stale
+
+    def submit(self, kind, fn, dataset_id=None, cleanup=None):
+        """Queue fn(ctx) as a new job and return its row; fn returns a JSON-able result
+
+        cleanup(), when given, runs once the job is over however it ended,
+        including when it was cancelled or skipped before fn ever ran.
+        """
+        job = Job(kind=kind, dataset_id=dataset_id, owner=self.owner)
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+        if self.inline:
+            self._run(job_id, kind, fn, cleanup)
+            db.session.refresh(job)
+            return job
+        future = self.executor.submit(self._run, job_id, kind, fn, cleanup)
+        with self.lock:
+            self.futures[job_id] = future
+        future.add_done_callback(lambda f: self._forget(job_id, f, cleanup))
+        return job
+
+    def cancel(self, job):
+        """Ask a job to stop; queued jobs stop at once, running ones at their next progress call"""
+        if job.finished:
+            return False
+        job.cancel_requested = True
+        if job.status == 'queued':
+            with self.lock:
+                future = self.futures.get(job.id)
+            if future is not None:
+                future.cancel()
+            job.status = 'cancelled'
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return True
+
+    def _forget(self, job_id, future, cleanup):
+        with self.lock:
+            self.futures.pop(job_id, None)
+        # a job cancelled while queued never reached _run, so its cleanup is due here
+        if cleanup is not None and future.cancelled():
+            cleanup()
+
+    def _run(self, job_id, kind, fn, cleanup=None):
+        try:
+            if self.registry is None:
+                return self._execute(job_id, fn)
+            with self.registry.recording(f'job:{kind}', 'JOB') as status:
+                status['value'] = self._execute(job_id, fn)
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    def _execute(self, job_id, fn):
+        """Run one job; returns its final status"""
+        with self.app.app_context():
+            job = db.session.get(Job, job_id)
+            if job is None or job.status != 'queued' or job.cancel_requested:
+                return 'skipped'
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+
+            ctx = JobContext(job_id)
+            values = {}
+            try:
+                result = fn(ctx)
+            except JobCancelled:
+                db.session.rollback()
+                values['status'] = 'cancelled'
+            except JobError as e:
+                db.session.rollback()
+                values.update(status='failed', error=str(e))
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.exception('job %s failed', job_id)
+                values.update(status='failed', error=str(e))
+            else:
+                with metrics.phase('encode'):
+                    text = self.app.json.dumps(result)
+                values.update(status='succeeded', progress=1.0, result_json=text)
+                if ctx.dataset_id is not None:
+                    values['dataset_id'] = ctx.dataset_id
+            values['finished_at'] = datetime.utcnow()
+            # the row is gone if its dataset was deleted while the job ran
+            db.session.execute(db.update(Job).filter_by(id=job_id).values(**values))
+            db.session.commit()
+            return values['status']
@@ -0,0 +1,294 @@
+import contextvars
+import io
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+PREFIX = 'csvvis'
+PAGE_SIZE = resource.getpagesize() if resource is not None else 4096
+# latency histogram bucket bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# slow-request profiles kept in memory for /api/metrics/profiles
+PROFILES_KEPT = 20
+PROFILE_LINES = 40
+
+# the recorder of the request or job running in this thread, if any
+_current = contextvars.ContextVar('metrics_recorder', default=None)
+
+
+class Recorder:
+    """Phase timings, rows and bytes of one request or job
+
+    Phases may nest (a "db" query inside a "groupby"), so their times can
+    add up to more than the whole request.
+    """
+
+    def __init__(self, route, method, profile=False):
+        self.token = None
+        self.route = route
+        self.method = method
+        self.phases = defaultdict(float)
+        self.rows = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.rss_started = rss_bytes()
+        self.peak_started = peak_rss_bytes()
+        self.rss_growth = None
+        self.profiler = None
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.elapsed = time.perf_counter() - self.started
+        self.rss_growth = rss_growth(self.rss_started, rss_bytes(), self.peak_started, peak_rss_bytes())
+        return self
+
+    def profile_text(self):
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        return out.getvalue()
+
+    def server_timing(self):
+        """Server-Timing header value, in milliseconds as browsers expect"""
+        parts = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.phases.items()]
+        parts.append(f'total;dur={self.elapsed * 1000:.1f}')
+        return ', '.join(parts)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Process-wide request and job metrics, rendered in the Prometheus text format
+
+    Each worker process keeps its own numbers; scrape every worker, or run
+    one, to see them all.
+    """
+
+    def __init__(self, profile_slow_ms=None, logger=None):
+        self.profile_slow_ms = profile_slow_ms
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.latency = defaultdict(Histogram)
+        self.phases = defaultdict(Histogram)
+        self.rows = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.rss_growth = {}
+        self.profiles = deque(maxlen=PROFILES_KEPT)
+        self.profile_ids = itertools.count(1)
+
+    @property
+    def profiling(self):
+        return bool(self.profile_slow_ms)
+
+    def start(self, route, method):
+        """Begin recording a request or job in this thread
+
+        A job run inline inside a request gets its own recorder and hands
+        the request's back when it finishes; only the outer one profiles.
+        """
+        outer = _current.get()
+        profile = self.profiling and (outer is None or outer.profiler is None)
+        recorder = Recorder(route, method, profile=profile)
+        recorder.token = _current.set(recorder)
+        return recorder
+
+    def finish(self, recorder, status):
+        """Stop recording and fold the recorder into the totals; returns a kept profile's id"""
+        _current.reset(recorder.token)
+        recorder.stop()
+        key = (recorder.route, recorder.method)
+        with self.lock:
+            self.requests[key + (str(status),)] += 1
+            self.latency[key].observe(recorder.elapsed)
+            for name, seconds in recorder.phases.items():
+                self.phases[(recorder.route, name)].observe(seconds)
+            self.rows[recorder.route] += recorder.rows
+            self.bytes[recorder.route] += recorder.bytes
+            if recorder.rss_growth is not None:
+                self.rss_growth[recorder.route] = max(self.rss_growth.get(recorder.route, 0), recorder.rss_growth)
+        if recorder.profiler is None or recorder.elapsed * 1000 < self.profile_slow_ms:
+            return None
+        entry = {
+            'id': next(self.profile_ids),
+            'route': recorder.route,
+            'method': recorder.method,
+            'status': status,
+            'seconds': recorder.elapsed,
+            'phases': dict(recorder.phases),
+            'at': datetime.utcnow().isoformat(),
+            'profile': recorder.profile_text(),
+        }
+        self.profiles.append(entry)
+        if self.logger is not None:
+            self.logger.warning('slow %s %s took %.3fs; profile %d at /api/metrics/profiles',
+                                recorder.method, recorder.route, recorder.elapsed, entry['id'])
+        return entry['id']
+
+    @contextmanager
+    def recording(self, route, method):
+        """Record the enclosed block, e.g. a background job, as one request"""
+        recorder = self.start(route, method)
+        status = {'value': 'ok'}
+        try:
+            yield status
+        except Exception:
+            status['value'] = 'error'
+            raise
+        finally:
+            self.finish(recorder, status['value'])
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            lines += _header('requests_total', 'counter', 'Requests and jobs by route, method and status')
+            for (route, method, status), n in sorted(self.requests.items()):
+                lines.append(_sample('requests_total', n, route=route, method=method, status=status))
+            lines += _header('request_duration_seconds', 'histogram', 'Request and job latency by route')
+            for (route, method), hist in sorted(self.latency.items()):
+                lines += _histogram('request_duration_seconds', hist, route=route, method=method)
+            lines += _header('phase_duration_seconds', 'histogram', 'Time spent per phase of a request')
+            for (route, phase), hist in sorted(self.phases.items()):
+                lines += _histogram('phase_duration_seconds', hist, route=route, phase=phase)
+            lines += _header('rows_processed_total', 'counter', 'Rows read from datasets by route')
+            for route, n in sorted(self.rows.items()):
+                lines.append(_sample('rows_processed_total', n, route=route))
+            lines += _header('bytes_processed_total', 'counter', 'Bytes read from datasets by route')
+            for route, n in sorted(self.bytes.items()):
+                lines.append(_sample('bytes_processed_total', n, route=route))
+            lines += _header('request_rss_growth_bytes', 'gauge',
+                             'Largest growth of the worker RSS over one request or job, by route')
+            for route, n in sorted(self.rss_growth.items()):
+                lines.append(_sample('request_rss_growth_bytes', n, route=route))
+        peak = peak_rss_bytes()
+        if peak is not None:
+            lines += _header('process_peak_rss_bytes', 'gauge', 'Highest RSS of this worker process since it started')
+            lines.append(_sample('process_peak_rss_bytes', peak))
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def phase(name):
+    """Time the enclosed block as a phase of the current request or job"""
+    recorder = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if recorder is not None:
+            recorder.phases[name] += time.perf_counter() - started
+
+
+def count(rows=0, nbytes=0):
+    """Add rows and bytes read to the current request or job"""
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.rows += int(rows)
+        recorder.bytes += int(nbytes)
+
+
+def add_time(name, seconds):
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.phases[name] += seconds
+
+
+def time_sql(engine):
+    """Count the time of every SQL statement on engine as the "db" phase"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _started(conn, cursor, statement, parameters, context, executemany):
+        conn.info['metrics_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _finished(conn, cursor, statement, parameters, context, executemany):
+        add_time('db', time.perf_counter() - conn.info.pop('metrics_started', time.perf_counter()))
+
+
+def peak_rss_bytes():
+    """Highest RSS of this process since it started"""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def rss_bytes():
+    """Current RSS of this process, None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def rss_growth(rss_before, rss_after, peak_before, peak_after):
+    """Bytes the process grew by over a request, None if neither RSS reading is available
+
+    Memory still held at the end shows in the current RSS; memory freed
+    before then only shows if it raised the process peak, so the larger of
+    the two counts. Requests running concurrently in the same worker share
+    the growth.
+    """
+    grown = [after - before for before, after in ((rss_before, rss_after), (peak_before, peak_after))
+             if before is not None and after is not None]
+    if not grown:
+        return None
+    return max(0, *grown)
+
+
+def _header(name, kind, text):
+    return [f'# HELP {PREFIX}_{name} {text}', f'# TYPE {PREFIX}_{name} {kind}']
+
+
+def _labels(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+def _sample(name, value, **labels):
+    if not labels:
+        return f'{PREFIX}_{name} {value}'
+    return f'{PREFIX}_{name}{{{_labels(labels)}}} {value}'
+
+
+def _histogram(name, hist, **labels):
+    lines = []
+    cumulative = 0
+    for bound, n in zip(BUCKETS, hist.counts):
+        cumulative += n
+        lines.append(f'{PREFIX}_{name}_bucket{{{_labels(dict(labels, le=repr(bound)))}}} {cumulative}')
+    lines.append(f'{PREFIX}_{name}_bucket{{{_labels(dict(labels, le="+Inf"))}}} {hist.count}')
+    lines.append(f'{PREFIX}_{name}_sum{{{_labels(labels)}}} {hist.sum}')
+    lines.append(f'{PREFIX}_{name}_count{{{_labels(labels)}}} {hist.count}')
+    return lines
@@ -2,16 +2,27 @@ from . import db
 from datetime import datetime
 import json
 
+# bump whenever a table, column or index is added so existing databases get create_all() once more
+SCHEMA_VERSION = 4
+
 
 class Dataset(db.Model):
     __tablename__ = 'datasets'
+    # the catalog pages through datasets newest first by (upload_time, id)
+    __table_args__ = (db.Index('ix_datasets_upload_time_id', 'upload_time', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String(512), nullable=False)
+    # uploads are stored by content digest, so identical uploads share one filename
+    filename = db.Column(db.String(512), nullable=False, index=True)
     original_name = db.Column(db.String(512), nullable=False)
     upload_time = db.Column(db.DateTime, default=datetime.utcnow)
     rows = db.Column(db.Integer)
     cols = db.Column(db.Integer)
     meta_json = db.Column(db.Text)  # JSON string with column info, dtypes, sample
+    aggregates = db.relationship('Aggregate', backref='dataset', cascade='all, delete-orphan')
+    jobs = db.relationship('Job', backref='dataset', cascade='all, delete-orphan')
+    regressions = db.relationship('Regression', backref='dataset', cascade='all, delete-orphan')
+    dataset_columns = db.relationship('DatasetColumn', backref='dataset', cascade='all, delete-orphan',
+                                      order_by='DatasetColumn.position')
 
     def to_dict(self):
         meta = {}
@@ -28,3 +39,122 @@ class Dataset(db.Model):
             'cols': self.cols,
             'metadata': meta,
         }
+
+
+class DatasetColumn(db.Model):
+    """Per-column metadata in plain columns, so listings never parse meta_json"""
+    __tablename__ = 'dataset_columns'
+    __table_args__ = (db.UniqueConstraint('dataset_id', 'position'),)
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(512), nullable=False)
+    dtype = db.Column(db.String(64), nullable=False)
+    is_numeric = db.Column(db.Boolean, nullable=False)
+    is_datetime = db.Column(db.Boolean, nullable=False, default=False)
+    unique_count = db.Column(db.Integer)
+    compact_dtype = db.Column(db.String(64))
+
+    # what a listing shows per column
+    FIELDS = ('name', 'dtype', 'is_numeric', 'is_datetime', 'unique_count', 'compact_dtype')
+
+    @classmethod
+    def from_meta(cls, meta):
+        """Rows for the columns of an upload's metadata dict"""
+        return [cls(position=i, name=c['name'], dtype=c['dtype'], is_numeric=c['is_numeric'],
+                    is_datetime=c.get('is_datetime', False), unique_count=c.get('unique_count'),
+                    compact_dtype=c.get('compact_dtype'))
+                for i, c in enumerate(meta.get('columns', []))]
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+def migrate(previous):
+    """Fill new tables and columns for rows written under an older SCHEMA_VERSION"""
+    if previous is None or previous >= 4:
+        return
+    if previous < 2:
+        # version 2 added dataset_columns
+        for ds in Dataset.query.filter(~Dataset.dataset_columns.any()):
+            try:
+                meta = json.loads(ds.meta_json or '{}')
+            except ValueError:
+                continue
+            ds.dataset_columns = DatasetColumn.from_meta(meta)
+        db.session.commit()
+    # version 4 added jobs.owner; create_all leaves the columns of existing tables alone
+    if 'owner' not in {c['name'] for c in db.inspect(db.engine).get_columns('jobs')}:
+        db.session.execute(db.text('ALTER TABLE jobs ADD COLUMN owner VARCHAR(32)'))
+        db.session.commit()
+
+
+class Aggregate(db.Model):
+    __tablename__ = 'aggregates'
+    __table_args__ = (db.UniqueConstraint('dataset_id', 'x_column', 'y_column'),)
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), nullable=False, index=True)
+    x_column = db.Column(db.String(512), nullable=False)
+    y_column = db.Column(db.String(512), nullable=False)
+    summary_json = db.Column(db.Text)  # per-group count, sum, sum of squares, min, max of y
+
+
+class Regression(db.Model):
+    __tablename__ = 'regressions'
+    __table_args__ = (db.UniqueConstraint('dataset_id', 'x_column', 'y_column'),)
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), nullable=False, index=True)
+    x_column = db.Column(db.String(512), nullable=False)
+    y_column = db.Column(db.String(512), nullable=False)
+    stats_json = db.Column(db.Text)  # count, means, centred sums of squares and ranges of (x, y)
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)  # upload, analyze or predict
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    message = db.Column(db.String(512))
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), index=True)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    owner = db.Column(db.String(32))  # token of the process that queued and runs the job
+    result_json = db.Column(db.Text)  # JSON response body of the finished work
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    FINISHED = ('succeeded', 'failed', 'cancelled')
+
+    @property
+    def finished(self):
+        return self.status in self.FINISHED
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'dataset_id': self.dataset_id,
+            'error': self.error,
+            'result': json.loads(self.result_json) if self.result_json else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class CachedResult(db.Model):
+    __tablename__ = 'results'
+    __table_args__ = (db.UniqueConstraint('dataset_id', 'key'),)
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), nullable=False, index=True)
+    kind = db.Column(db.String(32), nullable=False)  # chart, predict, analyze or summary
+    key = db.Column(db.String(64), nullable=False)  # hash of the canonical request
+    etag = db.Column(db.String(64), nullable=False)
+    body = db.Column(db.Text, nullable=False)  # serialized JSON response
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
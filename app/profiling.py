@@ -0,0 +1,272 @@
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+
+SAMPLE_SIZE = 5
+# distinct counts stay exact up to this many values, then switch to HyperLogLog
+EXACT_DISTINCT_LIMIT = 50000
+HLL_PRECISION = 14
+HISTOGRAM_BINS = 20
+# stores with fewer cells are profiled in the calling thread; a pool only pays off above this
+PARALLEL_MIN_CELLS = 2000000
+# each worker gets a few column groups so one wide text column does not hold up the rest
+TASKS_PER_WORKER = 4
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def promote_dtype(current, new):
+    """Dtype a column ends up with when pandas sees both chunk dtypes at once"""
+    if current is None or current == new:
+        return new
+    if 'object' in (current, new) or 'bool' in (current, new):
+        return 'object'
+    # dates next to anything else are read back as text
+    if current.startswith('datetime') or new.startswith('datetime'):
+        return 'object'
+    return str(np.result_type(current, new))
+
+
+def hash_values(values):
+    """64-bit hashes of non-null values, numbers hashed by their float value"""
+    if values.dtype == bool:
+        # booleans sharing a chunk with missing values arrive as objects
+        values = values.astype(object)
+    elif pd.api.types.is_numeric_dtype(values.dtype):
+        values = values.astype(np.float64)
+    return pd.util.hash_array(np.asarray(values), categorize=False)
+
+
+class HyperLogLog:
+    """Fixed-size distinct counter with roughly 1.04 / sqrt(2**p) relative error"""
+
+    def __init__(self, p=HLL_PRECISION):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if len(hashes) == 0:
+            return
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        # the guard bit caps the rank at 64 - p + 1 and keeps log2 defined
+        rest = (hashes << np.uint64(self.p)) | np.uint64(1 << (self.p - 1))
+        rank = 64 - np.floor(np.log2(rest.astype(np.float64))).astype(np.int64)
+        # after sorting, the last key per register carries its highest rank
+        keys = np.unique((idx << 6) | rank)
+        update = np.zeros(self.m, dtype=np.uint8)
+        update[keys >> 6] = keys & 63
+        np.maximum(self.registers, update, out=self.registers)
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # linear counting is more accurate for small cardinalities
+            estimate = self.m * np.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class ColumnProfile:
+    """Incremental per-column metadata built one chunk at a time
+
+    bounds, the (min, max) of the whole column when known up front, lets
+    numeric columns keep a fixed-range histogram as they go.
+    """
+
+    def __init__(self, name, bounds=None):
+        self.name = name
+        self.dtype = None
+        self.samples = []
+        self.exact = np.array([], dtype=np.uint64)
+        self.hll = HyperLogLog()
+        self.nulls = 0
+        self.low = self.high = None
+        self.total = 0.0
+        self.counted = 0
+        self.bounds = bounds
+        self.histogram = None
+
+    def update(self, series):
+        """Add one chunk of the column"""
+        values = series.to_numpy()
+        kind = values.dtype.kind
+        if kind in 'iufM':
+            valid = values[~pd.isna(values)] if kind in 'fM' else values
+            if len(valid):
+                self.extend(valid.min(), valid.max())
+            if kind != 'M' and len(valid):
+                self.total += float(valid.sum(dtype=np.float64))
+                self.counted += len(valid)
+                if self.bounds is not None:
+                    counts, _ = np.histogram(valid, bins=HISTOGRAM_BINS, range=self.bounds)
+                    self.histogram = counts if self.histogram is None else self.histogram + counts
+        self.add_distinct(str(series.dtype), series.dropna().unique(), int(series.isna().sum()))
+
+    def add_distinct(self, dtype, values, nulls):
+        """Add a chunk given its distinct non-null values, in order of first appearance
+
+        Text row groups of the columnar copy already hold their distinct
+        values as a dictionary, so they are profiled without decoding.
+        """
+        self.dtype = promote_dtype(self.dtype, dtype)
+        self.nulls += nulls
+        if len(self.samples) < SAMPLE_SIZE:
+            head = values[:SAMPLE_SIZE]
+            # dates are sampled as ISO text so the metadata stays plain JSON
+            head = head.astype(str) if dtype.startswith('datetime') else head
+            for value in head.tolist():
+                if value not in self.samples and len(self.samples) < SAMPLE_SIZE:
+                    self.samples.append(value)
+        hashes = hash_values(values)
+        self.hll.add_hashes(hashes)
+        if self.exact is not None:
+            self.exact = np.union1d(self.exact, hashes)
+            if len(self.exact) > EXACT_DISTINCT_LIMIT:
+                self.exact = None
+
+    def extend(self, low, high):
+        self.low = low if self.low is None else min(self.low, low)
+        self.high = high if self.high is None else max(self.high, high)
+
+    def unique_count(self):
+        return len(self.exact) if self.exact is not None else self.hll.count()
+
+    def unique_sample(self):
+        # match what a single read of the whole file would have produced
+        if self.dtype is not None and self.dtype.startswith('float'):
+            return [float(v) for v in self.samples]
+        return self.samples
+
+    def stats(self, dtype):
+        """min, max, mean and histogram of a numeric column; min and max of a date column"""
+        kind = np.dtype(dtype).kind
+        if self.low is None or kind not in 'iufM':
+            return {}
+        if kind == 'M':
+            return {'min': str(pd.Timestamp(self.low)), 'max': str(pd.Timestamp(self.high))}
+        cast = int if kind in 'iu' else float
+        stats = {'min': cast(self.low), 'max': cast(self.high), 'mean': self.total / self.counted}
+        if self.histogram is not None:
+            edges = np.histogram_bin_edges([], bins=HISTOGRAM_BINS, range=self.bounds)
+            stats['histogram'] = {'edges': edges.tolist(), 'counts': self.histogram.tolist()}
+        return stats
+
+    def to_dict(self):
+        dtype = self.dtype or 'object'
+        return dict({
+            'name': self.name,
+            'dtype': dtype,
+            'is_numeric': bool(pd.api.types.is_numeric_dtype(np.dtype(dtype))),
+            'is_datetime': dtype.startswith('datetime'),
+            'unique_sample': self.unique_sample(),
+            'unique_count': int(self.unique_count()),
+            'null_count': int(self.nulls),
+        }, **self.stats(dtype))
+
+
+def column_bounds(schema, index):
+    """(min, max) of a numeric column from its row group statistics, or None"""
+    if np.dtype(schema['columns'][index]['dtype']).kind not in 'iuf':
+        return None
+    lows = [g['min'][index] for g in schema['row_groups'] if g['min'][index] is not None]
+    highs = [g['max'][index] for g in schema['row_groups'] if g['max'][index] is not None]
+    if not lows or not math.isfinite(min(lows)) or not math.isfinite(max(highs)):
+        return None
+    return min(lows), max(highs)
+
+
+def profile_columns(path, indexes):
+    """Profiles of some columns of a columnar store, read row group by row group
+
+    Numeric and date groups are memory-mapped; text groups are profiled from
+    their dictionaries. Runs in pool workers, which open the store by path.
+    """
+    from . import storage
+    schema = storage.read_schema(path)
+    profiles = []
+    for i in indexes:
+        column = schema['columns'][i]
+        profile = ColumnProfile(column['name'], column_bounds(schema, i))
+        for g, group in enumerate(schema['row_groups']):
+            dtype = group['dtypes'][i]
+            if dtype == 'object':
+                uniques = storage.read_dictionary(path, i, g)
+                values = np.empty(len(uniques), dtype=object)
+                values[:] = uniques
+                profile.add_distinct(dtype, values, group['nulls'][i])
+            else:
+                profile.update(pd.Series(storage.read_group(path, i, g, dtype)))
+        profiles.append(profile)
+    return profiles
+
+
+def get_pool(workers):
+    """Process pool shared by every upload, started on first use
+
+    Workers are spawned rather than forked: the web process runs threads,
+    and a fork could copy a lock one of them holds.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def profile_store(path, workers=0, progress=None):
+    """ColumnProfile of every column of a columnar store, in column order
+
+    With workers > 1, stores of at least PARALLEL_MIN_CELLS cells are split
+    into column groups profiled by a process pool. Workers memory-map the
+    column files themselves, so only the finished profiles are pickled back.
+    progress(fraction), if given, is called as column groups finish.
+    """
+    from . import storage
+    schema = storage.read_schema(path)
+    indexes = list(range(len(schema['columns'])))
+    if workers <= 1 or len(indexes) < 2 or schema['rows'] * len(indexes) < PARALLEL_MIN_CELLS:
+        profiles = profile_columns(path, indexes)
+        if progress is not None:
+            progress(1.0)
+        return profiles
+    tasks = [indexes[i::workers * TASKS_PER_WORKER] for i in range(min(workers * TASKS_PER_WORKER, len(indexes)))]
+    try:
+        pool = get_pool(workers)
+        futures = {pool.submit(profile_columns, path, task): task for task in tasks}
+    except BrokenProcessPool:
+        reset_pool()
+        return profile_store(path, 0, progress)
+    found = {}
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            found.update(zip(futures[future], future.result()))
+            if progress is not None:
+                progress(done / len(tasks))
+    except BrokenProcessPool:
+        # a worker died; start a fresh pool next time and finish here
+        reset_pool()
+        return profile_store(path, 0, progress)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return [found[i] for i in indexes]
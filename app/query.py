@@ -0,0 +1,292 @@
+import math
+import numpy as np
+import pandas as pd
+
+FUNCS = ('count', 'sum', 'mean', 'min', 'max')
+# partial statistics each aggregate function needs from every chunk
+NEEDS = {'count': ('count',), 'sum': ('sum',), 'mean': ('count', 'sum'), 'min': ('min',), 'max': ('max',)}
+MAX_DATASETS = 8
+# text values are costed at this many bytes when sizing the hash tables
+OBJECT_BYTES = 64
+# partial aggregates are folded together once this many have piled up
+COMBINE_EVERY = 16
+
+
+class QueryError(ValueError):
+    """A query the datasets cannot answer; the message is meant for the client"""
+
+
+class Source:
+    """One dataset taking part in a query
+
+    columns maps column name to its upload metadata (dtype, is_numeric);
+    chunks(columns) yields {column: array} row group by row group and
+    load(columns) returns the columns as a DataFrame in one go.
+    """
+
+    def __init__(self, ds_id, rows, columns, chunks, load):
+        self.id = ds_id
+        self.rows = rows or 0
+        self.columns = columns
+        self.chunks = chunks
+        self.load = load
+
+    def name(self, column):
+        """Column name inside the joined frame, unique across datasets"""
+        return f'{self.id}.{column}'
+
+
+class Query:
+    """Grouped aggregates over datasets hash-joined on key columns
+
+    Every dataset joins the first one on its key columns (a star join). The
+    largest input is streamed through the join chunk by chunk as the probe
+    side; the others are loaded, selected columns only, as in-memory hash
+    tables. When those tables would not fit in memory_bytes both sides are
+    hash partitioned on the keys and joined one partition per pass. A left
+    join keeps every row of the first dataset, so it always probes with it.
+    """
+
+    def __init__(self, sources, on, how='inner', group_by=None, aggregates=None):
+        if not 2 <= len(sources) <= MAX_DATASETS:
+            raise QueryError(f'a query joins from 2 to {MAX_DATASETS} datasets')
+        if how not in ('inner', 'left'):
+            raise QueryError('how must be "inner" or "left"')
+        self.sources = sources
+        self.how = how
+        self.keys = self._parse_keys(on)
+        self.group_by = [self._resolve(ref) for ref in self._as_list(group_by)]
+        self.aggregates = [self._parse_aggregate(agg) for agg in (aggregates or [{'func': 'count'}])]
+        if not self.aggregates:
+            raise QueryError('aggregates must not be empty')
+
+    @staticmethod
+    def _as_list(value):
+        if value is None:
+            return []
+        return value if isinstance(value, list) else [value]
+
+    def _parse_keys(self, on):
+        """One list of key columns per dataset, from a shared name, shared names or a list per dataset"""
+        on = self._as_list(on)
+        if not on:
+            raise QueryError('on must name the join key columns')
+        if all(isinstance(k, list) for k in on):
+            if len(on) != len(self.sources):
+                raise QueryError('on must give one list of key columns per dataset')
+            keys = on
+        else:
+            keys = [on] * len(self.sources)
+        widths = set(len(k) for k in keys)
+        if len(widths) != 1 or not all(isinstance(c, str) for k in keys for c in k):
+            raise QueryError('every dataset needs the same number of key columns')
+        for source, columns in zip(self.sources, keys):
+            missing = [c for c in columns if c not in source.columns]
+            if missing:
+                raise QueryError(f'dataset {source.id} has no column {missing[0]!r}')
+        first = self.sources[0]
+        for source, columns in zip(self.sources[1:], keys[1:]):
+            for left, right in zip(keys[0], columns):
+                a, b = first.columns[left], source.columns[right]
+                if a['is_numeric'] != b['is_numeric']:
+                    raise QueryError(f'cannot join {left!r} with {right!r}: one is numeric and one is not')
+                # uploads from before date detection have no is_datetime
+                if a.get('is_datetime', False) != b.get('is_datetime', False):
+                    raise QueryError(f'cannot join {left!r} with {right!r}: one holds dates and one does not')
+        return keys
+
+    def _resolve(self, ref):
+        """(source, column) for {"dataset": id, "column": name} or a column name
+
+        A bare name must belong to one dataset, except join keys shared by
+        name, which resolve to the first dataset's copy.
+        """
+        if isinstance(ref, dict):
+            matches = [s for s in self.sources if s.id == ref.get('dataset')]
+            if not matches:
+                raise QueryError(f'dataset {ref.get("dataset")} is not part of the query')
+            column = ref.get('column')
+            if column not in matches[0].columns:
+                raise QueryError(f'dataset {matches[0].id} has no column {column!r}')
+            return matches[0], column
+        if not isinstance(ref, str):
+            raise QueryError('columns are given as a name or {"dataset": id, "column": name}')
+        matches = [s for s in self.sources if ref in s.columns]
+        if not matches:
+            raise QueryError(f'column {ref!r} not found')
+        shared_key = all(ref in k for k in self.keys)
+        if len(matches) > 1 and not shared_key:
+            raise QueryError(f'column {ref!r} is in several datasets; use {{"dataset": id, "column": {ref!r}}}')
+        return matches[0], ref
+
+    def _parse_aggregate(self, agg):
+        if not isinstance(agg, dict) or agg.get('func', 'count') not in FUNCS:
+            raise QueryError(f'aggregate func must be one of {", ".join(FUNCS)}')
+        func = agg.get('func', 'count')
+        if agg.get('column') is None:
+            if func != 'count':
+                raise QueryError(f'{func} needs a column')
+            return {'func': func, 'source': None, 'column': None, 'name': agg.get('as') or 'count'}
+        source, column = self._resolve(agg['column'])
+        if func != 'count' and not source.columns[column]['is_numeric']:
+            raise QueryError(f'{func} needs a numeric column, {column!r} is not')
+        return {'func': func, 'source': source, 'column': column,
+                'name': agg.get('as') or f'{func}({column})'}
+
+    def columns_of(self, source):
+        """Columns of one dataset the query reads: keys, then group and aggregate columns"""
+        keys = self.keys[self.sources.index(source)]
+        used = [c for s, c in self.group_by if s is source]
+        used += [a['column'] for a in self.aggregates if a['source'] is source]
+        return list(dict.fromkeys(keys + used))
+
+    def plan(self, memory_bytes):
+        """The probe source, the build sources and the number of partitions"""
+        if self.how == 'left':
+            probe = self.sources[0]
+        else:
+            probe = max(self.sources, key=lambda s: s.rows)
+        builds = [s for s in self.sources if s is not probe]
+        # a hash table costs roughly twice its columns
+        table_bytes = sum(2 * s.rows * self._row_bytes(s) for s in builds)
+        partitions = max(1, math.ceil(table_bytes / memory_bytes)) if memory_bytes else 1
+        return probe, builds, partitions
+
+    def _row_bytes(self, source):
+        total = 0
+        for column in self.columns_of(source):
+            dtype = source.columns[column].get('dtype', 'object')
+            total += OBJECT_BYTES if dtype == 'object' else np.dtype(dtype).itemsize
+        return total
+
+    def _frame(self, source, data):
+        return pd.DataFrame({source.name(c): data[c] for c in self.columns_of(source)})
+
+    def _key_names(self, source):
+        return [source.name(c) for c in self.keys[self.sources.index(source)]]
+
+    def _partition_of(self, frame, keys, partitions):
+        # numeric keys hash as float64 so 1 and 1.0 land in the same partition
+        data = frame[keys].apply(lambda col: col.astype(np.float64) if col.dtype.kind in 'iufb' else col)
+        return pd.util.hash_pandas_object(data, index=False).to_numpy() % partitions
+
+    def _table(self, source, part, partitions):
+        """Hash side for one partition; rows with a missing key can never match and are dropped"""
+        columns = self.columns_of(source)
+        keys = self._key_names(source)
+        if partitions == 1:
+            frame = source.load(columns)[columns]
+            frame.columns = [source.name(c) for c in columns]
+        else:
+            pieces = []
+            for data in source.chunks(columns):
+                frame = self._frame(source, data)
+                pieces.append(frame[self._partition_of(frame, keys, partitions) == part])
+            frame = pd.concat(pieces, ignore_index=True) if pieces else self._frame(source, {c: [] for c in columns})
+        return frame.dropna(subset=keys)
+
+    def _partial(self, frame):
+        """Row count and the statistics each aggregate needs, per group of one joined chunk"""
+        if self.group_by:
+            by = [s.name(c) for s, c in self.group_by]
+        else:
+            by = np.zeros(len(frame), dtype=np.int8)
+        grouped = frame.groupby(by, dropna=False, sort=False, observed=True)
+        data = {'rows': grouped.size()}
+        for agg in self.aggregates:
+            if agg['source'] is None:
+                continue
+            name = agg['source'].name(agg['column'])
+            values = grouped[name]
+            for stat in NEEDS[agg['func']]:
+                key = f'{stat}:{name}'
+                if key not in data:
+                    data[key] = values.sum(min_count=1) if stat == 'sum' else getattr(values, stat)()
+        return pd.DataFrame(data)
+
+    @staticmethod
+    def _combine(partials):
+        stacked = pd.concat(partials)
+        grouped = stacked.groupby(level=list(range(stacked.index.nlevels)), dropna=False, sort=False,
+                                  observed=True)
+        data = {}
+        for key in stacked.columns:
+            stat = key.split(':', 1)[0]
+            if stat == 'sum':
+                data[key] = grouped[key].sum(min_count=1)
+            else:
+                data[key] = getattr(grouped[key], 'sum' if stat in ('rows', 'count') else stat)()
+        return pd.DataFrame(data)
+
+    def run(self, memory_bytes, progress=None):
+        """Join and aggregate; returns the per-group statistics, the joined row count and the plan"""
+        probe, builds, partitions = self.plan(memory_bytes)
+        probe_keys = self._key_names(probe)
+        partials = []
+        joined = 0
+        done = 0
+        total = max(probe.rows * partitions, 1)
+        for part in range(partitions):
+            tables = [(source, self._table(source, part, partitions)) for source in builds]
+            for data in probe.chunks(self.columns_of(probe)):
+                frame = self._frame(probe, data)
+                done += len(frame)
+                if partitions > 1:
+                    frame = frame[self._partition_of(frame, probe_keys, partitions) == part]
+                for source, table in tables:
+                    frame = frame.merge(table, how=self.how, left_on=probe_keys, right_on=self._key_names(source))
+                joined += len(frame)
+                if len(frame):
+                    partials.append(self._partial(frame))
+                if len(partials) >= COMBINE_EVERY:
+                    partials = [self._combine(partials)]
+                if progress is not None:
+                    progress(done / total)
+        stats = self._combine(partials) if partials else None
+        plan = {'probe': probe.id, 'build': [s.id for s in builds], 'partitions': partitions}
+        return stats, joined, plan
+
+    def result(self, stats, joined, plan, limit=None):
+        """Response body: group labels and one series per aggregate, in group order"""
+        labels = []
+        if stats is not None:
+            try:
+                stats = stats.sort_index()
+            except TypeError:
+                # mixed key types have no order; keep first-seen order
+                pass
+            labels = [self._label(key) for key in stats.index] if self.group_by else ['all']
+        total = len(labels)
+        if limit is not None and total > limit:
+            labels, stats = labels[:limit], stats.iloc[:limit]
+        series = []
+        for agg in self.aggregates:
+            values = self._values(agg, stats) if stats is not None else np.array([])
+            series.append({'name': agg['name'], 'func': agg['func'], 'values': values})
+        return {
+            'success': True,
+            'group_by': [c for _, c in self.group_by],
+            'labels': labels,
+            'series': series,
+            'rows': int(joined),
+            'total_groups': total,
+            'truncated': total - len(labels),
+            'plan': plan,
+        }
+
+    @staticmethod
+    def _label(key):
+        parts = key if isinstance(key, tuple) else (key,)
+        return ' / '.join('null' if pd.isna(p) else str(p) for p in parts)
+
+    @staticmethod
+    def _values(agg, stats):
+        if agg['source'] is None:
+            return stats['rows'].to_numpy(dtype=np.int64)
+        name = agg['source'].name(agg['column'])
+        if agg['func'] == 'count':
+            return stats[f'count:{name}'].to_numpy(dtype=np.int64)
+        if agg['func'] == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return stats[f'sum:{name}'].to_numpy(dtype=np.float64) / stats[f'count:{name}'].to_numpy(dtype=np.float64)
+        return stats[f'{agg["func"]}:{name}'].to_numpy(dtype=np.float64)
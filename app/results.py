@@ -0,0 +1,67 @@
+import hashlib
+import json
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .models import CachedResult
+
+# request keys that change how a result is delivered, not what it contains
+TRANSPORT_KEYS = ('async',)
+
+
+def cache_key(kind, payload, defaults):
+    """Hash of the canonical request: kind, payload and the server defaults it relies on"""
+    request = {k: v for k, v in payload.items() if k not in TRANSPORT_KEYS}
+    text = json.dumps([kind, request, defaults], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def lookup(ds_id, key):
+    return CachedResult.query.filter_by(dataset_id=ds_id, key=key).first()
+
+
+def store(ds_id, kind, key, body, max_bytes):
+    """Save a serialized response, then evict the oldest entries beyond max_bytes"""
+    entry = CachedResult(dataset_id=ds_id, kind=kind, key=key, etag=etag_for(body),
+                         body=body, size=len(body.encode()))
+    if entry.size > max_bytes:
+        # too big to keep; callers still serve the unsaved entry
+        return entry
+    db.session.add(entry)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # another request stored the same result first
+        db.session.rollback()
+        return lookup(ds_id, key)
+    evict(max_bytes)
+    return entry
+
+
+def etag_for(body):
+    return hashlib.sha256(body.encode()).hexdigest()[:32]
+
+
+def evict(max_bytes):
+    """Delete the oldest entries until the cache fits in max_bytes"""
+    total = db.session.query(db.func.coalesce(db.func.sum(CachedResult.size), 0)).scalar()
+    if total <= max_bytes:
+        return
+    doomed = []
+    for entry_id, size in db.session.query(CachedResult.id, CachedResult.size).order_by(CachedResult.id):
+        if total <= max_bytes:
+            break
+        doomed.append(entry_id)
+        total -= size
+    CachedResult.query.filter(CachedResult.id.in_(doomed)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def invalidate(ds_id):
+    """Drop every cached result of a dataset"""
+    CachedResult.query.filter_by(dataset_id=ds_id).delete(synchronize_session=False)
+
+
+def stats(max_bytes):
+    entries, total = db.session.query(db.func.count(CachedResult.id),
+                                      db.func.coalesce(db.func.sum(CachedResult.size), 0)).one()
+    return {'entries': entries, 'bytes': int(total), 'max_bytes': max_bytes}
@@ -2,21 +2,221 @@ import os
 import io
 import json
 from datetime import datetime
-from flask import current_app as app, request, jsonify, render_template, send_from_directory
+from flask import current_app as app, g, request, jsonify, render_template, send_from_directory, url_for
 from werkzeug.utils import secure_filename
 from . import db
-from .models import Dataset
-import pandas as pd
-import numpy as np
-from sklearn.linear_model import LinearRegression
+from .models import Aggregate, Dataset, DatasetColumn, Job, Regression
+from . import jobs, metrics, results, serialize
+from .cache import FrameCache
+from .shared import SharedColumns
+# pandas and numpy, and the modules built on them, are imported by the endpoints
+# that need them so a cold start serving the page or the catalog never loads them
 
 ALLOWED = set(['csv', 'tsv'])
+PREVIEW_ROWS = 200
+PREVIEW_MAX_ROWS = 1000
+CATALOG_PAGE = 100
+CATALOG_MAX_PAGE = 1000
+HISTOGRAM_BINS = 10
+HISTOGRAM_MAX_BINS = 1000
+
+frame_cache = FrameCache(app.config['FRAME_CACHE_BYTES'])
+shared_columns = SharedColumns(app.config['SHARED_CACHE_DIR'], app.config['SHARED_CACHE_BYTES'])
+registry = metrics.Registry(app.config['PROFILE_SLOW_MS'], app.logger)
+metrics.time_sql(db.engine)
+job_runner = jobs.JobRunner(app._get_current_object(), app.config['JOB_WORKERS'],
+                            inline=app.config['JOBS_INLINE'], registry=registry,
+                            lock_dir=os.path.join(app.config['UPLOAD_FOLDER'], '.locks'))
+
+
+@app.before_request
+def start_metrics():
+    if request.endpoint != 'static':
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        g.metrics = registry.start(route, request.method)
+
+
+@app.after_request
+def finish_metrics(response):
+    recorder = g.pop('metrics', None)
+    if recorder is not None:
+        profile_id = registry.finish(recorder, response.status_code)
+        response.headers['Server-Timing'] = recorder.server_timing()
+        if profile_id is not None:
+            response.headers['X-Profile-Id'] = str(profile_id)
+    return response
 
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED
 
 
+def column_meta(ds):
+    """Column metadata recorded at upload, keyed by column name"""
+    meta = json.loads(ds.meta_json or '{}')
+    return {c['name']: c for c in meta.get('columns', [])}
+
+
+def use_exact(ds, payload):
+    """Exact statistics unless the dataset is large and the request allows sketches"""
+    exact = payload.get('exact')
+    if exact is None:
+        return (ds.rows or 0) <= app.config['EXACT_MAX_ROWS']
+    return bool(exact)
+
+
+def parse_where(ds, payload):
+    """(filters.Where or None, None) for a request's "filters", or (None, error response)"""
+    from . import filters
+    try:
+        return filters.parse(payload.get('filters'), column_meta(ds)), None
+    except filters.FilterError as e:
+        return None, ({'error': str(e)}, 400)
+
+
+def column_chunks(ds, column, where=None):
+    """Callable yielding a column chunk by chunk, for multi-pass streaming"""
+    from . import storage
+    return lambda: storage.iter_column(app.config['UPLOAD_FOLDER'], ds.filename, column, where=where)
+
+
+def any_row_matches(ds, where):
+    """True once some row passes the filters; stops at the first row group holding one"""
+    from . import storage
+    chunks = storage.iter_columns(app.config['UPLOAD_FOLDER'], ds.filename, where.columns, where=where)
+    return any(len(chunk[where.columns[0]]) for chunk in chunks)
+
+
+def load_dataset(ds, columns=None, where=None):
+    """Load dataset columns through the process-wide frame cache
+
+    Cached columns are held in the compact dtypes recorded at upload, mapped
+    from the copy all worker processes share where they can be.
+    Filtered loads bypass the cache and read only the passing rows.
+    """
+    from . import storage
+    folder = app.config['UPLOAD_FOLDER']
+    dtypes = {name: c.get('compact_dtype') for name, c in column_meta(ds).items()}
+    with metrics.phase('load'):
+        if where is not None:
+            return storage.load_frame(folder, ds.filename, columns, where)
+        mtime = os.path.getmtime(os.path.join(folder, ds.filename))
+        return frame_cache.get_frame(ds.id, mtime, columns,
+                                     lambda cols: shared_columns.load_frame(folder, ds.filename, cols, dtypes))
+
+
+def group_summary(ds, xcol, ycol, load, where=None, resample=None):
+    """Per-group summary of y by x, or by x's time bins when resampling; stored for unfiltered requests"""
+    from . import aggregates
+    if resample is not None:
+        return time_summary(ds, xcol, ycol, resample, where)
+    if where is not None:
+        frame = load([xcol, ycol])
+        with metrics.phase('groupby'):
+            return aggregates.GroupSummary.from_frame(frame, xcol, ycol)
+    return aggregates.get_summary(ds.id, xcol, ycol, lambda: load([xcol, ycol]))
+
+
+def time_summary(ds, xcol, ycol, rule, where=None):
+    """Summary of y, or of row counts when ycol is None, per time bin of the date column x
+
+    The columns are streamed chunk by chunk and binned without loading the dataset.
+    """
+    from . import aggregates, storage, timeseries
+    columns = [xcol] if ycol is None else [xcol, ycol]
+
+    def build():
+        chunks = storage.iter_columns(app.config['UPLOAD_FOLDER'], ds.filename, columns, where=where)
+        with metrics.phase('resample'):
+            return timeseries.resample(((c[xcol], c.get(ycol)) for c in chunks), rule)
+    if where is not None:
+        return build()
+    return aggregates.get_stored(ds.id, timeseries.summary_key(xcol, rule), ycol or '', build)
+
+
+def parse_resample(payload, columns, xcol):
+    """(rule or None, None) for a request's "resample", or (None, error response)"""
+    from .timeseries import RULES
+    rule = payload.get('resample')
+    if rule is None:
+        return None, None
+    if rule not in RULES:
+        return None, ({'error': f'resample must be one of {", ".join(RULES)}'}, 400)
+    if not columns[xcol].get('is_datetime'):
+        return None, ({'error': 'resample needs a date column for x'}, 400)
+    return rule, None
+
+
+def job_accepted(job):
+    """202 response pointing the client at the job to poll"""
+    return jsonify({'success': True, 'job': job.to_dict()}), 202, {'Location': f'/api/jobs/{job.id}'}
+
+
+def cached_result(ds, kind, payload, build):
+    """Result cache entry for a request, running build(ds, payload) on a miss
+
+    Returns (entry, None), or (None, (body, status)) when the request failed;
+    failures are not cached.
+    """
+    defaults = {'exact_max_rows': app.config['EXACT_MAX_ROWS']}
+    key = results.cache_key(kind, payload, defaults)
+    entry = results.lookup(ds.id, key)
+    if entry is None:
+        with metrics.phase('build'):
+            body, status = build(ds, payload)
+        if status != 200:
+            return None, (body, status)
+        with metrics.phase('encode'):
+            text = app.json.dumps(body)
+        entry = results.store(ds.id, kind, key, text, app.config['RESULT_CACHE_BYTES'])
+    return entry, None
+
+
+def cached_response(ds, kind, payload, build):
+    """Serve a request from the result cache with a strong ETag, answering 304 on a match"""
+    entry, error = cached_result(ds, kind, payload, build)
+    if error is not None:
+        return jsonify(error[0]), error[1]
+    binary = serialize.best_format(request.accept_mimetypes) == serialize.MSGPACK
+    # each representation needs its own strong ETag
+    etag = entry.etag + '-mp' if binary else entry.etag
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    elif binary:
+        with metrics.phase('encode'):
+            body = serialize.packb(app.json.loads(entry.body))
+        response = app.response_class(body, mimetype=serialize.MSGPACK)
+    else:
+        response = app.response_class(entry.body, mimetype='application/json')
+    response.set_etag(etag)
+    response.vary.add('Accept')
+    # results never change, but let the browser revalidate so deletes are noticed
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def respond(body, status=200):
+    """JSON response, or MessagePack when the client asks for it"""
+    if serialize.best_format(request.accept_mimetypes) == serialize.MSGPACK:
+        response = app.response_class(serialize.packb(body), status=status, mimetype=serialize.MSGPACK)
+    else:
+        response = jsonify(body)
+        response.status_code = status
+    response.vary.add('Accept')
+    return response
+
+
+def run_report(kind, build, ds_id, payload):
+    """Job body giving the same JSON as the synchronous endpoint, or failing with its error"""
+    ds = db.session.get(Dataset, ds_id)
+    if ds is None:
+        raise jobs.JobError('dataset not found')
+    entry, error = cached_result(ds, kind, payload, build)
+    if error is not None:
+        raise jobs.JobError(error[0]['error'])
+    return app.json.loads(entry.body)
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -30,67 +230,216 @@ def upload():
     if file.filename == '':
         return jsonify({'error': 'no selected file'}), 400
     if file and allowed_file(file.filename):
+        from . import blobs
         filename = secure_filename(file.filename)
-        ts = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        saved_name = f"{ts}_{filename}"
-        path = os.path.join(app.config['UPLOAD_FOLDER'], saved_name)
-        file.save(path)
+        with metrics.phase('save'):
+            # compressed to disk and hashed in one pass; the blob name is the content digest
+            tmp, saved_name, members = blobs.save(file.stream, app.config['UPLOAD_FOLDER'],
+                                                  filename.rsplit('.', 1)[1].lower())
+
+        # parsing and profiling run as a job; the client polls /api/jobs/<id>. The job
+        # moves the saved file into place, and the cleanup removes it if that never happens
+        job = job_runner.submit('upload', lambda ctx: ingest_upload(ctx, tmp, saved_name, filename, members),
+                                cleanup=lambda: discard(tmp))
+        return job_accepted(job)
+    else:
+        return jsonify({'error': 'file type not allowed'}), 400
+
+
+def discard(path):
+    """Remove a file if it is still there"""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def ingest_upload(ctx, tmp, saved_name, filename, members):
+    """Job body for an upload: profile and store the saved file, then record the dataset
 
-        # parse with pandas
+    The upload arrives compressed at tmp and is kept under its content digest.
+    Content some dataset already holds is not parsed again: the new dataset
+    shares that file and columnar copy and copies its metadata. The blob's
+    lock is held only to look for such a dataset and to move the files into
+    place and record the dataset, not while parsing.
+    """
+    from . import blobs, storage, ingest, aggregates
+    folder = app.config['UPLOAD_FOLDER']
+    path = os.path.join(folder, saved_name)
+    store = storage.store_path(folder, saved_name)
+    with blobs.lock(folder, saved_name):
+        ds = share_existing(saved_name, filename, path, store)
+    if ds is not None:
+        os.remove(tmp)
+        ctx.dataset_id = ds.id
+        return {'success': True, 'dataset': ds.to_dict()}
+
+    # parsed next to the saved file and renamed into place under the lock, so
+    # the lock is not held while a large upload is parsed and profiled
+    tmp_store = storage.store_path(folder, os.path.basename(tmp))
+    try:
+        # stream the file in chunks, profiling columns and writing the columnar copy
+        ctx.progress(0.0, 'parsing')
         try:
-            sep = ','
-            if filename.lower().endswith('.tsv'):
-                sep = '\t'
-            df = pd.read_csv(path, sep=sep)
+            with metrics.phase('parse'):
+                meta = ingest.ingest_csv(tmp, storage.csv_sep(saved_name), tmp_store, members=members,
+                                         workers=app.config['PROFILING_WORKERS'],
+                                         progress=lambda fraction: ctx.progress(0.9 * fraction))
+            metrics.count(rows=meta['rows'], nbytes=os.path.getsize(tmp))
+        except jobs.JobCancelled:
+            raise
         except Exception as e:
-            return jsonify({'error': 'failed parsing CSV', 'detail': str(e)}), 400
-
-        meta = {}
-        meta['columns'] = []
-        for col in df.columns:
-            dtype = str(df[col].dtype)
-            is_numeric = pd.api.types.is_numeric_dtype(df[col])
-            unique_sample = df[col].dropna().unique()[:5].tolist()
-            meta['columns'].append({
-                'name': col,
-                'dtype': dtype,
-                'is_numeric': bool(is_numeric),
-                'unique_sample': unique_sample,
-                'unique_count': int(df[col].nunique(dropna=True)),
-            })
-        rows, cols = df.shape
-        meta['rows'] = int(rows)
-        meta['cols'] = int(cols)
-
-        ds = Dataset(filename=saved_name, original_name=filename, rows=rows, cols=cols, meta_json=json.dumps(meta))
-        db.session.add(ds)
-        db.session.commit()
+            raise jobs.JobError(f'failed parsing CSV: {e}')
+        # last chance to cancel before the dataset becomes visible
+        ctx.progress(0.9, 'summarising columns')
+
+        with blobs.lock(folder, saved_name):
+            # the same content may have been stored by another upload meanwhile
+            ds = share_existing(saved_name, filename, path, store)
+            if ds is not None:
+                ctx.dataset_id = ds.id
+                return {'success': True, 'dataset': ds.to_dict()}
+            os.replace(tmp, path)
+            # a store left behind without a dataset, e.g. by a stopped worker, is replaced
+            storage.remove_store(store)
+            os.replace(tmp_store, store)
+            ds = Dataset(filename=saved_name, original_name=filename, rows=meta['rows'], cols=meta['cols'],
+                         meta_json=json.dumps(meta), dataset_columns=DatasetColumn.from_meta(meta))
+            db.session.add(ds)
+            db.session.commit()
+    finally:
+        storage.remove_store(tmp_store)
+        discard(tmp)
+    ctx.dataset_id = ds.id
+
+    # summarise low-cardinality categorical columns up front for the chart endpoints
+    try:
+        with metrics.phase('summarise'):
+            aggregates.build_eager(ds.id, meta, lambda cols: load_dataset(ds, cols))
+    except Exception as e:
+        db.session.rollback()
+        app.logger.warning('failed building aggregates for %s: %s', saved_name, e)
 
-        # store a small preview as CSV-in-memory if needed or rely on file reads
-        return jsonify({'success': True, 'dataset': ds.to_dict()}), 201
-    else:
-        return jsonify({'error': 'file type not allowed'}), 400
+    return {'success': True, 'dataset': ds.to_dict()}
+
+
+def share_existing(saved_name, filename, path, store):
+    """New dataset sharing the stored copy of saved_name, or None if no dataset holds it yet
+
+    Called under the blob's lock.
+    """
+    from . import storage
+    source = Dataset.query.filter_by(filename=saved_name).order_by(Dataset.id).first()
+    if source is None or not os.path.exists(path) or not storage.has_store(store):
+        return None
+    return share_dataset(source, filename)
+
+
+def share_dataset(source, filename):
+    """New dataset for content already uploaded as source, with its metadata and stored summaries"""
+    ds = Dataset(filename=source.filename, original_name=filename, rows=source.rows, cols=source.cols,
+                 meta_json=source.meta_json, dataset_columns=DatasetColumn.from_meta(json.loads(source.meta_json)),
+                 aggregates=[Aggregate(x_column=a.x_column, y_column=a.y_column, summary_json=a.summary_json)
+                             for a in source.aggregates],
+                 regressions=[Regression(x_column=r.x_column, y_column=r.y_column, stats_json=r.stats_json)
+                              for r in source.regressions])
+    db.session.add(ds)
+    db.session.commit()
+    return ds
+
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    job = Job.query.get_or_404(job_id)
+    # a job whose worker process stopped is failed here rather than polled forever
+    job_runner.recover([job])
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = Job.query.get_or_404(job_id)
+    if not job_runner.cancel(job):
+        return jsonify({'error': f'job already {job.status}', 'job': job.to_dict()}), 409
+    return jsonify({'success': True, 'job': job.to_dict()})
 
 
 @app.route('/api/datasets', methods=['GET'])
 def list_datasets():
-    all_ds = Dataset.query.order_by(Dataset.upload_time.desc()).all()
-    return jsonify([d.to_dict() for d in all_ds])
+    """
+    Uploaded datasets, newest first, one page at a time.
+    Query: limit (default 100, at most 1000), after (cursor of the next page, given in the Link header),
+           metadata=1 to add each dataset's column metadata
+    A Link header with rel="next" points at the following page while there is one.
+    """
+    limit = request.args.get('limit', CATALOG_PAGE, type=int)
+    if not 1 <= limit <= CATALOG_MAX_PAGE:
+        return jsonify({'error': f'limit must be between 1 and {CATALOG_MAX_PAGE}'}), 400
+    with_meta = request.args.get('metadata', '').lower() in ('1', 'true', 'yes')
+
+    # only the listed fields are read; meta_json is never loaded or parsed
+    query = db.session.query(Dataset.id, Dataset.original_name, Dataset.upload_time, Dataset.rows, Dataset.cols)
+    after = request.args.get('after')
+    if after:
+        try:
+            stamp, _, last_id = after.rpartition('_')
+            stamp, last_id = datetime.fromisoformat(stamp), int(last_id)
+        except ValueError:
+            return jsonify({'error': 'after must be the cursor from a Link header'}), 400
+        query = query.filter(db.or_(Dataset.upload_time < stamp,
+                                    db.and_(Dataset.upload_time == stamp, Dataset.id < last_id)))
+    rows = query.order_by(Dataset.upload_time.desc(), Dataset.id.desc()).limit(limit + 1).all()
+    page = [{'id': r.id, 'original_name': r.original_name, 'upload_time': r.upload_time.isoformat(),
+             'rows': r.rows, 'cols': r.cols} for r in rows[:limit]]
+
+    if with_meta and page:
+        columns = {entry['id']: [] for entry in page}
+        fields = DatasetColumn.FIELDS
+        found = (db.session.query(DatasetColumn.dataset_id, *(getattr(DatasetColumn, f) for f in fields))
+                 .filter(DatasetColumn.dataset_id.in_(list(columns)))
+                 .order_by(DatasetColumn.dataset_id, DatasetColumn.position))
+        for row in found:
+            columns[row[0]].append(dict(zip(fields, row[1:])))
+        for entry in page:
+            entry['metadata'] = {'columns': columns[entry['id']], 'rows': entry['rows'], 'cols': entry['cols']}
+
+    response = jsonify(page)
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        params = {'limit': limit, 'after': f'{last.upload_time.isoformat()}_{last.id}'}
+        if with_meta:
+            params['metadata'] = 1
+        response.headers['Link'] = f'<{url_for("list_datasets", **params)}>; rel="next"'
+    return response
 
 
 @app.route('/api/dataset/<int:ds_id>/preview', methods=['GET'])
 def dataset_preview(ds_id):
+    """
+    One page of rows, column by column.
+    Query: offset (default 0), limit (default 200, at most 1000), columns (comma separated)
+    """
+    from . import storage
     ds = Dataset.query.get_or_404(ds_id)
     path = os.path.join(app.config['UPLOAD_FOLDER'], ds.filename)
     if not os.path.exists(path):
         return jsonify({'error': 'file not found'}), 404
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', PREVIEW_ROWS, type=int)
+    if offset < 0 or limit < 0:
+        return jsonify({'error': 'offset and limit must be non-negative integers'}), 400
+    limit = min(limit, PREVIEW_MAX_ROWS)
+    columns = request.args.get('columns')
+    if columns:
+        columns = columns.split(',')
+        known = column_meta(ds)
+        if any(c not in known for c in columns):
+            return jsonify({'error': 'column not found'}), 400
     try:
-        # read first 200 rows
-        df = pd.read_csv(path, nrows=200)
-        records = df.fillna('').to_dict(orient='records')
-        return jsonify({'rows': records, 'columns': df.columns.tolist()})
+        df = storage.read_rows(app.config['UPLOAD_FOLDER'], ds.filename, offset, limit, columns or None)
     except Exception as e:
         return jsonify({'error': 'failed reading file', 'detail': str(e)}), 500
+    # missing values become null; numpy scalars become plain Python values
+    data = [df[col].astype(object).where(df[col].notna(), None).tolist() for col in df.columns]
+    return jsonify({'columns': df.columns.tolist(), 'offset': offset, 'total_rows': ds.rows, 'data': data})
 
 
 @app.route('/api/dataset/<int:ds_id>/columns', methods=['GET'])
@@ -100,193 +449,309 @@ def dataset_columns(ds_id):
     return jsonify(meta.get('columns', []))
 
 
-@app.route('/api/dataset/<int:ds_id>/chart', methods=['POST'])
+@app.route('/api/dataset/<int:ds_id>/chart', methods=['GET', 'POST'])
 def dataset_chart(ds_id):
+    # GET takes the spec as query parameters so browsers can cache and revalidate it
+    payload = chart_spec(request.args) if request.method == 'GET' else request.get_json() or {}
+    ds = Dataset.query.get_or_404(ds_id)
+    path = os.path.join(app.config['UPLOAD_FOLDER'], ds.filename)
+    if not os.path.exists(path):
+        return jsonify({'error': 'file not found'}), 404
+
+    return cached_response(ds, 'chart', payload,
+                           lambda ds, spec: build_chart(ds, spec, lambda cols, where: load_dataset(ds, cols, where)))
+
+
+def chart_spec(args):
+    """Chart spec from query parameters, typed like the JSON body"""
+    spec = {key: args[key] for key in ('x', 'y', 'type', 'agg', 'resample') if key in args}
+    for key in ('bins', 'max_points'):
+        if key in args:
+            try:
+                spec[key] = int(args[key])
+            except ValueError:
+                # kept as given; build_chart answers 400 for anything but an integer
+                spec[key] = args[key]
+    if 'exact' in args:
+        spec['exact'] = args['exact'].lower() in ('1', 'true', 'yes')
+    if 'filters' in args:
+        try:
+            spec['filters'] = json.loads(args['filters'])
+        except ValueError:
+            # left as text so build_chart rejects it with its usual message
+            spec['filters'] = args['filters']
+    return spec
+
+
+@app.route('/api/dataset/<int:ds_id>/charts', methods=['POST'])
+def dataset_charts(ds_id):
+    """
+    Compute several charts in one request.
+    Expects JSON: { "charts": [ { "x": ..., "y": ..., "type": ... }, ... ] }
+    """
     payload = request.get_json() or {}
-    xcol = payload.get('x')
-    ycol = payload.get('y')
-    chart_type = payload.get('type', 'bar')
-    agg = payload.get('agg', 'mean')
+    specs = payload.get('charts')
+    if not isinstance(specs, list) or not specs or not all(isinstance(spec, dict) for spec in specs):
+        return jsonify({'error': 'charts must be a non-empty list of chart specs'}), 400
 
     ds = Dataset.query.get_or_404(ds_id)
     path = os.path.join(app.config['UPLOAD_FOLDER'], ds.filename)
     if not os.path.exists(path):
         return jsonify({'error': 'file not found'}), 404
 
-    try:
-        df = pd.read_csv(path)
-    except Exception as e:
-        return jsonify({'error': 'failed reading file', 'detail': str(e)}), 500
+    # specs with the same filters read from one frame holding the union of the columns they name
+    needed = [spec.get(key) for spec in specs for key in ('x', 'y')]
+    shared = {}
+
+    def load(columns, where):
+        key = where.key if where is not None else None
+        if key not in shared:
+            shared[key] = load_dataset(ds, needed, where)
+        return shared[key]
+
+    charts = []
+    for spec in specs:
+        try:
+            entry, error = cached_result(ds, 'chart', spec, lambda ds, spec: build_chart(ds, spec, load))
+        except Exception as e:
+            # one broken spec gets an error entry; the other charts are still returned
+            db.session.rollback()
+            app.logger.exception('chart spec %s failed', spec)
+            entry, error = None, ({'error': 'failed building chart', 'detail': str(e)}, 500)
+        body, status = (app.json.loads(entry.body), 200) if error is None else error
+        body['status'] = status
+        charts.append(body)
+    return respond({'charts': charts})
+
+
+def build_chart(ds, payload, load):
+    """Compute one chart payload; load(columns, where) returns a frame with those columns"""
+    import numpy as np
+    from . import downsample, sketches
+    xcol = payload.get('x')
+    ycol = payload.get('y')
+    chart_type = payload.get('type', 'bar')
+    agg = payload.get('agg', 'mean')
+    # opt-in: without max_points every group is returned
+    max_points = payload.get('max_points')
+
+    if max_points is not None and (not isinstance(max_points, int) or max_points < 3):
+        return {'error': 'max_points must be an integer of at least 3'}, 400
 
     if xcol is None:
-        return jsonify({'error': 'x column required'}), 400
+        return {'error': 'x column required'}, 400
+
+    if chart_type in ['line', 'bar'] and ycol is None:
+        return {'error': 'y column required for this chart type'}, 400
+
+    where, error = parse_where(ds, payload)
+    if error is not None:
+        return error
+
+    # grouped charts are answered from the stored per-group summary
+    if chart_type != 'histogram' and ycol:
+        columns = column_meta(ds)
+        if xcol not in columns or ycol not in columns:
+            return {'error': 'column not found'}, 400
+        if not columns[ycol]['is_numeric']:
+            return {'error': 'y column must be numeric'}, 400
+        resample, error = parse_resample(payload, columns, xcol)
+        if error is not None:
+            return error
+        try:
+            summary = group_summary(ds, xcol, ycol, lambda cols: load(cols, where), where, resample)
+        except Exception as e:
+            return {'error': 'failed reading file', 'detail': str(e)}, 500
+        if agg == 'sum':
+            grouped = summary.sum()
+        else:
+            grouped = summary.mean()
+        labels = grouped.index.tolist()
+        values = grouped.fillna(0).to_numpy(dtype=np.float64)
+        total = len(labels)
+        labels, values, dropped = downsample.reduce_points(
+            chart_type, labels, values, max_points, lambda rest: summary.pooled(rest, agg))
+        return {'labels': labels, 'values': values, 'type': chart_type,
+                'total_points': total, 'dropped': dropped}, 200
 
     # Handle histogram
     if chart_type == 'histogram':
-        if xcol not in df.columns:
-            return jsonify({'error': 'column not found'}), 400
-        
-        # Get numeric data for histogram
-        data = df[xcol].dropna()
+        columns = column_meta(ds)
+        if xcol not in columns:
+            return {'error': 'column not found'}, 400
         
         # Check if data is numeric
-        if not pd.api.types.is_numeric_dtype(data):
-            return jsonify({'error': 'histogram requires numeric column'}), 400
-        
-        # Calculate histogram bins (default 10 bins)
-        num_bins = payload.get('bins', 10)
+        if not columns[xcol]['is_numeric']:
+            return {'error': 'histogram requires numeric column'}, 400
+        if payload.get('resample') is not None:
+            return {'error': 'histograms cannot be resampled'}, 400
         
-        # Use numpy histogram for better control
-        import numpy as np
-        counts, bin_edges = np.histogram(data, bins=num_bins)
+        num_bins = payload.get('bins', HISTOGRAM_BINS)
+        if not isinstance(num_bins, int) or isinstance(num_bins, bool) or not 1 <= num_bins <= HISTOGRAM_MAX_BINS:
+            return {'error': f'bins must be an integer from 1 to {HISTOGRAM_MAX_BINS}'}, 400
         
-        # Create labels from bin edges
-        labels = []
-        for i in range(len(bin_edges) - 1):
-            labels.append(f"{bin_edges[i]:.2f}-{bin_edges[i+1]:.2f}")
+        try:
+            if use_exact(ds, payload):
+                # Use numpy histogram for better control
+                data = load([xcol], where)[xcol].dropna()
+                counts, bin_edges = np.histogram(data, bins=num_bins)
+            else:
+                # two chunked passes give the same bins without loading the column
+                counts, bin_edges = sketches.stream_histogram(column_chunks(ds, xcol, where), bins=num_bins)
+        except Exception as e:
+            return {'error': 'failed reading file', 'detail': str(e)}, 500
         
-        # Convert numpy int64 to Python int for JSON serialization
-        values = [int(count) for count in counts]
+        # Create labels from bin edges, formatting each edge once
+        edges = ['%.2f' % edge for edge in bin_edges.tolist()]
+        labels = [f'{low}-{high}' for low, high in zip(edges, edges[1:])]
         
-        return jsonify({'labels': labels, 'values': values, 'type': 'histogram'})
-
-    if chart_type in ['line', 'bar'] and ycol is None:
-        return jsonify({'error': 'y column required for this chart type'}), 400
+        # counts stay a NumPy array; the JSON provider writes it directly
+        return {'labels': labels, 'values': counts, 'type': 'histogram'}, 200
+
+    if payload.get('resample') is not None:
+        columns = column_meta(ds)
+        if xcol not in columns:
+            return {'error': 'column not found'}, 400
+        resample, error = parse_resample(payload, columns, xcol)
+        if error is not None:
+            return error
+        # rows per time bin, in time order
+        try:
+            summary = time_summary(ds, xcol, None, resample, where)
+        except Exception as e:
+            return {'error': 'failed reading file', 'detail': str(e)}, 500
+        values = summary.count.astype(np.int64)
+        total = len(summary.labels)
+        labels, values, dropped = downsample.reduce_points(
+            'bar', summary.labels, values, max_points, lambda rest: summary.count[rest].sum())
+        return {'labels': labels, 'values': values, 'type': 'bar',
+                'total_points': total, 'dropped': dropped}, 200
+
+    if xcol not in column_meta(ds):
+        return {'error': 'column not found'}, 400
+    try:
+        df = load([xcol, ycol], where)
+    except Exception as e:
+        return {'error': 'failed reading file', 'detail': str(e)}, 500
 
-    # simple grouping
-    if ycol:
-        if agg == 'sum':
-            grouped = df.groupby(xcol)[ycol].sum()
-        else:
-            grouped = df.groupby(xcol)[ycol].mean()
-        labels = grouped.index.astype(str).tolist()
-        values = grouped.fillna(0).astype(float).tolist()
-        return jsonify({'labels': labels, 'values': values, 'type': chart_type})
-    else:
-        # when y not provided, we can return counts per x
-        counts = df[xcol].value_counts()
-        labels = counts.index.astype(str).tolist()
-        values = counts.astype(int).tolist()
-        return jsonify({'labels': labels, 'values': values, 'type': 'bar'})
+    # when y not provided, we can return counts per x
+    counts = df[xcol].value_counts()
+    labels = counts.index.astype(str).tolist()
+    values = counts.to_numpy(dtype=np.int64)
+    total = len(labels)
+    labels, values, dropped = downsample.reduce_points(
+        'bar', labels, values, max_points, lambda rest: counts.iloc[rest].sum())
+    return {'labels': labels, 'values': values, 'type': 'bar',
+            'total_points': total, 'dropped': dropped}, 200
 
 
 @app.route('/api/dataset/<int:ds_id>', methods=['DELETE'])
 def delete_dataset(ds_id):
+    from . import blobs, storage
     ds = Dataset.query.get_or_404(ds_id)
     path = os.path.join(app.config['UPLOAD_FOLDER'], ds.filename)
-    
-    # Delete file from filesystem if it exists
-    if os.path.exists(path):
-        try:
-            os.remove(path)
-        except Exception as e:
-            return jsonify({'error': 'failed to delete file', 'detail': str(e)}), 500
-    
-    # Delete from database
-    db.session.delete(ds)
-    db.session.commit()
-    
+
+    with blobs.lock(app.config['UPLOAD_FOLDER'], ds.filename):
+        # identical uploads share one file; it goes with the last dataset using it
+        shared = Dataset.query.filter(Dataset.filename == ds.filename, Dataset.id != ds.id).count()
+        if not shared:
+            # Delete file from filesystem if it exists
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except Exception as e:
+                    return jsonify({'error': 'failed to delete file', 'detail': str(e)}), 500
+            storage.remove_store(storage.store_path(app.config['UPLOAD_FOLDER'], ds.filename))
+            shared_columns.remove(ds.filename)
+        frame_cache.invalidate(ds.id)
+        results.invalidate(ds.id)
+
+        # Delete from database
+        db.session.delete(ds)
+        db.session.commit()
+
     return jsonify({'success': True, 'message': 'Dataset deleted successfully'})
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    stats = frame_cache.stats()
+    stats['results'] = results.stats(app.config['RESULT_CACHE_BYTES'])
+    stats['shared'] = shared_columns.stats()
+    return jsonify(stats)
+
+
 @app.route('/api/dataset/<int:ds_id>/predict', methods=['POST'])
 def predict_trend(ds_id):
     """
     Predict future trends using linear regression.
-    Expects JSON: { "x": "column_name", "y": "column_name", "years": 3/4/5 }
+    Expects JSON: { "x": "column_name", "y": "column_name" or [names], "years": 1-100, "level": 0.95 }
     """
     payload = request.get_json() or {}
+    ds = Dataset.query.get_or_404(ds_id)
+    path = os.path.join(app.config['UPLOAD_FOLDER'], ds.filename)
+    if not os.path.exists(path):
+        return jsonify({'error': 'file not found'}), 404
+
+    # "async": true runs the work as a job and answers 202 with the job to poll
+    if payload.get('async'):
+        job = job_runner.submit('predict', lambda ctx: run_report('predict', build_prediction, ds_id, payload), dataset_id=ds_id)
+        return job_accepted(job)
+    return cached_response(ds, 'predict', payload, build_prediction)
+
+
+def build_prediction(ds, payload):
+    """Fit trend lines and forecast; returns the response body and status"""
+    from . import storage, forecast
     xcol = payload.get('x')
     ycol = payload.get('y')
     years = payload.get('years', 3)
+    level = payload.get('level', 0.95)
     
     if xcol is None or ycol is None:
-        return jsonify({'error': 'both x and y columns required for prediction'}), 400
+        return {'error': 'both x and y columns required for prediction'}, 400
     
-    if years not in [3, 4, 5]:
-        return jsonify({'error': 'years must be 3, 4, or 5'}), 400
+    if not isinstance(years, int) or isinstance(years, bool) or not 1 <= years <= forecast.MAX_STEPS:
+        return {'error': f'years must be an integer from 1 to {forecast.MAX_STEPS}'}, 400
+
+    if not isinstance(level, (int, float)) or not 0 < level < 1:
+        return {'error': 'level must be between 0 and 1'}, 400
+
+    # a list of y columns is forecast against the same x in one pass
+    ycols = ycol if isinstance(ycol, list) else [ycol]
+    columns = column_meta(ds)
+    if xcol not in columns or not ycols or any(y not in columns for y in ycols):
+        return {'error': 'column not found'}, 400
     
-    ds = Dataset.query.get_or_404(ds_id)
-    path = os.path.join(app.config['UPLOAD_FOLDER'], ds.filename)
-    if not os.path.exists(path):
-        return jsonify({'error': 'file not found'}), 404
+    # Check if both columns are numeric
+    if not all(columns[c]['is_numeric'] for c in [xcol] + ycols):
+        return {'error': 'both columns must be numeric for prediction'}, 400
+
+    where, error = parse_where(ds, payload)
+    if error is not None:
+        return error
     
     try:
-        df = pd.read_csv(path)
+        chunks = lambda cols: storage.iter_columns(app.config['UPLOAD_FOLDER'], ds.filename, cols, where=where)
+        with metrics.phase('fit'):
+            if where is not None:
+                # statistics of a filtered subset are not stored
+                fits = forecast.compute_stats(xcol, ycols, chunks)
+            else:
+                fits = forecast.get_stats(ds.id, xcol, ycols, chunks)
     except Exception as e:
-        return jsonify({'error': 'failed reading file', 'detail': str(e)}), 500
-    
-    if xcol not in df.columns or ycol not in df.columns:
-        return jsonify({'error': 'column not found'}), 400
-    
-    # Check if both columns are numeric
-    if not pd.api.types.is_numeric_dtype(df[xcol]) or not pd.api.types.is_numeric_dtype(df[ycol]):
-        return jsonify({'error': 'both columns must be numeric for prediction'}), 400
-    
-    # Remove missing values
-    clean_df = df[[xcol, ycol]].dropna()
-    
-    if len(clean_df) < 2:
-        return jsonify({'error': 'insufficient data for prediction'}), 400
-    
-    # Prepare data for linear regression
-    X = clean_df[xcol].values.reshape(-1, 1)
-    y = clean_df[ycol].values
-    
-    # Fit linear regression model
-    model = LinearRegression()
-    model.fit(X, y)
-    
-    # Get current data stats
-    current_max_x = clean_df[xcol].max()
-    current_min_x = clean_df[xcol].min()
-    x_range = current_max_x - current_min_x
-    
-    # Determine step size for predictions
-    # If x appears to be years, use 1-year steps
-    # Otherwise, extrapolate based on data distribution
-    step = 1 if x_range < 100 else x_range / len(clean_df)
-    
-    # Generate future X values
-    future_x = []
-    for i in range(1, years + 1):
-        future_x.append(current_max_x + (i * step))
-    
-    # Predict future values
-    future_X = np.array(future_x).reshape(-1, 1)
-    predictions = model.predict(future_X)
+        return {'error': 'failed reading file', 'detail': str(e)}, 500
     
-    # Calculate R² score and trend direction
-    r2_score = model.score(X, y)
-    slope = model.coef_[0]
-    trend_direction = 'increasing' if slope > 0 else 'decreasing' if slope < 0 else 'stable'
+    if any(fits[y].n < 2 for y in ycols):
+        return {'error': 'insufficient data for prediction'}, 400
     
-    # Format predictions
-    forecast = []
-    for i, (x_val, y_pred) in enumerate(zip(future_x, predictions)):
-        forecast.append({
-            'x': float(x_val),
-            'y': float(y_pred),
-            'year': i + 1
-        })
-    
-    return jsonify({
-        'success': True,
-        'forecast': forecast,
-        'model_info': {
-            'r2_score': float(r2_score),
-            'slope': float(slope),
-            'intercept': float(model.intercept_),
-            'trend': trend_direction
-        },
-        'current_data': {
-            'x_min': float(current_min_x),
-            'x_max': float(current_max_x),
-            'y_min': float(clean_df[ycol].min()),
-            'y_max': float(clean_df[ycol].max()),
-            'data_points': len(clean_df)
-        }
-    })
+    if isinstance(ycol, list):
+        return {
+            'success': True,
+            'x': xcol,
+            'predictions': [dict(forecast.forecast(fits[y], years, level), y=y) for y in ycols],
+        }, 200
+    return dict(forecast.forecast(fits[ycol], years, level), success=True), 200
 
 
 @app.route('/api/dataset/<int:ds_id>/analyze', methods=['POST'])
@@ -296,71 +761,74 @@ def analyze_charts(ds_id):
     Expects JSON: { "x": "column_name", "y": "column_name" }
     """
     payload = request.get_json() or {}
+    ds = Dataset.query.get_or_404(ds_id)
+    path = os.path.join(app.config['UPLOAD_FOLDER'], ds.filename)
+    if not os.path.exists(path):
+        return jsonify({'error': 'file not found'}), 404
+
+    # "async": true runs the work as a job and answers 202 with the job to poll
+    if payload.get('async'):
+        job = job_runner.submit('analyze', lambda ctx: run_report('analyze', build_analysis, ds_id, payload), dataset_id=ds_id)
+        return job_accepted(job)
+    return cached_response(ds, 'analyze', payload, build_analysis)
+
+
+def build_analysis(ds, payload):
+    """Build every analysis report; returns the response body and status"""
+    from . import sketches
+    from .analysis import AnalysisEngine
     xcol = payload.get('x')
     ycol = payload.get('y')
     
     if xcol is None:
-        return jsonify({'error': 'x column required'}), 400
+        return {'error': 'x column required'}, 400
     
-    ds = Dataset.query.get_or_404(ds_id)
-    path = os.path.join(app.config['UPLOAD_FOLDER'], ds.filename)
-    if not os.path.exists(path):
-        return jsonify({'error': 'file not found'}), 404
+    columns = column_meta(ds)
+    if xcol not in columns:
+        return {'error': 'x column not found'}, 400
     
+    if ycol and ycol not in columns:
+        return {'error': 'y column not found'}, 400
+
+    if ycol and not columns[ycol]['is_numeric']:
+        return {'error': 'y column must be numeric'}, 400
+
+    where, error = parse_where(ds, payload)
+    if error is not None:
+        return error
+
+    resample, error = parse_resample(payload, columns, xcol)
+    if error is not None:
+        return error
+
+    # grouped reports share one stored summary; only the histogram needs raw rows
     try:
-        df = pd.read_csv(path)
+        # checked up front so reports with and without y refuse an empty selection alike
+        if where is not None and not any_row_matches(ds, where):
+            return {'error': 'no rows match the filters'}, 400
+        summary = None
+        if ycol:
+            summary = group_summary(ds, xcol, ycol, lambda cols: load_dataset(ds, cols, where), where, resample)
+        x_values = x_stats = None
+        if columns[xcol]['is_numeric']:
+            if use_exact(ds, payload):
+                x_values = load_dataset(ds, [xcol], where)[xcol].dropna()
+            else:
+                # large columns are streamed through quantile and frequency sketches
+                with metrics.phase('describe'):
+                    x_stats = sketches.stream_describe(column_chunks(ds, xcol, where))
     except Exception as e:
-        return jsonify({'error': 'failed reading file', 'detail': str(e)}), 500
-    
-    if xcol not in df.columns:
-        return jsonify({'error': 'x column not found'}), 400
-    
-    if ycol and ycol not in df.columns:
-        return jsonify({'error': 'y column not found'}), 400
-    
-    reports = []
-    
-    # Report 1: Bar Chart Analysis
-    if ycol:
-        bar_analysis = analyze_bar_chart(df, xcol, ycol)
-        reports.append({
-            'serial': 1,
-            'chart_type': 'Bar Chart',
-            'icon': '📊',
-            'analysis': bar_analysis
-        })
-    
-    # Report 2: Line Chart Analysis
-    if ycol:
-        line_analysis = analyze_line_chart(df, xcol, ycol)
-        reports.append({
-            'serial': 2,
-            'chart_type': 'Line Chart',
-            'icon': '📈',
-            'analysis': line_analysis
-        })
-    
-    # Report 3: Pie Chart Analysis
-    if ycol:
-        pie_analysis = analyze_pie_chart(df, xcol, ycol)
-        reports.append({
-            'serial': 3,
-            'chart_type': 'Pie Chart',
-            'icon': '🥧',
-            'analysis': pie_analysis
-        })
-    
-    # Report 4: Histogram Analysis
-    if pd.api.types.is_numeric_dtype(df[xcol]):
-        histogram_analysis = analyze_histogram(df, xcol)
-        reports.append({
-            'serial': 4,
-            'chart_type': 'Histogram',
-            'icon': '📉',
-            'analysis': histogram_analysis
-        })
+        return {'error': 'failed reading file', 'detail': str(e)}, 500
+
+    if where is not None and summary is not None and not summary.labels:
+        return {'error': 'no rows match the filters'}, 400
+
+    # every report is built from the shared summary and one sorted pass over x
+    with metrics.phase('report'):
+        engine = AnalysisEngine(xcol, ycol, summary=summary, x_values=x_values, x_stats=x_stats)
+        reports = engine.reports()
     
-    return jsonify({
+    return {
         'success': True,
         'reports': reports,
         'dataset_info': {
@@ -370,230 +838,167 @@ def analyze_charts(ds_id):
             'x_column': xcol,
             'y_column': ycol
         }
-    })
+    }, 200
 
 
-def analyze_bar_chart(df, xcol, ycol):
-    """Analyze bar chart data and generate insights"""
-    grouped = df.groupby(xcol)[ycol].mean()
-    
-    insights = {
-        'summary': f'Analyzing {len(grouped)} categories by average {ycol}',
-        'statistics': {
-            'total_categories': int(len(grouped)),
-            'highest_value': float(grouped.max()),
-            'lowest_value': float(grouped.min()),
-            'average_value': float(grouped.mean()),
-            'median_value': float(grouped.median()),
-            'std_deviation': float(grouped.std())
-        },
-        'top_performers': [],
-        'bottom_performers': [],
-        'key_insights': []
-    }
-    
-    # Top 3 categories
-    top_3 = grouped.nlargest(3)
-    for idx, (category, value) in enumerate(top_3.items(), 1):
-        insights['top_performers'].append({
-            'rank': idx,
-            'category': str(category),
-            'value': float(value)
-        })
-    
-    # Bottom 3 categories
-    bottom_3 = grouped.nsmallest(3)
-    for idx, (category, value) in enumerate(bottom_3.items(), 1):
-        insights['bottom_performers'].append({
-            'rank': idx,
-            'category': str(category),
-            'value': float(value)
-        })
-    
-    # Generate key insights
-    value_range = grouped.max() - grouped.min()
-    insights['key_insights'].append(f"The data spans a range of {value_range:.2f} units")
-    
-    if grouped.std() / grouped.mean() > 0.5:
-        insights['key_insights'].append("High variability detected across categories")
+@app.route('/api/dataset/<int:ds_id>/summary', methods=['GET'])
+def dataset_summary(ds_id):
+    """
+    Describe statistics of the numeric columns and their Pearson and Spearman correlation matrices.
+    Query: columns (comma separated, default every numeric column), exact (1 or 0)
+    """
+    ds = Dataset.query.get_or_404(ds_id)
+    path = os.path.join(app.config['UPLOAD_FOLDER'], ds.filename)
+    if not os.path.exists(path):
+        return jsonify({'error': 'file not found'}), 404
+    payload = {}
+    if 'columns' in request.args:
+        payload['columns'] = request.args['columns'].split(',')
+    if 'exact' in request.args:
+        payload['exact'] = request.args['exact'].lower() in ('1', 'true', 'yes')
+    return cached_response(ds, 'summary', payload, build_summary)
+
+
+def build_summary(ds, payload):
+    """Summary of every requested numeric column in one pass; returns the response body and status"""
+    from . import correlation, storage
+    columns = column_meta(ds)
+    names = payload.get('columns')
+    if names is None:
+        # booleans count as numeric to pandas but have no useful quartiles
+        names = [name for name, c in columns.items() if c['is_numeric'] and c['dtype'] != 'bool']
     else:
-        insights['key_insights'].append("Relatively consistent values across categories")
-    
-    # Check for outliers
-    q1 = grouped.quantile(0.25)
-    q3 = grouped.quantile(0.75)
-    iqr = q3 - q1
-    outliers = grouped[(grouped < q1 - 1.5 * iqr) | (grouped > q3 + 1.5 * iqr)]
-    if len(outliers) > 0:
-        insights['key_insights'].append(f"Found {len(outliers)} potential outlier(s)")
-    
-    return insights
-
+        if any(name not in columns for name in names):
+            return {'error': 'column not found'}, 400
+        if not all(columns[name]['is_numeric'] for name in names):
+            return {'error': 'columns must be numeric'}, 400
+        names = list(dict.fromkeys(names))
+    if not names:
+        return {'error': 'no numeric columns'}, 400
+
+    exact = use_exact(ds, payload)
+    try:
+        with metrics.phase('correlate'):
+            if exact:
+                describe, pearson, spearman = correlation.exact_summary(
+                    names, lambda cols: load_dataset(ds, cols), ds.rows or 0)
+            else:
+                # large datasets are streamed; quartiles and ranks come from sketches
+                describe, pearson, spearman = correlation.streamed_summary(
+                    names, lambda cols: storage.iter_columns(app.config['UPLOAD_FOLDER'], ds.filename, cols))
+    except Exception as e:
+        return {'error': 'failed reading file', 'detail': str(e)}, 500
 
-def analyze_line_chart(df, xcol, ycol):
-    """Analyze line chart data for trends"""
-    grouped = df.groupby(xcol)[ycol].mean().sort_index()
-    
-    insights = {
-        'summary': f'Trend analysis of {ycol} over {xcol}',
-        'statistics': {
-            'data_points': int(len(grouped)),
-            'starting_value': float(grouped.iloc[0]),
-            'ending_value': float(grouped.iloc[-1]),
-            'peak_value': float(grouped.max()),
-            'lowest_value': float(grouped.min()),
-            'average_value': float(grouped.mean())
-        },
-        'trend_analysis': {},
-        'key_insights': []
-    }
-    
-    # Calculate trend
-    values = grouped.values
-    if len(values) > 1:
-        x_numeric = np.arange(len(values))
-        slope = np.polyfit(x_numeric, values, 1)[0]
-        
-        if slope > 0:
-            trend = 'Upward'
-            trend_emoji = '📈'
-        elif slope < 0:
-            trend = 'Downward'
-            trend_emoji = '📉'
-        else:
-            trend = 'Stable'
-            trend_emoji = '➡️'
-        
-        insights['trend_analysis'] = {
-            'direction': trend,
-            'emoji': trend_emoji,
-            'slope': float(slope),
-            'change_rate': f"{((grouped.iloc[-1] - grouped.iloc[0]) / grouped.iloc[0] * 100):.2f}%"
+    return {
+        'success': True,
+        'columns': names,
+        'describe': dict(zip(names, describe)),
+        'pearson': pearson.tolist(),
+        'spearman': spearman.tolist(),
+        'strongest_pairs': correlation.strongest_pairs(names, pearson, spearman),
+        'exact': exact,
+        'dataset_info': {
+            'name': ds.original_name,
+            'rows': ds.rows,
+            'cols': ds.cols
         }
-        
-        # Key insights
-        change_pct = (grouped.iloc[-1] - grouped.iloc[0]) / grouped.iloc[0] * 100
-        insights['key_insights'].append(f"Overall change: {change_pct:+.2f}% from start to end")
-        
-        # Volatility
-        volatility = grouped.std() / grouped.mean() * 100
-        insights['key_insights'].append(f"Volatility index: {volatility:.2f}%")
-        
-        # Peaks and troughs
-        peak_idx = grouped.idxmax()
-        trough_idx = grouped.idxmin()
-        insights['key_insights'].append(f"Peak at {peak_idx}, Trough at {trough_idx}")
-    
-    return insights
+    }, 200
 
 
-def analyze_pie_chart(df, xcol, ycol):
-    """Analyze pie chart distribution"""
-    grouped = df.groupby(xcol)[ycol].sum()
-    total = grouped.sum()
-    
-    insights = {
-        'summary': f'Distribution analysis of {ycol} across {xcol} categories',
-        'statistics': {
-            'total_value': float(total),
-            'number_of_segments': int(len(grouped)),
-            'largest_segment_value': float(grouped.max()),
-            'smallest_segment_value': float(grouped.min()),
-            'average_segment_value': float(grouped.mean())
-        },
-        'distribution': [],
-        'key_insights': []
-    }
-    
-    # Calculate percentages
-    percentages = (grouped / total * 100).sort_values(ascending=False)
-    
-    for idx, (category, pct) in enumerate(percentages.items(), 1):
-        insights['distribution'].append({
-            'rank': idx,
-            'category': str(category),
-            'value': float(grouped[category]),
-            'percentage': f"{pct:.2f}%"
-        })
-    
-    # Key insights
-    top_segment = percentages.iloc[0]
-    insights['key_insights'].append(f"Largest segment: {percentages.index[0]} ({top_segment:.2f}%)")
-    
-    # Check for concentration
-    top_3_total = percentages.head(3).sum()
-    if top_3_total > 70:
-        insights['key_insights'].append(f"High concentration: Top 3 segments represent {top_3_total:.2f}% of total")
-    else:
-        insights['key_insights'].append(f"Balanced distribution: Top 3 segments represent {top_3_total:.2f}% of total")
-    
-    # Check for dominant segment
-    if top_segment > 50:
-        insights['key_insights'].append("Single dominant segment detected (>50%)")
-    
-    return insights
+@app.route('/api/query', methods=['POST'])
+def query_datasets():
+    """
+    Grouped aggregates over several datasets joined on key columns.
+    Expects JSON: { "datasets": [ids], "on": name(s) or one list per dataset, "how": "inner" or "left",
+                    "group_by": column(s), "aggregates": [{"func": "sum", "column": ..., "as": ...}], "limit": n }
+    A column is a name, or {"dataset": id, "column": name} when several datasets have it.
+    """
+    payload = request.get_json() or {}
 
+    # "async": true runs the work as a job and answers 202 with the job to poll
+    if payload.get('async'):
+        job = job_runner.submit('query', lambda ctx: run_query(payload, ctx.progress))
+        return job_accepted(job)
+    body, status = build_query(payload)
+    return respond(body, status)
+
+
+def run_query(payload, progress):
+    """Job body for an async query, failing with the synchronous endpoint's error"""
+    body, status = build_query(payload, progress)
+    if status != 200:
+        raise jobs.JobError(body['error'])
+    return body
+
+
+def build_query(payload, progress=None):
+    """Join the datasets and aggregate; returns the response body and status"""
+    from . import storage, query
+    folder = app.config['UPLOAD_FOLDER']
+    ids = payload.get('datasets')
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return {'error': 'datasets must be a list of dataset ids'}, 400
+    if len(set(ids)) != len(ids):
+        return {'error': 'each dataset may appear once'}, 400
+    limit = payload.get('limit', app.config['CHART_MAX_POINTS'])
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        return {'error': 'limit must be a positive integer'}, 400
+
+    sources = []
+    for ds_id in ids:
+        ds = db.session.get(Dataset, ds_id)
+        if ds is None or not os.path.exists(os.path.join(folder, ds.filename)):
+            return {'error': f'dataset {ds_id} not found'}, 404
+        sources.append(query.Source(
+            ds.id, ds.rows, column_meta(ds),
+            chunks=lambda columns, ds=ds: storage.iter_columns(folder, ds.filename, columns),
+            load=lambda columns, ds=ds: load_dataset(ds, columns)))
+    try:
+        q = query.Query(sources, payload.get('on'), payload.get('how', 'inner'),
+                        payload.get('group_by'), payload.get('aggregates'))
+    except query.QueryError as e:
+        return {'error': str(e)}, 400
+    with metrics.phase('join'):
+        stats, joined, plan = q.run(app.config['QUERY_MEMORY_BYTES'], progress)
+    return q.result(stats, joined, plan, limit), 200
 
-def analyze_histogram(df, xcol):
-    """Analyze histogram distribution"""
-    data = df[xcol].dropna()
-    
-    insights = {
-        'summary': f'Distribution analysis of {xcol}',
-        'statistics': {
-            'count': int(len(data)),
-            'mean': float(data.mean()),
-            'median': float(data.median()),
-            'mode': float(data.mode()[0]) if len(data.mode()) > 0 else None,
-            'std_dev': float(data.std()),
-            'min': float(data.min()),
-            'max': float(data.max()),
-            'range': float(data.max() - data.min())
-        },
-        'quartiles': {
-            'q1': float(data.quantile(0.25)),
-            'q2': float(data.quantile(0.50)),
-            'q3': float(data.quantile(0.75))
-        },
-        'key_insights': []
-    }
-    
-    # Calculate skewness
-    mean = data.mean()
-    median = data.median()
-    
-    if abs(mean - median) < data.std() * 0.1:
-        distribution = 'Normally distributed (symmetric)'
-    elif mean > median:
-        distribution = 'Right-skewed (positive skew)'
-    else:
-        distribution = 'Left-skewed (negative skew)'
-    
-    insights['key_insights'].append(distribution)
-    
-    # Check for outliers
-    q1 = data.quantile(0.25)
-    q3 = data.quantile(0.75)
-    iqr = q3 - q1
-    outliers = data[(data < q1 - 1.5 * iqr) | (data > q3 + 1.5 * iqr)]
-    
-    if len(outliers) > 0:
-        insights['key_insights'].append(f"Detected {len(outliers)} outliers ({len(outliers)/len(data)*100:.2f}%)")
-    else:
-        insights['key_insights'].append("No significant outliers detected")
-    
-    # Coefficient of variation
-    cv = (data.std() / data.mean()) * 100
-    if cv < 15:
-        insights['key_insights'].append(f"Low variability (CV: {cv:.2f}%)")
-    elif cv < 30:
-        insights['key_insights'].append(f"Moderate variability (CV: {cv:.2f}%)")
-    else:
-        insights['key_insights'].append(f"High variability (CV: {cv:.2f}%)")
-    
-    return insights
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, phase and job metrics of this worker process for Prometheus to scrape"""
+    return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/metrics/profiles', methods=['GET'])
+def slow_profiles():
+    """cProfile reports of the latest slow requests and jobs, when PROFILE_SLOW_MS is set"""
+    return jsonify({'threshold_ms': app.config['PROFILE_SLOW_MS'] or None,
+                    'profiles': list(registry.profiles)})
 
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """An uploaded file as it was sent, under its dataset's original name"""
+    from . import blobs, storage
+    # only dataset files are served, not lock files or columnar copies
+    ds = Dataset.query.filter_by(filename=filename).order_by(Dataset.id).first_or_404()
+    if not blobs.is_blob(filename):
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename, download_name=ds.original_name)
+    try:
+        raw = open(os.path.join(app.config['UPLOAD_FOLDER'], filename), 'rb')
+    except FileNotFoundError:
+        return jsonify({'error': 'file not found'}), 404
+
+    # blobs are stored gzip-compressed in many members; decompressed here so
+    # every client gets the CSV itself
+    def generate():
+        with raw, blobs.decompressed(raw, filename) as stream:
+            while True:
+                block = stream.read(blobs.BLOCK_BYTES)
+                if not block:
+                    break
+                yield block
+
+    mimetype = 'text/tab-separated-values' if storage.csv_sep(filename) == '\t' else 'text/csv'
+    return app.response_class(generate(), mimetype=mimetype,
+                              headers={'Content-Disposition': f'inline; filename="{ds.original_name}"'})
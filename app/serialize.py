@@ -0,0 +1,62 @@
+from flask.json.provider import DefaultJSONProvider, _default
+
+# orjson and msgpack are optional: without orjson responses go through the
+# standard library encoder, without msgpack clients always get JSON
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+
+
+def to_builtin(o):
+    """NumPy arrays and scalars as plain Python values, anything else as Flask would"""
+    if hasattr(o, 'tolist') and type(o).__module__ == 'numpy':
+        return o.tolist()
+    return _default(o)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """app.json that writes NumPy arrays directly, using orjson when it is installed
+
+    orjson writes NaN and infinities as null, which browsers can parse; the
+    standard library fallback keeps Python's NaN tokens.
+    """
+
+    default = staticmethod(to_builtin)
+
+    if orjson is not None:
+        OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+        def dumps(self, obj, **kwargs):
+            option = self.OPTIONS | (orjson.OPT_INDENT_2 if kwargs.get('indent') else 0)
+            return orjson.dumps(obj, default=to_builtin, option=option).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            # bytes straight into the response, skipping the str round trip
+            obj = self._prepare_response_obj(args, kwargs)
+            option = self.OPTIONS | orjson.OPT_APPEND_NEWLINE
+            if (self.compact is None and self._app.debug) or self.compact is False:
+                option |= orjson.OPT_INDENT_2
+            return self._app.response_class(orjson.dumps(obj, default=to_builtin, option=option),
+                                            mimetype=self.mimetype)
+
+
+def best_format(accept):
+    """MSGPACK when the client prefers it and msgpack is installed, otherwise JSON"""
+    if msgpack is None:
+        return JSON
+    return accept.best_match([JSON, MSGPACK], default=JSON)
+
+
+def packb(obj):
+    return msgpack.packb(obj, default=to_builtin, use_bin_type=True)
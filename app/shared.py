@@ -0,0 +1,228 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+
+# fcntl is POSIX only; without it builds are only serialized within one process
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the platform
+    fcntl = None
+
+# Dataset columns decoded once into one contiguous .npy file each, in a
+# directory every worker process reaches (tmpfs under /dev/shm by default).
+# Workers memory-map the files read-only, so a column used by several gunicorn
+# workers sits in RAM once instead of once per worker. Entries are named after
+# the stored upload and its mtime, so a replaced file never serves stale
+# columns. A column file's mtime records when a worker last attached it; the
+# least recently attached columns go first once the directory outgrows its
+# budget. Categoricals keep their codes in the .npy file and the categories
+# next to it; other text columns hold Python strings, which cannot be shared,
+# and are read by each process on its own.
+CATEGORIES_SUFFIX = '.json'
+LOCK_FILE = '.lock'
+
+
+def default_root(upload_folder):
+    """Shared column directory for an upload folder, in shared memory when the host has it"""
+    digest = hashlib.sha1(os.path.abspath(upload_folder).encode()).hexdigest()[:12]
+    if os.path.isdir('/dev/shm'):
+        return os.path.join('/dev/shm', f'csv-columns-{digest}')
+    return os.path.join(upload_folder, '.columns')
+
+
+class SharedColumns:
+    """Registry of dataset columns memory-mapped by every worker from shared files
+
+    Whichever worker first needs a column writes its file; the others attach
+    to the same pages. Arrays handed out are read-only. max_bytes bounds the
+    directory; 0 turns sharing off and each process reads the store itself.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.attached = 0
+        self.built = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def entry_path(self, upload_folder, filename):
+        mtime = os.stat(os.path.join(upload_folder, filename)).st_mtime_ns
+        return os.path.join(self.root, f'{filename}@{mtime}')
+
+    def load_frame(self, upload_folder, filename, columns=None, dtypes=None):
+        """Dataset columns as a DataFrame, shared columns mapped and the rest read privately
+
+        dtypes maps column names to the compact dtypes recorded at upload, as
+        for storage.load_frame.
+        """
+        import pandas as pd
+        from . import metrics, storage
+        path = storage.store_path(upload_folder, filename)
+        if not self.max_bytes or not storage.has_store(path):
+            return storage.load_frame(upload_folder, filename, columns, dtypes=dtypes)
+        schema = storage.read_schema(path)
+        names = [c['name'] for c in schema['columns']]
+        wanted = names if columns is None else [c for c in names if c in columns]
+        dtypes = dtypes or {}
+        entry = self.entry_path(upload_folder, filename)
+        data, private = {}, []
+        for name in wanted:
+            values = self.attach(entry, path, schema, names.index(name), dtypes.get(name))
+            if values is None:
+                private.append(name)
+            else:
+                data[name] = values
+        if private:
+            rest = storage.read_columns(path, private, dtypes)
+            for name in private:
+                data[name] = rest[name]
+        else:
+            metrics.count(rows=schema['rows'])
+        # copy=False keeps the mapped arrays as they are instead of consolidating them
+        return pd.DataFrame({name: data[name] for name in wanted}, copy=False)
+
+    def attach(self, entry, path, schema, index, compact):
+        """Mapped values of one column, writing its file first if no worker has; None if it cannot be shared"""
+        category = compact == 'category'
+        if schema['columns'][index]['dtype'] == 'object' and not category:
+            return None
+        base = os.path.join(entry, f'c{index}')
+        try:
+            return self._map(base, category)
+        except FileNotFoundError:
+            pass
+        with self._locked(entry):
+            try:
+                return self._map(base, category)
+            except FileNotFoundError:
+                if not self._build(base, path, schema, index, compact):
+                    return None
+                values = self._map(base, category)
+        # mappings stay valid when their file is removed, so evicting after mapping is safe
+        self.evict(keep=base + '.npy')
+        return values
+
+    def _map(self, base, category):
+        import numpy as np
+        import pandas as pd
+        values = np.load(base + '.npy', mmap_mode='r')
+        # the mtime marks the column as recently attached for eviction
+        os.utime(base + '.npy')
+        if category:
+            with open(base + CATEGORIES_SUFFIX) as f:
+                values = pd.Categorical.from_codes(values, categories=json.load(f))
+        with self._lock:
+            self.attached += 1
+        return values
+
+    def _build(self, base, path, schema, index, compact):
+        """Write one column's shared file from the store; False if it cannot be shared or written"""
+        import numpy as np
+        from . import storage
+        if compact == 'category':
+            values = storage.read_categorical(path, schema, index)
+            if values is None:
+                return False
+            categories, array = values.categories.tolist(), values.codes
+        else:
+            categories, array = None, storage.read_column(path, schema, index, compact)
+        tmp = base + '.tmp'
+        try:
+            if categories is not None:
+                with open(tmp, 'w') as f:
+                    json.dump(categories, f)
+                os.replace(tmp, base + CATEGORIES_SUFFIX)
+            with open(tmp, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            # the .npy file appears last and whole, so a mapped file is always complete
+            os.replace(tmp, base + '.npy')
+        except OSError:
+            # e.g. a full tmpfs; the column is read privately instead
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        with self._lock:
+            self.built += 1
+        return True
+
+    @contextmanager
+    def _locked(self, entry):
+        """Hold the entry's lock file, so each column is written by one worker only"""
+        os.makedirs(entry, mode=0o700, exist_ok=True)
+        if fcntl is None:
+            with self._lock:
+                yield
+            return
+        with open(os.path.join(entry, LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _columns(self):
+        """(last attached, bytes, .npy path) of every shared column"""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            for item in os.scandir(entry.path):
+                if not item.name.endswith('.npy'):
+                    continue
+                try:
+                    st = item.stat()
+                    size = st.st_size
+                    categories = item.path[:-len('.npy')] + CATEGORIES_SUFFIX
+                    if os.path.exists(categories):
+                        size += os.path.getsize(categories)
+                except FileNotFoundError:
+                    # evicted by another worker meanwhile
+                    continue
+                found.append((st.st_mtime, size, item.path))
+        return found
+
+    def evict(self, keep=None):
+        """Remove the least recently attached columns until the files fit max_bytes"""
+        columns = sorted(self._columns())
+        total = sum(size for _, size, _ in columns)
+        for _, size, npy in columns:
+            if total <= self.max_bytes:
+                break
+            if npy == keep:
+                continue
+            # the .npy file goes first: a worker finding it missing writes both again
+            for name in (npy, npy[:-len('.npy')] + CATEGORIES_SUFFIX):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def remove(self, filename):
+        """Drop the shared columns of a stored upload, whatever mtime they were written for"""
+        if not os.path.isdir(self.root):
+            return
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and entry.name.rpartition('@')[0] == filename:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def stats(self):
+        columns = self._columns()
+        with self._lock:
+            return {
+                'root': self.root,
+                'columns': len(columns),
+                'bytes': sum(size for _, size, _ in columns),
+                'max_bytes': self.max_bytes,
+                'attached': self.attached,
+                'built': self.built,
+                'evictions': self.evictions,
+            }
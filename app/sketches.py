@@ -0,0 +1,195 @@
+import numpy as np
+
+# KLL accuracy: quantiles are within about 1.7 / k of the true rank
+KLL_K = 1000
+FREQUENCY_COUNTERS = 1024
+
+
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin, Lang, Liberty 2016)
+
+    Keeps O(k) values in compactor levels; level h items stand for 2**h
+    inputs. Rank error is about 1.7 / k of n with high probability.
+    """
+
+    def __init__(self, k=KLL_K, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def rank_error(self):
+        return 1.7 / self.k
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self._compress()
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(self.levels[h])
+                # an odd item out stays behind so the promoted weight is exact
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                items = items[:len(items) - len(keep)]
+                promoted = items[int(self._rng.integers(2))::2]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                self.levels[h] = keep
+            h += 1
+
+    def quantiles(self, qs):
+        if self.n == 0:
+            return [np.nan for _ in qs]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lv), 2 ** h, dtype=np.float64)
+                                  for h, lv in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        ranks = np.asarray(qs, dtype=np.float64) * cumulative[-1]
+        idx = np.minimum(np.searchsorted(cumulative, ranks, side='left'), len(items) - 1)
+        return items[idx].tolist()
+
+    def ranks(self, values):
+        """Approximate mid-ranks of values as fractions of n; NaN stays NaN"""
+        values = np.asarray(values, dtype=np.float64)
+        if self.n == 0:
+            return np.full(len(values), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lv), 2 ** h, dtype=np.float64)
+                                  for h, lv in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.r_[0.0, np.cumsum(weights[order])]
+        # weight below each value plus half the weight equal to it, as for tied ranks
+        below = cumulative[np.searchsorted(items, values, side='left')]
+        upto = cumulative[np.searchsorted(items, values, side='right')]
+        ranks = (below + upto) / 2 / cumulative[-1]
+        ranks[np.isnan(values)] = np.nan
+        return ranks
+
+
+class FrequencySketch:
+    """Misra-Gries heavy hitters; counts are low by at most n / (counters + 1)"""
+
+    def __init__(self, counters=FREQUENCY_COUNTERS):
+        self.counters = counters
+        self.n = 0
+        self.values = np.empty(0)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        chunk_values, chunk_counts = np.unique(values, return_counts=True)
+        merged = np.concatenate([self.values, chunk_values])
+        counts = np.concatenate([self.counts, chunk_counts])
+        self.values, inverse = np.unique(merged, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts).astype(np.int64)
+        if len(self.values) > self.counters:
+            # subtract the (counters + 1)-th largest count and drop what hits zero
+            cut = np.partition(self.counts, len(self.counts) - self.counters - 1)[len(self.counts) - self.counters - 1]
+            self.counts = self.counts - cut
+            keep = self.counts > 0
+            self.values, self.counts = self.values[keep], self.counts[keep]
+
+    def mode(self):
+        if not len(self.values):
+            return None
+        # values are sorted, so argmax picks the smallest of tied values like pandas
+        return float(self.values[np.argmax(self.counts)])
+
+
+def stream_histogram(chunks, bins=10):
+    """np.histogram over a column read in chunks: min/max pass, then counts
+
+    The bin edges and counts are the same as a single in-memory call.
+    """
+    if np.ndim(bins) == 0:
+        low, high = np.inf, -np.inf
+        for values in chunks():
+            values = as_float(values)
+            if len(values):
+                low, high = min(low, values.min()), max(high, values.max())
+        if low > high:
+            low, high = 0.0, 1.0
+        edges = np.histogram_bin_edges(np.empty(0), bins=bins, range=(low, high))
+    else:
+        edges = np.asarray(bins, dtype=np.float64)
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    for values in chunks():
+        counts += np.histogram(as_float(values), bins=edges)[0]
+    return counts, edges
+
+
+def stream_describe(chunks, k=KLL_K):
+    """Approximate describe_values() over a column read in chunks
+
+    Count, mean, standard deviation, min and max are exact; quartiles and the
+    median come from a KLL sketch, the mode from a Misra-Gries summary and
+    the IQR outlier count from a second pass against the sketched quartiles.
+    """
+    n, mean, m2 = 0, 0.0, 0.0
+    low, high = np.inf, -np.inf
+    quantiles = KLLSketch(k)
+    frequent = FrequencySketch()
+    for values in chunks():
+        values = as_float(values)
+        if not len(values):
+            continue
+        # Chan et al. pairwise update keeps the variance stable across chunks
+        count, chunk_mean = len(values), values.mean()
+        chunk_m2 = ((values - chunk_mean) ** 2).sum()
+        delta = chunk_mean - mean
+        total = n + count
+        mean += delta * count / total
+        m2 += chunk_m2 + delta * delta * n * count / total
+        n = total
+        low, high = min(low, values.min()), max(high, values.max())
+        quantiles.update(values)
+        frequent.update(values)
+
+    q1, q2, q3 = quantiles.quantiles([0.25, 0.5, 0.75])
+    outliers = 0
+    if n:
+        iqr = q3 - q1
+        for values in chunks():
+            values = as_float(values)
+            outliers += int(np.count_nonzero((values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)))
+    return {
+        'count': n,
+        'mean': mean if n else np.nan,
+        'median': q2,
+        'mode': frequent.mode(),
+        'std': np.sqrt(m2 / (n - 1)) if n > 1 else np.nan,
+        'min': low if n else np.nan,
+        'max': high if n else np.nan,
+        'q1': q1,
+        'q2': q2,
+        'q3': q3,
+        'outliers': outliers,
+        'rank_error': quantiles.rank_error,
+    }
+
+
+def as_float(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values[~np.isnan(values)]
@@ -7,11 +7,25 @@ let charts = {
 }
 let predictionData = null
 
-async function listDatasets(){
-  const res = await fetch('/api/datasets')
+// chart responses come as MessagePack when the decoder loaded, JSON otherwise
+const ACCEPT = window.MessagePack ? 'application/x-msgpack, application/json;q=0.9' : 'application/json'
+// charts ask the server to downsample to this many points; the API returns every group otherwise
+const MAX_POINTS = 1000
+
+async function readBody(res){
+  if((res.headers.get('Content-Type') || '').startsWith('application/x-msgpack')){
+    return MessagePack.decode(new Uint8Array(await res.arrayBuffer()))
+  }
+  return res.json()
+}
+
+async function listDatasets(url){
+  const res = await fetch(url || '/api/datasets')
   const ds = await res.json()
   const ul = document.getElementById('datasetList')
-  ul.innerHTML = ''
+  const more = document.getElementById('moreDatasets')
+  if(!url) ul.innerHTML = ''
+  else if(more) more.remove()
   ds.forEach(d=>{
     const li = document.createElement('li')
     li.className = 'list-group-item d-flex justify-content-between align-items-center'
@@ -26,6 +40,17 @@ async function listDatasets(){
     `
     ul.appendChild(li)
   })
+
+  // the catalog is paged; later pages load on demand from the Link header
+  const next = (res.headers.get('Link') || '').match(/<([^>]+)>;\s*rel="next"/)
+  if(next){
+    const li = document.createElement('li')
+    li.id = 'moreDatasets'
+    li.className = 'list-group-item text-center'
+    li.innerHTML = `<button class='btn btn-sm btn-outline-secondary'>Load more</button>`
+    li.querySelector('button').onclick = () => listDatasets(next[1])
+    ul.appendChild(li)
+  }
 }
 
 async function deleteDataset(id, event){
@@ -46,6 +71,7 @@ async function deleteDataset(id, event){
     currentDataset = null
     document.getElementById('xSelect').innerHTML = '<option value="">Select X column</option>'
     document.getElementById('ySelect').innerHTML = '<option value="">Select Y column (numeric)</option>'
+    preview = null
     document.getElementById('previewTable').innerHTML = ''
     
     // Clear all charts
@@ -78,34 +104,92 @@ async function selectDataset(id){
     if(c.is_numeric) ySel.appendChild(opt.cloneNode(true))
   })
   // load preview
-  const p = await fetch(`/api/dataset/${id}/preview`)
-  const data = await p.json()
-  renderPreview(data)
+  await loadPreview(id)
+}
+
+// preview: virtual scrolling over pages of rows fetched as they come into view
+const PREVIEW_PAGE = 200
+const PREVIEW_ROW_HEIGHT = 31
+// browsers cap element heights, so very long tables scroll in scaled steps
+const PREVIEW_MAX_HEIGHT = 1000000
+let preview = null
+
+async function loadPreview(id){
+  const res = await fetch(`/api/dataset/${id}/preview?offset=0&limit=${PREVIEW_PAGE}`)
+  const data = await res.json()
+  preview = data.error ? null : {id, columns: data.columns, total: data.total_rows || 0, pages: new Map([[0, data.data]]), pending: new Set()}
+  document.getElementById('previewScroll').scrollTop = 0
+  renderPreview()
+}
+
+async function fetchPreviewPage(state, page){
+  if(state.pages.has(page) || state.pending.has(page)) return
+  state.pending.add(page)
+  const res = await fetch(`/api/dataset/${state.id}/preview?offset=${page * PREVIEW_PAGE}&limit=${PREVIEW_PAGE}`)
+  const data = await res.json()
+  state.pending.delete(page)
+  if(data.error) return
+  state.pages.set(page, data.data)
+  if(preview === state) renderPreview()
+}
+
+function spacerRow(height, span){
+  const tr = document.createElement('tr')
+  tr.style.height = `${height}px`
+  const td = document.createElement('td')
+  td.colSpan = span
+  td.className = 'p-0 border-0'
+  tr.appendChild(td)
+  return tr
 }
 
-function renderPreview(data){
+function renderPreview(){
   const table = document.getElementById('previewTable')
+  const scroller = document.getElementById('previewScroll')
   table.innerHTML = ''
-  const cols = data.columns
-  if(!cols || cols.length===0) return
+  if(!preview || preview.columns.length === 0) return
+  const cols = preview.columns
   const thead = document.createElement('thead')
   thead.innerHTML = '<tr>'+cols.map(c=>`<th>${c}</th>`).join('')+'</tr>'
   table.appendChild(thead)
+
+  const height = preview.total * PREVIEW_ROW_HEIGHT
+  const scale = Math.max(1, height / PREVIEW_MAX_HEIGHT)
+  const first = Math.min(Math.floor(scroller.scrollTop * scale / PREVIEW_ROW_HEIGHT), Math.max(preview.total - 1, 0))
+  const last = Math.min(preview.total, first + Math.ceil(scroller.clientHeight / PREVIEW_ROW_HEIGHT) + 5)
+  const top = first * PREVIEW_ROW_HEIGHT / scale
+
   const tbody = document.createElement('tbody')
-  data.rows.slice(0,50).forEach(r=>{
+  tbody.appendChild(spacerRow(top, cols.length))
+  for(let i = first; i < last; i++){
+    const page = preview.pages.get(Math.floor(i / PREVIEW_PAGE))
+    if(!page) fetchPreviewPage(preview, Math.floor(i / PREVIEW_PAGE))
     const tr = document.createElement('tr')
-    cols.forEach(c=>{ const td = document.createElement('td'); td.textContent = r[c]; tr.appendChild(td) })
+    tr.style.height = `${PREVIEW_ROW_HEIGHT}px`
+    cols.forEach((c, j)=>{
+      const td = document.createElement('td')
+      const value = page ? page[j][i % PREVIEW_PAGE] : '…'
+      td.textContent = value === null ? '' : value
+      tr.appendChild(td)
+    })
     tbody.appendChild(tr)
-  })
+  }
+  tbody.appendChild(spacerRow(Math.max(height / scale - top - (last - first) * PREVIEW_ROW_HEIGHT, 0), cols.length))
   table.appendChild(tbody)
 }
 
+let previewFrame = null
+document.getElementById('previewScroll').addEventListener('scroll', ()=>{
+  if(previewFrame) return
+  previewFrame = requestAnimationFrame(()=>{ previewFrame = null; renderPreview() })
+})
+
 async function makeChart(){
   if(!currentDataset) return alert('Select a dataset first')
   const x = document.getElementById('xSelect').value
   const y = document.getElementById('ySelect').value
   const type = document.getElementById('chartType').value
-  const payload = { x: x }
+  const payload = { x: x, max_points: MAX_POINTS }
   
   // For histogram, only x is needed (and it must be numeric)
   if(type === 'histogram') {
@@ -116,8 +200,9 @@ async function makeChart(){
     payload.type = type
   }
   
-  const res = await fetch(`/api/dataset/${currentDataset}/chart`, {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(payload)})
-  const data = await res.json()
+  // GET lets the browser cache the chart and revalidate it with its ETag
+  const res = await fetch(`/api/dataset/${currentDataset}/chart?${new URLSearchParams(payload)}`, {headers:{'Accept': ACCEPT}})
+  const data = await readBody(res)
   if(data.error) return alert(data.error)
   renderChart(data)
 }
@@ -130,31 +215,37 @@ async function generateAllCharts(){
   if(!x) return alert('Select X column')
   if(!y) return alert('Select Y column for bar, line, and pie charts')
   
-  // Generate all chart types
+  // Generate all chart types in one batched request
   const chartTypes = ['bar', 'line', 'pie', 'histogram']
-  
-  for(const type of chartTypes) {
-    const payload = { x: x, type: type }
+  const specs = chartTypes.map(type => {
+    const spec = { x: x, type: type, max_points: MAX_POINTS }
     
     // For histogram, we only need x (must be numeric)
     // For other charts, we need both x and y
     if(type !== 'histogram') {
-      payload.y = y
+      spec.y = y
     }
+    return spec
+  })
+  
+  try {
+    const res = await fetch(`/api/dataset/${currentDataset}/charts`, {method:'POST', headers:{'Content-Type':'application/json', 'Accept': ACCEPT}, body: JSON.stringify({ charts: specs })})
+    const data = await readBody(res)
     
-    try {
-      const res = await fetch(`/api/dataset/${currentDataset}/chart`, {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(payload)})
-      const data = await res.json()
-      
-      if(data.error) {
-        console.error(`Error generating ${type} chart:`, data.error)
-        continue
-      }
-      
-      renderSpecificChart(data, type)
-    } catch(error) {
-      console.error(`Failed to generate ${type} chart:`, error)
+    if(data.error) {
+      alert(data.error)
+      return
     }
+    
+    data.charts.forEach((chart, i) => {
+      if(chart.error) {
+        console.error(`Error generating ${chartTypes[i]} chart:`, chart.error)
+        return
+      }
+      renderSpecificChart(chart, chartTypes[i])
+    })
+  } catch(error) {
+    console.error('Failed to generate charts:', error)
   }
   
   // Show prediction controls after charts are generated
@@ -164,6 +255,13 @@ async function generateAllCharts(){
   document.getElementById('analysisReportsSection').style.display = 'block'
 }
 
+// Dataset label, noting when the server reduced a large series
+function seriesLabel(data){
+  const label = data.type === 'histogram' ? 'Frequency' : 'Value'
+  if(!data.dropped) return label
+  return `${label} (${data.labels.length} of ${data.total_points} points)`
+}
+
 function renderChart(data){
   const ctx = document.getElementById('chartCanvas').getContext('2d')
   if(chart) chart.destroy()
@@ -176,7 +274,7 @@ function renderChart(data){
     data: {
       labels: data.labels,
       datasets: [{ 
-        label: data.type === 'histogram' ? 'Frequency' : 'Value', 
+        label: seriesLabel(data), 
         data: data.values, 
         backgroundColor: data.type === 'histogram' ? 'rgba(54, 162, 235, 0.6)' : data.labels.map((_,i)=>`hsl(${i*40 % 360} 70% 50%)`),
         borderColor: data.type === 'histogram' ? 'rgba(54, 162, 235, 1)' : undefined,
@@ -214,7 +312,7 @@ function renderSpecificChart(data, chartType){
     data: {
       labels: data.labels,
       datasets: [{ 
-        label: data.type === 'histogram' ? 'Frequency' : 'Value', 
+        label: seriesLabel(data), 
         data: data.values, 
         backgroundColor: data.type === 'histogram' ? 'rgba(54, 162, 235, 0.6)' : data.labels.map((_,i)=>`hsl(${i*40 % 360} 70% 50%)`),
         borderColor: data.type === 'histogram' ? 'rgba(54, 162, 235, 1)' : undefined,
@@ -236,8 +334,50 @@ function renderSpecificChart(data, chartType){
   charts[chartType] = new Chart(ctx, cfg)
 }
 
+// background jobs: poll until the job finishes, reporting progress along the way
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms))
+
+async function waitForJob(job, onProgress){
+  while(job.status === 'queued' || job.status === 'running'){
+    if(onProgress) onProgress(job)
+    await sleep(500)
+    const res = await fetch(`/api/jobs/${job.id}`)
+    if(!res.ok){
+      // e.g. 404 once the job went with its deleted dataset; the body is then an HTML page
+      const detail = (res.headers.get('Content-Type') || '').startsWith('application/json') ? (await res.json()).error : null
+      return {status: 'failed', error: detail || `job ${job.id} is no longer available (HTTP ${res.status})`}
+    }
+    job = await res.json()
+  }
+  return job
+}
+
+// POST a JSON request as a job and resolve with the finished job's result
+async function runJob(url, payload){
+  const res = await fetch(url, {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(Object.assign({async: true}, payload))})
+  const data = await res.json()
+  if(data.error) return data
+  const job = await waitForJob(data.job)
+  if(job.status !== 'succeeded') return {error: job.error || `job ${job.status}`}
+  return job.result
+}
+
 // upload
+let uploadJob = null
 const uploadForm = document.getElementById('uploadForm')
+const uploadProgress = document.getElementById('uploadProgress')
+const uploadProgressBar = uploadProgress.querySelector('.progress-bar')
+const cancelUpload = document.getElementById('cancelUpload')
+
+function showUploadProgress(job){
+  uploadProgress.style.display = job ? '' : 'none'
+  cancelUpload.style.display = job ? '' : 'none'
+  if(!job) return
+  const pct = Math.round(job.progress * 100)
+  uploadProgressBar.style.width = `${pct}%`
+  uploadProgressBar.textContent = job.message ? `${job.message} ${pct}%` : `${pct}%`
+}
+
 uploadForm.addEventListener('submit', async (e)=>{
   e.preventDefault()
   const fileInput = document.getElementById('fileInput')
@@ -247,10 +387,20 @@ uploadForm.addEventListener('submit', async (e)=>{
   const res = await fetch('/api/upload', {method:'POST', body: fd})
   const data = await res.json()
   if(data.error) return alert(data.error)
+  uploadJob = data.job
+  const job = await waitForJob(data.job, showUploadProgress)
+  uploadJob = null
+  showUploadProgress(null)
+  if(job.status === 'cancelled') return
+  if(job.status !== 'succeeded') return alert(job.error || 'Upload failed')
   await listDatasets()
   alert('Upload complete')
 })
 
+cancelUpload.addEventListener('click', async ()=>{
+  if(uploadJob) await fetch(`/api/jobs/${uploadJob.id}/cancel`, {method: 'POST'})
+})
+
 // Generate all charts button
 document.getElementById('generateAllCharts').addEventListener('click', generateAllCharts)
 
@@ -266,13 +416,7 @@ async function showPrediction(years) {
   const payload = { x: x, y: y, years: years }
   
   try {
-    const res = await fetch(`/api/dataset/${currentDataset}/predict`, {
-      method: 'POST',
-      headers: {'Content-Type': 'application/json'},
-      body: JSON.stringify(payload)
-    })
-    
-    const data = await res.json()
+    const data = await runJob(`/api/dataset/${currentDataset}/predict`, payload)
     
     if(data.error) {
       alert(`Prediction Error: ${data.error}`)
@@ -312,8 +456,10 @@ function displayPredictionInfo(data, years) {
     <ul class="mb-0">
   `
   
+  const level = Math.round((data.model_info.interval_level || 0.95) * 100)
   data.forecast.forEach(f => {
-    html += `<li>Year ${f.year}: X=${f.x.toFixed(2)}, Y=${f.y.toFixed(2)}</li>`
+    const range = f.lower !== null && f.lower !== undefined ? ` (${level}% range ${f.lower.toFixed(2)} to ${f.upper.toFixed(2)})` : ''
+    html += `<li>Year ${f.year}: X=${f.x.toFixed(2)}, Y=${f.y.toFixed(2)}${range}</li>`
   })
   
   html += '</ul>'
@@ -387,13 +533,7 @@ async function generateAnalysisReport() {
   const payload = { x: x, y: y }
   
   try {
-    const res = await fetch(`/api/dataset/${currentDataset}/analyze`, {
-      method: 'POST',
-      headers: {'Content-Type': 'application/json'},
-      body: JSON.stringify(payload)
-    })
-    
-    const data = await res.json()
+    const data = await runJob(`/api/dataset/${currentDataset}/analyze`, payload)
     
     if(data.error) {
       alert(`Analysis Error: ${data.error}`)
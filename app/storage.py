@@ -0,0 +1,457 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from . import blobs, metrics
+from .filters import SEARCH_OPERATORS
+from .profiling import promote_dtype
+
+# Columnar copy of an upload: one directory per dataset, one sub-directory per
+# column and one .npy file per row group. String columns are stored as int32
+# codes plus a small JSON list of the values they point at. Each row group
+# records the dtype it was written with; readers cast to the column dtype.
+# Row groups also keep per-column null counts and, for numeric and date
+# columns, the min and max (dates as nanoseconds since the epoch), so filtered
+# reads can skip whole groups. A column whose values never decrease and are
+# never missing is marked sorted; range filters on it are answered by binary
+# search instead of a scan.
+ROW_GROUP_SIZE = 100000
+SCHEMA_FILE = 'schema.json'
+STORE_SUFFIX = '.cols'
+# byte offset in the CSV of every ROW_INDEX_STRIDE-th data row, for seeking previews;
+# compressed uploads also keep where their gzip members start (see blobs)
+ROW_INDEX_FILE = 'rows.npy'
+MEMBER_INDEX_FILE = 'members.npy'
+ROW_INDEX_STRIDE = 1000
+SCAN_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def csv_sep(filename):
+    name = filename.lower()
+    if blobs.is_blob(name):
+        name = name[:-len(blobs.BLOB_SUFFIX)]
+    return '\t' if name.endswith('.tsv') else ','
+
+
+def store_path(upload_folder, filename):
+    return os.path.join(upload_folder, filename + STORE_SUFFIX)
+
+
+def has_store(path):
+    return os.path.exists(os.path.join(path, SCHEMA_FILE))
+
+
+def read_schema(path):
+    with open(os.path.join(path, SCHEMA_FILE)) as f:
+        return json.load(f)
+
+
+def remove_store(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class ColumnWriter:
+    """Append DataFrame chunks to a columnar store as row groups"""
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = None
+        self.row_groups = []
+        self.row_index = None
+        remove_store(path)
+        os.makedirs(path)
+
+    def append(self, df):
+        if self.columns is None:
+            self.columns = [{'name': col, 'dtype': None, 'sorted': True} for col in df.columns]
+        group = len(self.row_groups)
+        dtypes = []
+        bounds = []
+        for i, col in enumerate(df.columns):
+            dtypes.append(self._write(i, group, df[col]))
+            bounds.append(value_bounds(df[col]))
+            column = self.columns[i]
+            column['dtype'] = promote_dtype(column['dtype'], dtypes[-1])
+            if column['sorted']:
+                previous = self.row_groups[-1]['max'][i] if self.row_groups else None
+                column['sorted'] = is_sorted(df[col]) and (
+                    previous is None or bounds[-1][0] is None or bounds[-1][0] >= previous)
+        nulls = [int(n) for n in df.isna().sum().tolist()]
+        self.row_groups.append({'rows': int(len(df)), 'dtypes': dtypes, 'nulls': nulls,
+                                'min': [b[0] for b in bounds], 'max': [b[1] for b in bounds]})
+
+    def rewrite(self, index, group, series):
+        """Replace one row group of one column, e.g. after dtype promotion"""
+        entry = self.row_groups[group]
+        entry['dtypes'][index] = self._write(index, group, series)
+        entry['min'][index], entry['max'][index] = value_bounds(series)
+        self.columns[index]['sorted'] = False
+
+    def write_row_index(self, offsets, stride=ROW_INDEX_STRIDE, members=None):
+        np.save(os.path.join(self.path, ROW_INDEX_FILE), np.asarray(offsets, dtype=np.int64))
+        self.row_index = {'stride': stride}
+        if members is not None:
+            np.save(os.path.join(self.path, MEMBER_INDEX_FILE), np.asarray(members, dtype=np.int64))
+            self.row_index['members'] = True
+
+    def _write(self, index, group, series):
+        col_dir = os.path.join(self.path, f'c{index}')
+        os.makedirs(col_dir, exist_ok=True)
+        base = os.path.join(col_dir, f'g{group}')
+        if series.dtype == object:
+            codes, uniques = pd.factorize(series)
+            np.save(base + '.npy', codes.astype(np.int32))
+            with open(base + '.json', 'w') as f:
+                json.dump(uniques.tolist(), f)
+        else:
+            np.save(base + '.npy', series.to_numpy())
+        return str(series.dtype)
+
+    def close(self):
+        schema = {
+            'version': 1,
+            'rows': sum(g['rows'] for g in self.row_groups),
+            'columns': [dict(c, dtype=c['dtype'] or 'object') for c in self.columns or []],
+            'row_groups': self.row_groups,
+        }
+        if self.row_index is not None:
+            schema['row_index'] = self.row_index
+        # the schema file is written last so a half-written store is never used
+        tmp = os.path.join(self.path, SCHEMA_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(schema, f)
+        os.replace(tmp, os.path.join(self.path, SCHEMA_FILE))
+
+
+def value_bounds(series):
+    """(min, max) of a numeric or date series as plain numbers, (None, None) otherwise"""
+    if series.dtype.kind not in 'iufM' or not series.notna().any():
+        return None, None
+    if series.dtype.kind == 'M':
+        return series.min().value, series.max().value
+    return series.min().item(), series.max().item()
+
+
+def is_sorted(series):
+    """True for numeric or date values in ascending order with none missing"""
+    return (series.dtype.kind in 'iufM' and not series.isna().any()
+            and series.is_monotonic_increasing)
+
+
+def write_frame(df, path, row_group_size=ROW_GROUP_SIZE):
+    """Write a parsed DataFrame to a columnar store"""
+    writer = ColumnWriter(path)
+    for start in range(0, max(len(df), 1), row_group_size):
+        writer.append(df.iloc[start:start + row_group_size])
+    writer.close()
+
+
+def row_starts(csv_path, stride=ROW_INDEX_STRIDE):
+    """Byte offsets of every stride-th data row of a CSV, and the number of data rows
+
+    Newlines inside double-quoted fields do not end a row, and blank lines are
+    skipped the way pandas skips them. Offsets count uncompressed bytes.
+    """
+    offsets = []
+    rows = -1  # the first non-blank line is the header
+    in_quotes = False
+    line_start = 0
+    last_byte = 0
+    tail = b''
+    with open(csv_path, 'rb') as raw:
+        f = blobs.decompressed(raw, csv_path)
+        pos = 0
+        while True:
+            block = f.read(SCAN_BLOCK_BYTES)
+            if not block:
+                break
+            data = np.frombuffer(block, dtype=np.uint8)
+            newlines = np.flatnonzero(data == 10)
+            quotes = np.flatnonzero(data == 34)
+            # a newline ends a row when an even number of quotes precede it
+            parity = (np.searchsorted(quotes, newlines) + in_quotes) % 2
+            ends = newlines[parity == 0]
+            if len(ends):
+                starts = np.concatenate([[line_start], pos + ends[:-1] + 1])
+                lengths = pos + ends - starts
+                before = np.where(ends > 0, data[np.maximum(ends - 1, 0)], last_byte)
+                blank = (lengths == 0) | ((lengths == 1) & (before == 13))
+                starts = starts[~blank]
+                if rows < 0 and len(starts):
+                    starts = starts[1:]
+                    rows = 0
+                first = (-rows) % stride
+                offsets.extend(starts[first::stride].tolist())
+                rows += len(starts)
+                line_start = pos + int(ends[-1]) + 1
+            in_quotes = (in_quotes + len(quotes)) % 2 == 1
+            last_byte = int(data[-1])
+            # the first bytes of the line still open after this block
+            if line_start >= pos:
+                tail = block[line_start - pos:line_start - pos + 2]
+            elif len(tail) < 2:
+                tail += block[:2 - len(tail)]
+            pos += len(block)
+        # a last row without a trailing newline
+        if tail.strip(b'\r\n'):
+            if rows >= 0 and rows % stride == 0:
+                offsets.append(line_start)
+            rows += 1
+    return np.asarray(offsets, dtype=np.int64), max(rows, 0)
+
+
+def read_row_index(path):
+    """(offsets, stride, gzip members or None) of a store's row index, or None when it has none"""
+    if not has_store(path):
+        return None
+    info = read_schema(path).get('row_index')
+    if info is None:
+        return None
+    members = np.load(os.path.join(path, MEMBER_INDEX_FILE)) if info.get('members') else None
+    return np.load(os.path.join(path, ROW_INDEX_FILE), mmap_mode='r'), info['stride'], members
+
+
+def read_rows(upload_folder, filename, offset, limit, columns=None):
+    """Rows offset to offset + limit of a dataset's CSV, optionally only some columns
+
+    With a row index the read seeks to the nearest indexed row; older uploads
+    read from the start. Leading rows are parsed and dropped rather than
+    skipped with skiprows, which counts raw lines, blank ones included.
+    """
+    csv = os.path.join(upload_folder, filename)
+    sep = csv_sep(filename)
+    header = pd.read_csv(csv, sep=sep, nrows=0).columns.tolist()
+    usecols = header if columns is None else [c for c in header if c in columns]
+    index = read_row_index(store_path(upload_folder, filename))
+    if index is None:
+        df = pd.read_csv(csv, sep=sep, nrows=offset + limit, usecols=usecols)
+        return df.iloc[offset:].reset_index(drop=True)
+    offsets, stride, members = index
+    block = offset // stride
+    if block >= len(offsets) or limit == 0:
+        return pd.DataFrame(columns=usecols)
+    skip = offset - block * stride
+    with blobs.open_at(csv, int(offsets[block]), members) as f:
+        df = pd.read_csv(f, sep=sep, header=None, names=header, nrows=skip + limit, usecols=usecols)
+    return df.iloc[skip:].reset_index(drop=True)
+
+
+def read_group(path, index, group, dtype, rows=None):
+    """Read one row group of one column, memory-mapped when it is numeric
+
+    rows, a slice, reads only part of the group.
+    """
+    base = os.path.join(path, f'c{index}', f'g{group}')
+    values = np.load(base + '.npy', mmap_mode='r')
+    if rows is not None:
+        values = values[rows]
+    metrics.count(nbytes=values.nbytes)
+    if dtype != 'object':
+        return np.asarray(values)
+    with open(base + '.json') as f:
+        uniques = json.load(f)
+    # code -1 marks a missing value and picks the trailing NaN
+    lookup = np.empty(len(uniques) + 1, dtype=object)
+    lookup[:-1] = uniques
+    lookup[-1] = np.nan
+    return lookup[values]
+
+
+def read_dictionary(path, index, group):
+    """Distinct values of one text row group, in code order"""
+    with open(os.path.join(path, f'c{index}', f'g{group}.json')) as f:
+        return json.load(f)
+
+
+def read_column(path, schema, index, dtype=None):
+    """All row groups of one column, cast to dtype (the column dtype by default) group by group"""
+    dtype = dtype or schema['columns'][index]['dtype']
+    parts = []
+    for g, group in enumerate(schema['row_groups']):
+        values = read_group(path, index, g, group['dtypes'][index])
+        parts.append(values if values.dtype == dtype else values.astype(dtype))
+    if not parts:
+        return np.array([], dtype=dtype)
+    if len(parts) == 1:
+        return parts[0]
+    return np.concatenate(parts)
+
+
+def iter_column(upload_folder, filename, column, chunksize=ROW_GROUP_SIZE, where=None):
+    """Yield one column as arrays of at most a row group each"""
+    for chunk in iter_columns(upload_folder, filename, [column], chunksize, where):
+        yield chunk[column]
+
+
+def group_rows(path, schema, group, where, index_of):
+    """(rows, mask) of one row group passing a filters.Where
+
+    rows is a slice of the group and mask a boolean mask over it, or None
+    when the whole slice passes. Range tests on a sorted column narrow the
+    slice by binary search; the rest build the mask. Text columns are tested
+    once per distinct value in the group's dictionary and the result is
+    looked up by code.
+    """
+    entry = schema['row_groups'][group]
+    start, stop = 0, entry['rows']
+    rest = []
+    for condition in where.conditions:
+        index = index_of[condition.column]
+        if schema['columns'][index].get('sorted') and condition.op in SEARCH_OPERATORS:
+            low, high = condition.search(read_group(path, index, group, entry['dtypes'][index]))
+            start, stop = max(start, low), min(stop, high)
+        else:
+            rest.append((condition, index))
+    rows = slice(start, max(start, stop))
+    mask = None
+    for condition, index in rest:
+        if rows.start == rows.stop or (mask is not None and not mask.any()):
+            break
+        dtype = entry['dtypes'][index]
+        if dtype == 'object':
+            uniques = np.array(read_dictionary(path, index, group) + [None], dtype=object)
+            codes = np.load(os.path.join(path, f'c{index}', f'g{group}.npy'), mmap_mode='r')
+            # the trailing None fails every test and is picked by the missing code -1
+            hits = condition.test(uniques)[codes[rows]]
+        else:
+            hits = condition.test(read_group(path, index, group, dtype, rows))
+        mask = hits if mask is None else mask & hits
+    return rows, mask
+
+
+def iter_columns(upload_folder, filename, columns, chunksize=ROW_GROUP_SIZE, where=None):
+    """Yield {column: array} for several columns, aligned row group by row group
+
+    With where (a filters.Where) only passing rows are yielded; row groups
+    whose statistics rule out every row are not read at all.
+    """
+    path = store_path(upload_folder, filename)
+    if has_store(path):
+        schema = read_schema(path)
+        names = [c['name'] for c in schema['columns']]
+        indexes = {column: names.index(column) for column in columns}
+        index_of = {name: i for i, name in enumerate(names)}
+        for g, group in enumerate(schema['row_groups']):
+            rows = mask = None
+            if where is not None:
+                if where.skip(group, index_of):
+                    continue
+                rows, mask = group_rows(path, schema, g, where, index_of)
+                if rows.start == rows.stop or (mask is not None and not mask.any()):
+                    continue
+            chunk = {}
+            for column, index in indexes.items():
+                dtype = schema['columns'][index]['dtype']
+                values = read_group(path, index, g, group['dtypes'][index], rows)
+                if mask is not None:
+                    values = values[mask]
+                chunk[column] = values if values.dtype == dtype else values.astype(dtype)
+            metrics.count(rows=len(next(iter(chunk.values()))) if chunk else 0)
+            yield chunk
+    else:
+        usecols = list(dict.fromkeys(columns + (where.columns if where is not None else [])))
+        reader = pd.read_csv(os.path.join(upload_folder, filename), sep=csv_sep(filename),
+                             usecols=usecols, chunksize=chunksize)
+        for chunk in reader:
+            metrics.count(rows=len(chunk), nbytes=chunk.memory_usage(index=False).sum())
+            if where is not None:
+                chunk = chunk[where.mask({c: chunk[c].to_numpy() for c in where.columns})]
+            yield {column: chunk[column].to_numpy() for column in columns}
+
+
+def read_categorical(path, schema, index):
+    """A text column as a pandas Categorical built from the stored codes, None if it holds non-text
+
+    Categories are sorted so groupby orders groups as it would for the text.
+    """
+    dictionaries = []
+    for g, group in enumerate(schema['row_groups']):
+        if group['dtypes'][index] == 'object':
+            dictionaries.append(read_dictionary(path, index, g))
+        elif group['nulls'][index] >= group['rows']:
+            dictionaries.append(None)
+        else:
+            return None
+    categories = sorted(set().union(*(d for d in dictionaries if d is not None)))
+    if not all(isinstance(v, str) for v in categories):
+        return None
+    position = {value: i for i, value in enumerate(categories)}
+    parts = []
+    for g, uniques in enumerate(dictionaries):
+        rows = schema['row_groups'][g]['rows']
+        if uniques is None:
+            parts.append(np.full(rows, -1, dtype=np.int32))
+            continue
+        codes = np.load(os.path.join(path, f'c{index}', f'g{g}.npy'), mmap_mode='r')
+        metrics.count(nbytes=codes.nbytes)
+        # the group's codes renumbered into the shared categories; -1 (missing) picks the trailing -1
+        lookup = np.array([position[v] for v in uniques] + [-1], dtype=np.int32)
+        parts.append(lookup[codes])
+    codes = np.concatenate(parts) if parts else np.array([], dtype=np.int32)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def read_columns(path, columns=None, dtypes=None):
+    """Load the named columns from a columnar store into a DataFrame
+
+    dtypes maps column names to compact dtypes recorded at upload; text
+    columns marked "category" are read as Categoricals.
+    """
+    schema = read_schema(path)
+    names = [c['name'] for c in schema['columns']]
+    wanted = names if columns is None else [c for c in names if c in columns]
+    dtypes = dtypes or {}
+    data = {}
+    for name in wanted:
+        index = names.index(name)
+        compact = dtypes.get(name)
+        values = read_categorical(path, schema, index) if compact == 'category' else None
+        if values is None:
+            values = read_column(path, schema, index, None if compact == 'category' else compact)
+        data[name] = values
+    metrics.count(rows=schema['rows'])
+    return pd.DataFrame(data, columns=wanted)
+
+
+def load_frame(upload_folder, filename, columns=None, where=None, dtypes=None):
+    """Load a dataset, preferring the columnar copy and falling back to the CSV
+
+    With where (a filters.Where) only the passing rows are read. dtypes maps
+    column names to the compact dtypes recorded at upload; they apply to
+    whole columns read from the columnar copy, while filtered reads are
+    short-lived and keep the stored dtypes.
+    """
+    path = store_path(upload_folder, filename)
+    if columns is not None:
+        columns = set(c for c in columns if c is not None)
+    if where is not None:
+        return read_filtered(upload_folder, filename, columns, where)
+    if has_store(path):
+        return read_columns(path, columns, dtypes)
+    usecols = None if columns is None else (lambda c: c in columns)
+    df = pd.read_csv(os.path.join(upload_folder, filename), sep=csv_sep(filename), usecols=usecols)
+    metrics.count(rows=len(df), nbytes=df.memory_usage(index=False).sum())
+    return df
+
+
+def read_filtered(upload_folder, filename, columns, where):
+    """Passing rows of the named columns (all when None), assembled from a filtered scan"""
+    path = store_path(upload_folder, filename)
+    if has_store(path):
+        schema_columns = read_schema(path)['columns']
+    else:
+        header = pd.read_csv(os.path.join(upload_folder, filename), sep=csv_sep(filename), nrows=0)
+        schema_columns = [{'name': c, 'dtype': 'object'} for c in header.columns]
+    wanted = [c for c in schema_columns if columns is None or c['name'] in columns]
+    names = [c['name'] for c in wanted]
+    parts = {name: [] for name in names}
+    for chunk in iter_columns(upload_folder, filename, names, where=where):
+        for name in names:
+            parts[name].append(chunk[name])
+    data = {}
+    for column in wanted:
+        pieces = parts[column['name']]
+        data[column['name']] = np.concatenate(pieces) if pieces else np.array([], dtype=column['dtype'])
+    return pd.DataFrame(data, columns=names)
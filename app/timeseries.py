@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from .aggregates import GroupSummary
+
+# resample rules and the label each bin start is formatted with
+LABEL_FORMATS = {
+    'minute': '%Y-%m-%d %H:%M',
+    'hour': '%Y-%m-%d %H:00',
+    'day': '%Y-%m-%d',
+    'week': '%Y-%m-%d',
+    'month': '%Y-%m',
+}
+RULES = tuple(LABEL_FORMATS)
+# NumPy datetime unit each rule truncates to; weeks are built from days
+UNITS = {'minute': 'm', 'hour': 'h', 'day': 'D', 'month': 'M'}
+
+
+def summary_key(xcol, rule):
+    """x_column a resampled summary is stored under, next to the plain group summaries"""
+    return f'{xcol}@{rule}'
+
+
+def as_datetime(values):
+    """datetime64[ns] array of values; text that is not a date becomes NaT
+
+    Date columns are stored as datetime64 at upload; older uploads and CSV
+    reads still hold the dates as text.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[ns]', copy=False)
+    return pd.to_datetime(pd.Series(values, dtype=object), errors='coerce').to_numpy()
+
+
+def bin_starts(values, rule):
+    """Start of the rule's bin holding each datetime64 value, as int64 nanoseconds"""
+    if rule == 'week':
+        days = values.astype('datetime64[D]').astype(np.int64)
+        # day 0, 1970-01-01, was a Thursday; weeks start on Monday
+        starts = (days - (days + 3) % 7).astype('datetime64[D]')
+    else:
+        starts = values.astype(f'datetime64[{UNITS[rule]}]')
+    return starts.astype('datetime64[ns]').view(np.int64)
+
+
+def resample(chunks, rule):
+    """GroupSummary of y per time bin from chunks of (x, y)
+
+    y may be None, in which case every row with a date counts as a value of
+    one, so the summary's counts are rows per bin. Bins are labelled with
+    their start and only bins holding rows are kept.
+    """
+    partials = []
+    for x, y in chunks:
+        x = as_datetime(x)
+        keep = ~np.isnat(x)
+        bins = bin_starts(x[keep], rule)
+        y = np.ones(len(bins)) if y is None else np.asarray(y, dtype=np.float64)[keep]
+        frame = pd.DataFrame({'bin': bins, 'y': y, 'ysq': y * y})
+        grouped = frame.groupby('bin', sort=False)
+        partials.append(pd.DataFrame({
+            'count': grouped['y'].count(), 'sum': grouped['y'].sum(), 'sumsq': grouped['ysq'].sum(),
+            'min': grouped['y'].min(), 'max': grouped['y'].max(),
+        }))
+    if not partials:
+        return GroupSummary([], [], [], [], [], [])
+    stats = pd.concat(partials).groupby(level=0).agg(
+        {'count': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max'})
+    labels = pd.DatetimeIndex(stats.index.to_numpy().view('datetime64[ns]')).strftime(LABEL_FORMATS[rule])
+    return GroupSummary(labels, stats['count'], stats['sum'], stats['sumsq'], stats['min'], stats['max'])
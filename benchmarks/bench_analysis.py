@@ -0,0 +1,225 @@
+"""Regression check and timing for the single-pass /analyze engine.
+
+Compares AnalysisEngine output against the previous per-report groupby
+implementation on randomized frames, then times both.
+
+Usage: python -m benchmarks.bench_analysis [--frames 20] [--rows 1000000]
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from benchmarks.common import make_frame, timed
+from app.aggregates import GroupSummary
+from app.analysis import AnalysisEngine
+
+
+def legacy_reports(df, xcol, ycol):
+    """The four reports as the routes computed them before the shared engine"""
+    reports = []
+    grouped = df.groupby(xcol)[ycol].mean()
+    reports.append(legacy_bar(grouped, ycol))
+    reports.append(legacy_line(df.groupby(xcol)[ycol].mean().sort_index(), xcol, ycol))
+    reports.append(legacy_pie(df.groupby(xcol)[ycol].sum(), xcol, ycol))
+    reports.append(legacy_histogram(df[xcol].dropna(), xcol))
+    return reports
+
+
+def legacy_bar(grouped, ycol):
+    insights = {
+        'summary': f'Analyzing {len(grouped)} categories by average {ycol}',
+        'statistics': {
+            'total_categories': int(len(grouped)),
+            'highest_value': float(grouped.max()),
+            'lowest_value': float(grouped.min()),
+            'average_value': float(grouped.mean()),
+            'median_value': float(grouped.median()),
+            'std_deviation': float(grouped.std())
+        },
+        'top_performers': [],
+        'bottom_performers': [],
+        'key_insights': []
+    }
+    for idx, (category, value) in enumerate(grouped.nlargest(3).items(), 1):
+        insights['top_performers'].append({'rank': idx, 'category': str(category), 'value': float(value)})
+    for idx, (category, value) in enumerate(grouped.nsmallest(3).items(), 1):
+        insights['bottom_performers'].append({'rank': idx, 'category': str(category), 'value': float(value)})
+    value_range = grouped.max() - grouped.min()
+    insights['key_insights'].append(f"The data spans a range of {value_range:.2f} units")
+    if grouped.std() / grouped.mean() > 0.5:
+        insights['key_insights'].append("High variability detected across categories")
+    else:
+        insights['key_insights'].append("Relatively consistent values across categories")
+    q1 = grouped.quantile(0.25)
+    q3 = grouped.quantile(0.75)
+    iqr = q3 - q1
+    outliers = grouped[(grouped < q1 - 1.5 * iqr) | (grouped > q3 + 1.5 * iqr)]
+    if len(outliers) > 0:
+        insights['key_insights'].append(f"Found {len(outliers)} potential outlier(s)")
+    return insights
+
+
+def legacy_line(grouped, xcol, ycol):
+    insights = {
+        'summary': f'Trend analysis of {ycol} over {xcol}',
+        'statistics': {
+            'data_points': int(len(grouped)),
+            'starting_value': float(grouped.iloc[0]),
+            'ending_value': float(grouped.iloc[-1]),
+            'peak_value': float(grouped.max()),
+            'lowest_value': float(grouped.min()),
+            'average_value': float(grouped.mean())
+        },
+        'trend_analysis': {},
+        'key_insights': []
+    }
+    values = grouped.values
+    if len(values) > 1:
+        slope = np.polyfit(np.arange(len(values)), values, 1)[0]
+        if slope > 0:
+            trend, trend_emoji = 'Upward', '📈'
+        elif slope < 0:
+            trend, trend_emoji = 'Downward', '📉'
+        else:
+            trend, trend_emoji = 'Stable', '➡️'
+        insights['trend_analysis'] = {
+            'direction': trend,
+            'emoji': trend_emoji,
+            'slope': float(slope),
+            'change_rate': f"{((grouped.iloc[-1] - grouped.iloc[0]) / grouped.iloc[0] * 100):.2f}%"
+        }
+        change_pct = (grouped.iloc[-1] - grouped.iloc[0]) / grouped.iloc[0] * 100
+        insights['key_insights'].append(f"Overall change: {change_pct:+.2f}% from start to end")
+        volatility = grouped.std() / grouped.mean() * 100
+        insights['key_insights'].append(f"Volatility index: {volatility:.2f}%")
+        insights['key_insights'].append(f"Peak at {grouped.idxmax()}, Trough at {grouped.idxmin()}")
+    return insights
+
+
+def legacy_pie(grouped, xcol, ycol):
+    total = grouped.sum()
+    insights = {
+        'summary': f'Distribution analysis of {ycol} across {xcol} categories',
+        'statistics': {
+            'total_value': float(total),
+            'number_of_segments': int(len(grouped)),
+            'largest_segment_value': float(grouped.max()),
+            'smallest_segment_value': float(grouped.min()),
+            'average_segment_value': float(grouped.mean())
+        },
+        'distribution': [],
+        'key_insights': []
+    }
+    percentages = (grouped / total * 100).sort_values(ascending=False)
+    for idx, (category, pct) in enumerate(percentages.items(), 1):
+        insights['distribution'].append({
+            'rank': idx,
+            'category': str(category),
+            'value': float(grouped[category]),
+            'percentage': f"{pct:.2f}%"
+        })
+    top_segment = percentages.iloc[0]
+    insights['key_insights'].append(f"Largest segment: {percentages.index[0]} ({top_segment:.2f}%)")
+    top_3_total = percentages.head(3).sum()
+    if top_3_total > 70:
+        insights['key_insights'].append(f"High concentration: Top 3 segments represent {top_3_total:.2f}% of total")
+    else:
+        insights['key_insights'].append(f"Balanced distribution: Top 3 segments represent {top_3_total:.2f}% of total")
+    if top_segment > 50:
+        insights['key_insights'].append("Single dominant segment detected (>50%)")
+    return insights
+
+
+def legacy_histogram(data, xcol):
+    insights = {
+        'summary': f'Distribution analysis of {xcol}',
+        'statistics': {
+            'count': int(len(data)),
+            'mean': float(data.mean()),
+            'median': float(data.median()),
+            'mode': float(data.mode()[0]) if len(data.mode()) > 0 else None,
+            'std_dev': float(data.std()),
+            'min': float(data.min()),
+            'max': float(data.max()),
+            'range': float(data.max() - data.min())
+        },
+        'quartiles': {
+            'q1': float(data.quantile(0.25)),
+            'q2': float(data.quantile(0.50)),
+            'q3': float(data.quantile(0.75))
+        },
+        'key_insights': []
+    }
+    mean = data.mean()
+    median = data.median()
+    if abs(mean - median) < data.std() * 0.1:
+        distribution = 'Normally distributed (symmetric)'
+    elif mean > median:
+        distribution = 'Right-skewed (positive skew)'
+    else:
+        distribution = 'Left-skewed (negative skew)'
+    insights['key_insights'].append(distribution)
+    q1 = data.quantile(0.25)
+    q3 = data.quantile(0.75)
+    iqr = q3 - q1
+    outliers = data[(data < q1 - 1.5 * iqr) | (data > q3 + 1.5 * iqr)]
+    if len(outliers) > 0:
+        insights['key_insights'].append(f"Detected {len(outliers)} outliers ({len(outliers)/len(data)*100:.2f}%)")
+    else:
+        insights['key_insights'].append("No significant outliers detected")
+    cv = (data.std() / data.mean()) * 100
+    if cv < 15:
+        insights['key_insights'].append(f"Low variability (CV: {cv:.2f}%)")
+    elif cv < 30:
+        insights['key_insights'].append(f"Moderate variability (CV: {cv:.2f}%)")
+    else:
+        insights['key_insights'].append(f"High variability (CV: {cv:.2f}%)")
+    return insights
+
+
+def engine_reports(df, xcol, ycol):
+    summary = GroupSummary.from_frame(df, xcol, ycol)
+    engine = AnalysisEngine(xcol, ycol, summary=summary, x_values=df[xcol].dropna())
+    return [r['analysis'] for r in engine.reports()]
+
+
+def random_frame(rng, rows):
+    df = make_frame(rows, seed=int(rng.integers(1 << 31)))
+    # vary cardinality, missing values and skew between frames
+    df['year'] = df['year'] % int(rng.integers(2, 40))
+    df['sales'] = df['sales'] ** float(rng.uniform(0.5, 2.0))
+    df.loc[rng.random(rows) < rng.uniform(0, 0.2), 'sales'] = np.nan
+    df.loc[rng.random(rows) < rng.uniform(0, 0.2), 'year'] = np.nan
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    mismatches = 0
+    for i in range(args.frames):
+        df = random_frame(rng, int(rng.integers(50, 20000)))
+        for xcol, ycol in [('year', 'sales'), ('units', 'sales'), ('year', 'units')]:
+            old = json.dumps(legacy_reports(df, xcol, ycol), sort_keys=True)
+            new = json.dumps(engine_reports(df, xcol, ycol), sort_keys=True)
+            if old != new:
+                mismatches += 1
+                print(f'mismatch: frame {i} x={xcol} y={ycol}')
+    print(f'{args.frames} frames compared, {mismatches} mismatches')
+
+    df = random_frame(rng, args.rows)
+    old_time, _ = timed(lambda: legacy_reports(df, 'year', 'sales'))
+    new_time, _ = timed(lambda: engine_reports(df, 'year', 'sales'))
+    print(f'{args.rows:,} rows  legacy={old_time * 1000:.1f} ms  engine={new_time * 1000:.1f} ms  '
+          f'speedup={old_time / new_time:.1f}x')
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""End-to-end "Generate all charts" latency: four /chart calls vs. one /charts call.
+
+Cold runs drop the frame cache and stored group summaries first, which is
+what the first click on a new x/y pair sees; warm runs repeat the click.
+
+Usage: python -m benchmarks.bench_batch [--rows 1000000]
+"""
+import argparse
+import tempfile
+
+from benchmarks.common import make_frame, make_client, upload_frame, timed
+
+CHART_TYPES = ['bar', 'line', 'pie', 'histogram']
+
+
+def specs(x, y):
+    return [dict({'x': x, 'type': t}, **({'y': y} if t != 'histogram' else {})) for t in CHART_TYPES]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app, client = make_client(workdir)
+        ds_id = upload_frame(client, make_frame(args.rows))
+        from app import db, routes
+        from app.models import Aggregate
+
+        def reset():
+            routes.frame_cache.invalidate(ds_id)
+            with app.app_context():
+                Aggregate.query.filter_by(dataset_id=ds_id).delete()
+                db.session.commit()
+
+        def sequential():
+            for spec in specs('year', 'sales'):
+                assert client.post(f'/api/dataset/{ds_id}/chart', json=spec).status_code == 200
+
+        def batched():
+            res = client.post(f'/api/dataset/{ds_id}/charts', json={'charts': specs('year', 'sales')})
+            assert all(c['status'] == 200 for c in res.get_json()['charts'])
+
+        def cold(fn):
+            def run():
+                reset()
+                fn()
+            return run
+
+        print(f'{args.rows:,} rows')
+        for label, fn in [('4 x /chart', sequential), ('1 x /charts', batched)]:
+            cold_time, _ = timed(cold(fn), args.repeat)
+            warm_time, _ = timed(fn, args.repeat)
+            print(f'  {label:<12} cold={cold_time * 1000:9.1f} ms  warm={warm_time * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Dataset catalog: the paged slim listing against loading every row and its metadata.
+
+Fills a scratch database with --datasets uploads carrying realistic
+metadata (--columns columns with value samples) and times GET /api/datasets
+(first page, a page with column metadata, and walking every page) against
+the old listing, which loaded every Dataset and parsed each meta_json.
+
+Usage: python -m benchmarks.bench_catalog [--datasets 5000] [--columns 40]
+"""
+import argparse
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.common import make_client, timed
+
+
+def fake_meta(columns, rows):
+    cols = []
+    for i in range(columns):
+        numeric = i % 2 == 0
+        cols.append({'name': f'column_{i}', 'dtype': 'float64' if numeric else 'object',
+                     'is_numeric': numeric, 'is_datetime': False, 'unique_count': 1000 + i,
+                     'unique_sample': [1.5, 2.25, 3.0, 4.75, 5.5] if numeric else
+                     ['north-east region', 'south-west region', 'central', 'overseas', 'unknown'],
+                     'compact_dtype': None if numeric else 'category'})
+    return {'columns': cols, 'rows': rows, 'cols': columns}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--datasets', type=int, default=5000)
+    parser.add_argument('--columns', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app, client = make_client(workdir)
+        from app import db
+        from app.models import Dataset, DatasetColumn
+        start = datetime(2024, 1, 1)
+        with app.app_context():
+            for i in range(args.datasets):
+                meta = fake_meta(args.columns, 100000 + i)
+                db.session.add(Dataset(filename=f'{i}.csv', original_name=f'upload_{i}.csv',
+                                       upload_time=start + timedelta(minutes=i), rows=meta['rows'],
+                                       cols=args.columns, meta_json=json.dumps(meta),
+                                       dataset_columns=DatasetColumn.from_meta(meta)))
+            db.session.commit()
+
+        def old_listing():
+            with app.app_context():
+                return [d.to_dict() for d in Dataset.query.order_by(Dataset.upload_time.desc()).all()]
+
+        def first_page():
+            return client.get('/api/datasets').get_json()
+
+        def page_with_metadata():
+            return client.get('/api/datasets?metadata=1').get_json()
+
+        def every_page():
+            found, url = 0, '/api/datasets?limit=1000'
+            while url:
+                res = client.get(url)
+                found += len(res.get_json())
+                link = res.headers.get('Link')
+                url = link[1:link.index('>')] if link else None
+            return found
+
+        old_time, listed = timed(old_listing, args.repeat)
+        page_time, page = timed(first_page, args.repeat)
+        meta_time, _ = timed(page_with_metadata, args.repeat)
+        walk_time, found = timed(every_page, args.repeat)
+        assert found == len(listed) == args.datasets
+        assert [d['id'] for d in page] == [d['id'] for d in listed[:len(page)]]
+        print(f'{args.datasets:,} datasets of {args.columns} columns')
+        print(f'  every row with parsed metadata (before) {old_time * 1000:9.1f} ms')
+        print(f'  first page of {len(page)}                   {page_time * 1000:9.1f} ms')
+        print(f'  first page with column metadata       {meta_time * 1000:9.1f} ms')
+        print(f'  every page, 1000 at a time            {walk_time * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
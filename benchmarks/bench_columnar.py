@@ -0,0 +1,56 @@
+"""Per-request load latency: full CSV parse vs. the columnar copy.
+
+Usage: python -m benchmarks.bench_columnar [--rows 1000000 10000000]
+"""
+import argparse
+import os
+import tempfile
+
+import pandas as pd
+
+from benchmarks.common import make_frame, timed
+from app import storage
+
+
+def run(rows, workdir):
+    csv_path = os.path.join(workdir, f'bench_{rows}.csv')
+    make_frame(rows).to_csv(csv_path, index=False)
+    df = storage.load_frame(workdir, os.path.basename(csv_path))
+    store = storage.store_path(workdir, os.path.basename(csv_path))
+    storage.write_frame(df, store)
+    del df
+
+    def chart_from_csv():
+        df = pd.read_csv(csv_path)
+        return df.groupby('region')['sales'].mean()
+
+    def chart_from_store():
+        df = storage.read_columns(store, {'region', 'sales'})
+        return df.groupby('region')['sales'].mean()
+
+    def predict_from_store():
+        df = storage.read_columns(store, {'year', 'sales'})
+        return df[['year', 'sales']].dropna()
+
+    csv_time, _ = timed(chart_from_csv)
+    store_time, _ = timed(chart_from_store)
+    numeric_time, _ = timed(predict_from_store)
+    size_csv = os.path.getsize(csv_path)
+    print(f'{rows:>10,} rows  csv={size_csv / 1e6:8.1f} MB  '
+          f'csv+groupby={csv_time * 1000:9.1f} ms  '
+          f'columnar+groupby={store_time * 1000:9.1f} ms  '
+          f'columnar numeric pair={numeric_time * 1000:9.1f} ms  '
+          f'speedup={csv_time / store_time:6.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 10000000])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.rows:
+            run(rows, workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Compact dtypes: memory and groupby time of default against compacted frames.
+
+Uploads a generated dataset (see benchmarks.generate) and loads every column
+twice from the columnar store: with pandas' default dtypes (object text,
+int64) and with the compact dtypes recorded at upload (categoricals for
+repeated text, the narrowest integer type). Reports the deep memory of each
+column and the time to load and to group a float column by each categorical
+and integer column.
+
+Usage: python -m benchmarks.bench_compact [--rows 2000000] [--width 11] [--cardinality 50]
+"""
+import argparse
+import json
+import tempfile
+
+from benchmarks.common import make_client, timed, upload_bytes
+from benchmarks.generate import make_dataset, to_bytes
+
+
+def megabytes(nbytes):
+    return nbytes / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--width', type=int, default=11)
+    parser.add_argument('--cardinality', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_dataset(args.rows, args.width, args.cardinality, null_rate=0.0)
+    with tempfile.TemporaryDirectory() as workdir:
+        app, client = make_client(workdir)
+        ds_id = upload_bytes(client, to_bytes(df), 'compact.csv')
+        from app import db, storage
+        from app.models import Dataset
+        with app.app_context():
+            ds = db.session.get(Dataset, ds_id)
+            folder, filename = app.config['UPLOAD_FOLDER'], ds.filename
+            columns = json.loads(ds.meta_json)['columns']
+        dtypes = {c['name']: c['compact_dtype'] for c in columns}
+
+        plain_load, plain = timed(lambda: storage.load_frame(folder, filename), args.repeat)
+        compact_load, compacted = timed(lambda: storage.load_frame(folder, filename, dtypes=dtypes), args.repeat)
+        before = plain.memory_usage(index=False, deep=True)
+        after = compacted.memory_usage(index=False, deep=True)
+
+        print(f'{args.rows:,} rows, {args.cardinality} categories')
+        print(f'  {"column":<8} {"default":>14} {"compact":>14} {"MB before":>10} {"MB after":>10}')
+        for name in plain.columns:
+            print(f'  {name:<8} {str(plain[name].dtype):>14} {str(compacted[name].dtype):>14} '
+                  f'{megabytes(before[name]):10.1f} {megabytes(after[name]):10.1f}')
+        print(f'  total {megabytes(before.sum()):.1f} MB -> {megabytes(after.sum()):.1f} MB '
+              f'({before.sum() / after.sum():.1f}x smaller); load {plain_load * 1000:.0f} ms -> '
+              f'{compact_load * 1000:.0f} ms')
+
+        # every id is its own group, which says nothing about grouping speed
+        keys = [c['name'] for c in columns if c['compact_dtype'] is not None and c['name'] != 'id']
+        for key in keys:
+            plain_time, expected = timed(lambda: plain.groupby(key)['num0'].mean(), args.repeat)
+            compact_time, result = timed(lambda: compacted.groupby(key, observed=True)['num0'].mean(), args.repeat)
+            assert (abs(result.to_numpy() - expected.to_numpy()) < 1e-9).all()
+            print(f'  mean num0 by {key:<6} default {plain_time * 1000:8.1f} ms   compact {compact_time * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Content-addressed uploads: a first upload against the same bytes uploaded again.
+
+Uploads a generated dataset (see benchmarks.generate), then the same bytes
+under another name, which is recognised by its digest and shares the stored
+file and columnar copy instead of being parsed again. Reports both upload
+times, the compressed size on disk and the time of a preview page near the
+end of the file, which decompresses from the nearest gzip member.
+
+Usage: python -m benchmarks.bench_dedup [--rows 1000000] [--width 8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import make_client, timed, upload_bytes
+from benchmarks.generate import make_dataset, to_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--width', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = to_bytes(make_dataset(args.rows, args.width, 50, 0.01))
+    with tempfile.TemporaryDirectory() as workdir:
+        app, client = make_client(workdir)
+        folder = app.config['UPLOAD_FOLDER']
+
+        started = time.perf_counter()
+        first = upload_bytes(client, data, 'first.csv')
+        first_time = time.perf_counter() - started
+        repeat_time, second = timed(lambda: upload_bytes(client, data, 'again.csv'), args.repeat)
+        stored = [name for name in os.listdir(folder) if os.path.isfile(os.path.join(folder, name))]
+        assert len(stored) == 1
+        size = os.path.getsize(os.path.join(folder, stored[0]))
+
+        offset = max(args.rows - 200, 0)
+        preview_time, res = timed(lambda: client.get(f'/api/dataset/{second}/preview?offset={offset}&limit=200'),
+                                  args.repeat)
+        assert res.status_code == 200
+        print(f'{args.rows:,} rows, {len(data) / 1e6:.1f} MB of CSV stored as {size / 1e6:.1f} MB')
+        print(f'  first upload        {first_time * 1000:9.1f} ms')
+        print(f'  same bytes again    {repeat_time * 1000:9.1f} ms')
+        print(f'  preview of the last page {preview_time * 1000:6.1f} ms')
+        client.delete(f'/api/dataset/{first}')
+        assert os.path.exists(os.path.join(folder, stored[0]))
+
+
+if __name__ == '__main__':
+    main()
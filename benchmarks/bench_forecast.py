@@ -0,0 +1,59 @@
+"""Timing of the NumPy forecasting engine against per-request LinearRegression.
+
+Fits y on x from row-group chunks, merges the sufficient statistics, and
+compares slope/intercept with numpy.polyfit (and scikit-learn when it is
+installed). Also times a forecast from already stored statistics.
+
+Usage: python -m benchmarks.bench_forecast [--rows 1000000] [--chunk 100000]
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from benchmarks.common import make_frame, timed
+from app.forecast import RegressionStats, forecast
+
+
+def streamed(x, y, chunk):
+    stats = RegressionStats()
+    for start in range(0, len(x), chunk):
+        stats.merge(RegressionStats.from_arrays(x[start:start + chunk], y[start:start + chunk]))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--chunk', type=int, default=100000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    x = df['year'].to_numpy(np.float64)
+    y = df['sales'].to_numpy(np.float64)
+
+    fit_time, stats = timed(lambda: streamed(x, y, args.chunk))
+    cached_time, _ = timed(lambda: forecast(RegressionStats.from_json(stats.to_json()), 100))
+    slope, intercept = np.polyfit(x, y, 1)
+    ok = np.isclose(stats.slope, slope, rtol=1e-9) and np.isclose(stats.intercept, intercept, rtol=1e-9)
+    print(f'{args.rows:,} rows')
+    print(f'  streamed fit       {fit_time * 1000:9.1f} ms  matches polyfit: {ok}')
+    print(f'  cached forecast    {cached_time * 1000:9.3f} ms  (100 steps with intervals)')
+
+    try:
+        from sklearn.linear_model import LinearRegression
+    except ImportError:
+        print('  scikit-learn not installed, skipping LinearRegression')
+    else:
+        def sklearn_fit():
+            model = LinearRegression().fit(x.reshape(-1, 1), y)
+            model.score(x.reshape(-1, 1), y)
+            return model
+        sk_time, model = timed(sklearn_fit)
+        ok = ok and np.isclose(model.coef_[0], stats.slope, rtol=1e-9)
+        print(f'  LinearRegression   {sk_time * 1000:9.1f} ms  (fit + score per request)')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Column profiling: the process pool against one core as workers are added.
+
+Writes a wide generated dataset (see benchmarks.generate) to a columnar
+store once, then profiles every column with profiling.profile_store on 1
+(the calling process), 2, 4, ... up to --max-workers processes. Each pool is
+started and warmed up before it is timed, as the web process keeps its pool
+between uploads. Workers memory-map the stored columns, so only the finished
+profiles cross process boundaries.
+
+Usage: python -m benchmarks.bench_profiling [--rows 200000] [--width 120] [--max-workers 8]
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.common import timed
+from benchmarks.generate import make_dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--width', type=int, default=120)
+    parser.add_argument('--cardinality', type=int, default=1000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    from app import ingest, profiling
+    df = make_dataset(args.rows, args.width, args.cardinality, null_rate=0.01)
+    with tempfile.TemporaryDirectory() as workdir:
+        csv = os.path.join(workdir, 'wide.csv')
+        df.to_csv(csv, index=False)
+        store = csv + '.cols'
+        ingest.ingest_csv(csv, ',', store)
+        print(f'{args.rows:,} rows x {args.width} columns on {os.cpu_count()} cores')
+
+        counts = [1]
+        while counts[-1] * 2 <= args.max_workers:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != args.max_workers and args.max_workers > 1:
+            counts.append(args.max_workers)
+        expected, serial = None, None
+        for workers in counts:
+            profiling.profile_store(store, workers)
+            elapsed, profiles = timed(lambda: profiling.profile_store(store, workers), args.repeat)
+            result = [p.to_dict() for p in profiles]
+            if expected is None:
+                expected, serial = result, elapsed
+            assert result == expected
+            print(f'  {workers:>3} worker(s) {elapsed * 1000:9.1f} ms   {serial / elapsed:5.2f}x')
+        profiling.reset_pool()
+
+
+if __name__ == '__main__':
+    main()
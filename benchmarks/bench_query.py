@@ -0,0 +1,67 @@
+"""Cross-dataset query: /api/query against merging the downloaded CSVs in pandas.
+
+The baseline is what clients had to do before: read both files whole, merge
+and group. The endpoint reads only the key and aggregate columns, streams
+the larger dataset, and with a small --memory budget joins partition by
+partition.
+
+Usage: python -m benchmarks.bench_query [--rows 1000000] [--memory 268435456]
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import make_frame, make_client, upload_frame, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--memory', type=int, default=256 * 1024 * 1024)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    targets = pd.DataFrame({
+        'year': np.repeat(np.arange(1990, 2024), 5),
+        'region': np.tile(['north', 'south', 'east', 'west', 'central'], 34),
+        'target': rng.normal(1000, 100, 170).round(2),
+    })
+    with tempfile.TemporaryDirectory() as workdir:
+        app, client = make_client(workdir, QUERY_MEMORY_BYTES=args.memory)
+        sales_id = upload_frame(client, make_frame(args.rows), 'sales.csv')
+        targets_id = upload_frame(client, targets, 'targets.csv')
+        folder = app.config['UPLOAD_FOLDER']
+        files = sorted(os.listdir(folder))
+        sales_csv = os.path.join(folder, next(f for f in files if f.endswith('sales.csv')))
+        targets_csv = os.path.join(folder, next(f for f in files if f.endswith('targets.csv')))
+        spec = {
+            'datasets': [sales_id, targets_id],
+            'on': ['year', 'region'],
+            'group_by': 'region',
+            'aggregates': [{'func': 'sum', 'column': 'sales'}, {'func': 'mean', 'column': 'target'}],
+        }
+
+        def baseline():
+            merged = pd.read_csv(sales_csv).merge(pd.read_csv(targets_csv), on=['year', 'region'])
+            return merged.groupby('region').agg(sales=('sales', 'sum'), target=('target', 'mean'))
+
+        def endpoint():
+            res = client.post('/api/query', json=spec)
+            assert res.status_code == 200, res.get_json()
+            return res.get_json()
+
+        base_time, expected = timed(baseline, args.repeat)
+        query_time, body = timed(endpoint, args.repeat)
+        assert np.allclose(body['series'][0]['values'], expected['sales'])
+        assert np.allclose(body['series'][1]['values'], expected['target'])
+        print(f'{args.rows:,} x {len(targets)} rows, plan {body["plan"]}')
+        print(f'  read_csv + merge  {base_time * 1000:9.1f} ms')
+        print(f'  /api/query        {query_time * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
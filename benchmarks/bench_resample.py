@@ -0,0 +1,85 @@
+"""Time-series charts: streamed vectorized resampling and binary search on sorted dates.
+
+Resampling streams the stored datetime64 column and bins it with NumPy unit
+casts, against loading the frame and calling DataFrame.resample. A one-week
+range filter on the sorted time column is answered by binary search inside
+the row groups the statistics keep, against a copy of the store with the
+sorted flag cleared, which tests every row of those groups instead.
+
+Usage: python -m benchmarks.bench_resample [--rows 5000000]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import make_client, upload_frame, timed
+
+# pandas offsets giving the same bins as each resample rule
+OFFSETS = {'hour': 'H', 'day': 'D', 'week': 'W-MON', 'month': 'MS'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    seconds = np.sort(rng.integers(0, 3 * 365 * 86400, args.rows))
+    stamps = pd.Timestamp('2021-01-01') + pd.to_timedelta(seconds, unit='s')
+    frame = pd.DataFrame({'time': stamps.strftime('%Y-%m-%d %H:%M:%S'),
+                          'value': rng.normal(100, 15, args.rows).round(3)})
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app, client = make_client(workdir)
+        ds_id = upload_frame(client, frame)
+        from app import db, filters, storage, timeseries
+        from app.models import Dataset
+        with app.app_context():
+            ds = db.session.get(Dataset, ds_id)
+            folder, filename = app.config['UPLOAD_FOLDER'], ds.filename
+            meta = {c['name']: c for c in json.loads(ds.meta_json)['columns']}
+        print(f'{args.rows:,} rows; time stored as {meta["time"]["dtype"]}')
+
+        for rule, offset in OFFSETS.items():
+            def streamed():
+                chunks = storage.iter_columns(folder, filename, ['time', 'value'])
+                return timeseries.resample(((c['time'], c['value']) for c in chunks), rule).mean()
+
+            def with_pandas():
+                df = storage.load_frame(folder, filename, ['time', 'value'])
+                return df.set_index('time')['value'].resample(offset, label='left', closed='left').mean().dropna()
+
+            stream_time, result = timed(streamed, args.repeat)
+            pandas_time, expected = timed(with_pandas, args.repeat)
+            assert np.allclose(result.to_numpy(), expected.to_numpy())
+            print(f'  resample by {rule:<6} load + pandas {pandas_time * 1000:8.1f} ms   '
+                  f'streamed {stream_time * 1000:8.1f} ms   bins {len(result)}')
+
+        # the same store without the sorted flag, so the filter scans each kept group
+        scanned = 'scanned.csv'
+        shutil.copytree(storage.store_path(folder, filename), storage.store_path(folder, scanned))
+        schema_file = os.path.join(storage.store_path(folder, scanned), storage.SCHEMA_FILE)
+        with open(schema_file) as f:
+            schema = json.load(f)
+        for column in schema['columns']:
+            column['sorted'] = False
+        with open(schema_file, 'w') as f:
+            json.dump(schema, f)
+
+        where = filters.parse([{'column': 'time', 'op': 'between',
+                                'value': ['2022-06-01', '2022-06-07T23:59:59']}], meta)
+        scan_time, expected = timed(lambda: storage.load_frame(folder, scanned, ['value'], where), args.repeat)
+        search_time, result = timed(lambda: storage.load_frame(folder, filename, ['value'], where), args.repeat)
+        assert result.equals(expected)
+        print(f'  one-week range        scan {scan_time * 1000:8.1f} ms   '
+              f'binary search {search_time * 1000:8.1f} ms   rows {len(result):,}')
+
+
+if __name__ == '__main__':
+    main()
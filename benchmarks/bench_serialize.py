@@ -0,0 +1,78 @@
+"""Response encoding: bytes on the wire and encode time per chart body.
+
+Compares the old path (per-element Python conversion, then the standard
+library encoder) against NumPy arrays handed to the standard library
+encoder, to orjson and to MessagePack. Also reports the /chart response
+size for each negotiated format.
+
+Usage: python -m benchmarks.bench_serialize [--points 5000]
+"""
+import argparse
+import gzip
+import json
+import tempfile
+
+import numpy as np
+
+from benchmarks.common import make_frame, make_client, upload_frame, timed
+from app import serialize
+
+
+def chart_body(points, seed=0):
+    rng = np.random.default_rng(seed)
+    edges = np.sort(rng.normal(1000, 250, points + 1))
+    counts = rng.integers(0, 10000, points)
+    return edges, counts
+
+
+def old_body(edges, counts):
+    labels = []
+    for i in range(len(edges) - 1):
+        labels.append(f"{edges[i]:.2f}-{edges[i+1]:.2f}")
+    values = [int(count) for count in counts]
+    return {'labels': labels, 'values': values, 'type': 'histogram'}
+
+
+def new_body(edges, counts):
+    text = ['%.2f' % edge for edge in edges.tolist()]
+    labels = [f'{low}-{high}' for low, high in zip(text, text[1:])]
+    return {'labels': labels, 'values': counts, 'type': 'histogram'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, default=5000)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    edges, counts = chart_body(args.points)
+    encoders = [
+        ('loop + json', lambda: json.dumps(old_body(edges, counts)).encode()),
+        ('numpy + json', lambda: json.dumps(new_body(edges, counts), default=serialize.to_builtin).encode()),
+    ]
+    if serialize.orjson is not None:
+        options = serialize.JSONProvider.OPTIONS
+        encoders.append(('numpy + orjson', lambda: serialize.orjson.dumps(
+            new_body(edges, counts), default=serialize.to_builtin, option=options)))
+    if serialize.msgpack is not None:
+        encoders.append(('msgpack', lambda: serialize.packb(new_body(edges, counts))))
+
+    print(f'histogram body, {args.points:,} bins')
+    for label, fn in encoders:
+        elapsed, body = timed(fn, args.repeat)
+        print(f'  {label:<16} {elapsed * 1000:7.2f} ms  {len(body):>9,} B  gzip {len(gzip.compress(body)):>8,} B')
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app, client = make_client(workdir)
+        ds_id = upload_frame(client, make_frame(args.rows))
+        url = f'/api/dataset/{ds_id}/chart?x=sales&type=line&y=units'
+        print(f'/chart line of sales against units, {args.rows:,} rows')
+        for accept in [serialize.JSON, serialize.MSGPACK]:
+            res = client.get(url, headers={'Accept': accept})
+            assert res.status_code == 200
+            print(f'  {res.mimetype:<24} {len(res.data):>9,} B')
+
+
+if __name__ == '__main__':
+    main()
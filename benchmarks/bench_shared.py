@@ -0,0 +1,92 @@
+"""Shared column cache: memory per worker process with and without sharing.
+
+Writes a generated dataset (see benchmarks.generate) to a columnar store
+once, then starts --workers processes that each load every column the way a
+gunicorn worker's frame cache does and touch all values. With sharing off each
+process decodes its own copy; with it on the first process writes the shared
+files and the others map them. Reports how much each process's private memory
+and proportional share (Pss, which splits pages mapped by several processes
+between them) grew over the load, from /proc/self/smaps_rollup, summed over
+the processes, and the time of the fastest load.
+
+Usage: python -m benchmarks.bench_shared [--rows 1000000] [--width 12] [--workers 4]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.common import ROOT  # noqa: F401 - puts the project on sys.path
+from benchmarks.generate import make_dataset
+
+
+def memory():
+    """(private, Pss) bytes of this process"""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return fields['Private_Clean'] + fields['Private_Dirty'], fields['Pss']
+
+
+def worker(root, max_bytes, folder, filename, dtypes, start, results):
+    from app.shared import SharedColumns
+    columns = SharedColumns(root, max_bytes)
+    start.wait()
+    private_before, pss_before = memory()
+    started = time.perf_counter()
+    frame = columns.load_frame(folder, filename, dtypes=dtypes)
+    elapsed = time.perf_counter() - started
+    # touch every value, as serving charts from the frame would
+    frame.isna().sum()
+    start.wait()
+    private, pss = memory()
+    results.put((private - private_before, pss - pss_before, elapsed))
+    # stay alive until every worker has measured, so shared pages stay shared
+    start.wait()
+
+
+def run(root, max_bytes, folder, filename, dtypes, workers):
+    ctx = multiprocessing.get_context('spawn')
+    start, results = ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(root, max_bytes, folder, filename, dtypes, start, results))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    measured = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return measured
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--width', type=int, default=12)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    from app import ingest, storage
+    df = make_dataset(args.rows, args.width, 50, null_rate=0.01)
+    with tempfile.TemporaryDirectory() as workdir:
+        folder = os.path.join(workdir, 'uploads')
+        os.makedirs(folder)
+        csv = os.path.join(folder, 'wide.csv')
+        df.to_csv(csv, index=False)
+        meta = ingest.ingest_csv(csv, ',', storage.store_path(folder, 'wide.csv'))
+        dtypes = {c['name']: c.get('compact_dtype') for c in meta['columns']}
+        root = os.path.join(workdir, 'shared')
+        print(f'{args.rows:,} rows x {args.width} columns, {args.workers} worker processes')
+        for label, max_bytes in (('private copies', 0), ('shared columns', 1024 ** 4)):
+            measured = run(root, max_bytes, folder, 'wide.csv', dtypes, args.workers)
+            private = sum(m[0] for m in measured) / 1e6
+            pss = sum(m[1] for m in measured) / 1e6
+            load = min(m[2] for m in measured) * 1000
+            print(f'  {label:15} private +{private:7.1f} MB  Pss +{pss:7.1f} MB  fastest load {load:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Cold-start cost of the app: import time and time to first response.
+
+Each measurement runs in a fresh interpreter, the way a serverless cold
+start does: once against an empty database (tables are created) and once
+against the database the first run left behind (schema check only).
+Prints the slowest top-level imports from `python -X importtime` and the
+wall time of create_app() and of the first `/` and `/api/datasets`.
+
+Usage: python -m benchmarks.bench_startup [--top 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import ROOT
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + sys.argv[1], 'UPLOAD_FOLDER': sys.argv[2]})
+created = time.perf_counter()
+client = app.test_client()
+assert client.get('/').status_code == 200
+index = time.perf_counter()
+assert client.get('/api/datasets').status_code == 200
+datasets = time.perf_counter()
+print(json.dumps({
+    'create_app': created - start,
+    'first /': index - created,
+    'first /api/datasets': datasets - index,
+    'total': datasets - start,
+    'pandas loaded': 'pandas' in sys.modules,
+    'numpy loaded': 'numpy' in sys.modules,
+}))
+'''
+
+
+def probe(db_path, upload_folder):
+    """Run one cold start; returns its timings and the -X importtime report"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE, db_path, upload_folder],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        # top-level imports have a single space of indentation
+        if name.startswith(' ') and not name.startswith('  '):
+            imports.append((int(cumulative_us), name.strip()))
+    return json.loads(proc.stdout.strip().splitlines()[-1]), sorted(imports, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'startup.db')
+        uploads = os.path.join(workdir, 'uploads')
+        for label in ('empty database', 'existing database'):
+            timings, imports = probe(db_path, uploads)
+            print(label)
+            for key, value in timings.items():
+                print(f'  {key:<22} {value * 1000:8.1f} ms' if isinstance(value, float) else f'  {key:<22} {value}')
+        print('slowest top-level imports (cumulative, last run)')
+        for cumulative_us, name in imports[:args.top]:
+            print(f'  {cumulative_us / 1000:8.1f} ms  {name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""All-columns summary: one blocked pass against pandas and against one pair at a time.
+
+Uploads a generated dataset (see benchmarks.generate) and times
+GET /api/dataset/<id>/summary with the result cache cleared, exact (whole
+column blocks) and streamed (sketched quartiles and ranks). Both are set
+against pandas' describe() plus DataFrame.corr for Pearson and Spearman on
+the loaded frame, and against correlating every pair on its own, which is
+what picking x/y pairs through per-pair requests amounts to.
+
+Usage: python -m benchmarks.bench_summary [--rows 200000] [--width 40]
+"""
+import argparse
+import itertools
+import tempfile
+
+import numpy as np
+
+from benchmarks.common import make_client, timed, upload_bytes
+from benchmarks.generate import make_dataset, to_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--width', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_dataset(args.rows, args.width, 50, null_rate=0.01)
+    with tempfile.TemporaryDirectory() as workdir:
+        app, client = make_client(workdir)
+        ds_id = upload_bytes(client, to_bytes(df), 'summary.csv')
+        from app import db, results, routes
+
+        def summary(exact):
+            routes.frame_cache.invalidate(ds_id)
+            with app.app_context():
+                results.invalidate(ds_id)
+                db.session.commit()
+            res = client.get(f'/api/dataset/{ds_id}/summary?exact={int(exact)}')
+            assert res.status_code == 200
+            return res.get_json()
+
+        exact_time, body = timed(lambda: summary(True), args.repeat)
+        streamed_time, streamed = timed(lambda: summary(False), args.repeat)
+        frame = df[body['columns']].astype(np.float64)
+
+        def with_pandas():
+            return frame.describe(), frame.corr(), frame.corr('spearman')
+
+        def pair_by_pair():
+            for x, y in itertools.combinations(frame.columns, 2):
+                frame[x].corr(frame[y])
+                frame[x].corr(frame[y], method='spearman')
+
+        pandas_time, (_, pearson, spearman) = timed(with_pandas, args.repeat)
+        pairs_time, _ = timed(pair_by_pair, 1)
+        width = len(body['columns'])
+        print(f'{args.rows:,} rows, {width} numeric columns, {width * (width - 1) // 2} pairs')
+        print(f'  summary, exact          {exact_time * 1000:9.1f} ms   '
+              f'max |pearson - pandas| {np.nanmax(np.abs(np.array(body["pearson"], dtype=float) - pearson.to_numpy())):.1e}')
+        print(f'  summary, streamed       {streamed_time * 1000:9.1f} ms   '
+              f'max |spearman - pandas| {np.nanmax(np.abs(np.array(streamed["spearman"], dtype=float) - spearman.to_numpy())):.1e}')
+        print(f'  pandas describe + corr  {pandas_time * 1000:9.1f} ms')
+        print(f'  one pair at a time      {pairs_time * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# allow `python -m benchmarks.<name>` from the project root
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def make_frame(rows, seed=0):
+    """Synthetic sales-like frame with a year, a category and two measures"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'year': rng.integers(1990, 2024, rows),
+        'region': rng.choice(['north', 'south', 'east', 'west', 'central'], rows),
+        'sales': rng.normal(1000, 250, rows).round(2),
+        'units': rng.integers(0, 500, rows),
+    })
+
+
+def timed(fn, repeat=3):
+    """Best-of-N wall time in seconds and the last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def make_client(workdir, **config):
+    """Flask app and test client backed by a scratch database and upload folder"""
+    from app import create_app
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'bench.db'),
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+    }
+    settings.update(config)
+    app = create_app(settings)
+    return app, app.test_client()
+
+
+def upload_frame(client, df, name='bench.csv'):
+    """Upload a DataFrame as CSV, wait for the ingest job and return the dataset id"""
+    return upload_bytes(client, df.to_csv(index=False).encode(), name)
+
+
+def upload_bytes(client, data, name):
+    """Upload a CSV or TSV file's bytes, wait for the ingest job and return the dataset id"""
+    import io
+    import time
+    files = {'file': (io.BytesIO(data), name)}
+    res = client.post('/api/upload', data=files, content_type='multipart/form-data')
+    if res.status_code != 202:
+        raise RuntimeError(f'upload failed: {res.status_code} {res.get_data(as_text=True)[:200]}')
+    job = res.get_json()['job']
+    while job['status'] in ('queued', 'running'):
+        time.sleep(0.05)
+        job = client.get(f'/api/jobs/{job["id"]}').get_json()
+    if job['status'] != 'succeeded':
+        raise RuntimeError(f'upload job {job["status"]}: {job["error"]}')
+    return job['result']['dataset']['id']
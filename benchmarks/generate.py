@@ -0,0 +1,70 @@
+"""Synthetic CSV/TSV datasets of a chosen size, width, cardinality and null rate.
+
+Columns: a row id, a date, then categorical, integer and float columns in
+turn until the requested width is reached. Every column but the id has
+the given share of missing values. The same seed gives the same file.
+
+Usage: python -m benchmarks.generate out.csv [--rows 100000] [--width 8]
+       [--cardinality 50] [--null-rate 0.01] [--seed 0]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+MIN_WIDTH = 5
+
+
+def make_dataset(rows, width=8, cardinality=50, null_rate=0.0, seed=0):
+    """DataFrame with an id, a date and width - 2 mixed columns"""
+    if width < MIN_WIDTH:
+        raise ValueError(f'width must be at least {MIN_WIDTH}')
+    rng = np.random.default_rng(seed)
+    data = {
+        'id': np.arange(rows),
+        'date': (np.datetime64('2000-01-01') + rng.integers(0, 365 * 25, rows)).astype(str),
+    }
+    labels = np.array([f'c{i:04d}' for i in range(cardinality)], dtype=object)
+    for i in range(width - 2):
+        kind = ('cat', 'int', 'num')[i % 3]
+        name = f'{kind}{i // 3}'
+        if kind == 'cat':
+            # skewed category frequencies, like real group-by keys
+            weights = 1.0 / np.arange(1, cardinality + 1)
+            data[name] = labels[rng.choice(cardinality, rows, p=weights / weights.sum())]
+        elif kind == 'int':
+            data[name] = rng.integers(0, 1000, rows)
+        else:
+            data[name] = rng.normal(1000, 250, rows).round(3)
+    df = pd.DataFrame(data)
+    if null_rate > 0:
+        for name in df.columns[1:]:
+            missing = rng.random(rows) < null_rate
+            # integers with gaps are read back as floats, the same as a real export
+            df[name] = df[name].where(~missing)
+    return df
+
+
+def to_bytes(df, sep=','):
+    return df.to_csv(index=False, sep=sep).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='output file; a .tsv suffix writes tab-separated values')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--width', type=int, default=8)
+    parser.add_argument('--cardinality', type=int, default=50)
+    parser.add_argument('--null-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = make_dataset(args.rows, args.width, args.cardinality, args.null_rate, args.seed)
+    sep = '\t' if args.path.lower().endswith('.tsv') else ','
+    with open(args.path, 'wb') as f:
+        f.write(to_bytes(df, sep))
+    print(f'wrote {args.rows:,} rows x {args.width} columns to {args.path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""Benchmark every API route on a synthetic dataset, with baseline comparison.
+
+Generates a dataset (see benchmarks.generate), uploads it through the Flask
+test client and times preview, every chart type and aggregation, the batch
+charts call, predict, analyze, a filtered chart, a cross-dataset query and
+delete. Each operation runs --repeat times "cold" (frame and result caches
+cleared, stored group summaries kept as after an upload) and once "warm"
+(served from the result cache).
+
+Results are written as JSON: latency (median, p95, min), rows per second
+over the cold median, process peak RSS after the operation and the
+Server-Timing phases of the last cold run. --compare flags operations whose
+cold median grew by more than --threshold over a saved run and exits with
+status 1 when any did.
+
+Usage: python -m benchmarks.suite [--rows 200000] [--width 8] [--cardinality 50]
+       [--null-rate 0.01] [--format csv] [--repeat 5] [--output run.json]
+       [--compare baseline.json] [--threshold 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.common import make_client, upload_bytes
+from benchmarks.generate import make_dataset, to_bytes
+
+# differences below this many milliseconds are never reported as regressions
+NOISE_MS = 2.0
+
+
+def peak_rss_bytes():
+    from app import metrics
+    return metrics.peak_rss_bytes()
+
+
+def server_timing(header):
+    """{phase: milliseconds} from a Server-Timing header"""
+    phases = {}
+    for part in filter(None, (p.strip() for p in (header or '').split(','))):
+        name, _, duration = part.partition(';dur=')
+        if duration:
+            phases[name] = float(duration)
+    return phases
+
+
+def summarise(times):
+    times = np.asarray(times) * 1000
+    return {'median': float(np.median(times)), 'p95': float(np.percentile(times, 95)),
+            'min': float(times.min()), 'runs': len(times)}
+
+
+def operations(ds_id, dim_id, rows):
+    """(name, method, url, json body) for every timed request on the dataset"""
+    base = f'/api/dataset/{ds_id}'
+    ops = [
+        ('datasets', 'GET', '/api/datasets', None),
+        ('columns', 'GET', f'{base}/columns', None),
+        ('preview:first', 'GET', f'{base}/preview?offset=0&limit=200', None),
+        ('preview:deep', 'GET', f'{base}/preview?offset={max(rows - 200, 0)}&limit=200', None),
+    ]
+    for chart_type, x in (('bar', 'cat0'), ('line', 'int0'), ('pie', 'cat0')):
+        for agg in ('mean', 'sum'):
+            ops.append((f'chart:{chart_type}:{agg}', 'POST', f'{base}/chart',
+                        {'x': x, 'y': 'num0', 'type': chart_type, 'agg': agg}))
+    ops += [
+        ('chart:pie:counts', 'POST', f'{base}/chart', {'x': 'cat0', 'type': 'pie'}),
+        ('chart:histogram', 'POST', f'{base}/chart', {'x': 'num0', 'type': 'histogram'}),
+        ('chart:bar:filtered', 'POST', f'{base}/chart',
+         {'x': 'cat0', 'y': 'num0', 'type': 'bar',
+          'filters': [{'column': 'date', 'op': 'between', 'value': ['2010-01-01', '2014-12-31']}]}),
+        ('charts', 'POST', f'{base}/charts',
+         {'charts': [{'x': 'cat0', 'y': 'num0', 'type': t} for t in ('bar', 'line', 'pie')]
+          + [{'x': 'num0', 'type': 'histogram'}]}),
+        ('predict', 'POST', f'{base}/predict', {'x': 'int0', 'y': 'num0', 'years': 5}),
+        ('analyze', 'POST', f'{base}/analyze', {'x': 'int0', 'y': 'num0'}),
+        ('query', 'POST', '/api/query',
+         {'datasets': [ds_id, dim_id], 'on': 'cat0', 'group_by': 'cat0',
+          'aggregates': [{'func': 'sum', 'column': {'dataset': ds_id, 'column': 'num0'}},
+                         {'func': 'max', 'column': 'weight'}]}),
+    ]
+    return ops
+
+
+def run(args):
+    df = make_dataset(args.rows, args.width, args.cardinality, args.null_rate, args.seed)
+    sep = '\t' if args.format == 'tsv' else ','
+    data = to_bytes(df, sep)
+    dim = df[['cat0']].dropna().drop_duplicates()
+    dim = dim.assign(weight=np.arange(len(dim), dtype=np.float64))
+    results = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app, client = make_client(workdir, JOBS_INLINE=False)
+        from app import db, results as result_cache, routes
+
+        started = time.perf_counter()
+        ds_id = upload_bytes(client, data, f'suite.{args.format}')
+        elapsed = time.perf_counter() - started
+        results.append({
+            'name': 'upload', 'cold_ms': summarise([elapsed]), 'warm_ms': None,
+            'rows_per_s': args.rows / elapsed, 'bytes_per_s': len(data) / elapsed,
+            'peak_rss_bytes': peak_rss_bytes(), 'phases': {},
+        })
+        dim_id = upload_bytes(client, dim.to_csv(index=False).encode(), 'suite_dim.csv')
+
+        def clear():
+            routes.frame_cache.invalidate(ds_id)
+            routes.frame_cache.invalidate(dim_id)
+            with app.app_context():
+                result_cache.invalidate(ds_id)
+                db.session.commit()
+
+        for name, method, url, body in operations(ds_id, dim_id, args.rows):
+            cold, phases = [], {}
+            for _ in range(args.repeat):
+                clear()
+                started = time.perf_counter()
+                res = client.open(url, method=method, json=body)
+                cold.append(time.perf_counter() - started)
+                if res.status_code != 200:
+                    raise RuntimeError(f'{name}: {res.status_code} {res.get_data(as_text=True)[:200]}')
+                phases = server_timing(res.headers.get('Server-Timing'))
+            started = time.perf_counter()
+            client.open(url, method=method, json=body)
+            warm = time.perf_counter() - started
+            cold_ms = summarise(cold)
+            results.append({
+                'name': name, 'cold_ms': cold_ms, 'warm_ms': summarise([warm]),
+                'rows_per_s': args.rows / (cold_ms['median'] / 1000),
+                'peak_rss_bytes': peak_rss_bytes(), 'phases': phases,
+            })
+            print(f'  {name:<22} cold {cold_ms["median"]:9.1f} ms  warm {warm * 1000:8.1f} ms', file=sys.stderr)
+
+        started = time.perf_counter()
+        res = client.delete(f'/api/dataset/{ds_id}')
+        elapsed = time.perf_counter() - started
+        assert res.status_code == 200
+        results.append({'name': 'delete', 'cold_ms': summarise([elapsed]), 'warm_ms': None,
+                        'rows_per_s': None, 'peak_rss_bytes': peak_rss_bytes(), 'phases': {}})
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(current, baseline, threshold):
+    """Print each operation against the baseline; returns the names that regressed"""
+    before = {r['name']: r for r in baseline['results']}
+    regressed = []
+    print(f'{"operation":<22} {"baseline":>10} {"current":>10} {"change":>8}')
+    for result in current['results']:
+        old = before.get(result['name'])
+        if old is None:
+            print(f'{result["name"]:<22} {"-":>10} {result["cold_ms"]["median"]:10.1f}      new')
+            continue
+        was, now = old['cold_ms']['median'], result['cold_ms']['median']
+        change = now / was - 1 if was else 0.0
+        flag = change > threshold and now - was > NOISE_MS
+        if flag:
+            regressed.append(result['name'])
+        print(f'{result["name"]:<22} {was:10.1f} {now:10.1f} {change:+7.0%}{"  REGRESSION" if flag else ""}')
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--width', type=int, default=8)
+    parser.add_argument('--cardinality', type=int, default=50)
+    parser.add_argument('--null-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=('csv', 'tsv'), default='csv')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='saved results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='flag a cold median this much slower than the baseline (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    current = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'at': datetime.utcnow().isoformat(),
+            'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'threshold')},
+        },
+        'results': run(args),
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    else:
+        json.dump(current, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['meta']['config'] != current['meta']['config']:
+            print('warning: baseline was run with a different configuration', file=sys.stderr)
+        regressed = compare(current, baseline, args.threshold)
+        if regressed:
+            print(f'{len(regressed)} regression(s): {", ".join(regressed)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
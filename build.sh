@@ -5,21 +5,11 @@ set -e  # Exit on error
 
 echo "Starting build process..."
 
-# Install system dependencies for scikit-learn
-echo "Installing system dependencies..."
-apt-get update && apt-get install -y \
-    build-essential \
-    gfortran \
-    libatlas-base-dev \
-    liblapack-dev \
-    libblas-dev \
-    || echo "System dependencies might already be installed"
-
 # Upgrade pip and install build tools
 echo "Upgrading pip and build tools..."
 pip install --upgrade pip setuptools wheel
 
-# Install numpy first (required by scikit-learn)
+# Install numpy first (pandas builds against it)
 echo "Installing numpy..."
 pip install numpy==1.24.3
 
@@ -0,0 +1,36 @@
+import io
+import os
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def client(tmp_path_factory):
+    """Test client of one app for the whole session, on a scratch database and upload folder
+
+    Routes register on the first app a process creates, so the tests share it.
+    """
+    from app import create_app
+    workdir = str(tmp_path_factory.mktemp('app'))
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'test.db'),
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'JOBS_INLINE': True,
+        'PROFILING_WORKERS': 0,
+        'SHARED_CACHE_BYTES': 0,
+    })
+    return app.test_client()
+
+
+def upload(client, data, name='data.csv'):
+    """Upload CSV bytes; jobs run inline, so the dataset exists once this returns its id"""
+    return upload_dataset(client, data, name)['id']
+
+
+def upload_dataset(client, data, name='data.csv'):
+    """Upload CSV bytes and return the new dataset as the upload job recorded it"""
+    res = client.post('/api/upload', data={'file': (io.BytesIO(data), name)}, content_type='multipart/form-data')
+    assert res.status_code == 202
+    job = res.get_json()['job']
+    assert job['status'] == 'succeeded', job['error']
+    return job['result']['dataset']
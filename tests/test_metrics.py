@@ -0,0 +1,20 @@
+from app import metrics
+
+
+def test_rss_growth_counts_memory_freed_before_the_end():
+    # a request that grew the process peak by 50 but freed it all again
+    assert metrics.rss_growth(100, 100, 200, 250) == 50
+    # one still holding 30 at the end, under the earlier peak
+    assert metrics.rss_growth(100, 130, 300, 300) == 30
+    assert metrics.rss_growth(100, 90, 300, 300) == 0
+    assert metrics.rss_growth(None, None, None, None) is None
+
+
+def test_render_keeps_peak_rss_per_process():
+    registry = metrics.Registry()
+    recorder = registry.start('/api/datasets', 'GET')
+    registry.finish(recorder, 200)
+    lines = registry.render().splitlines()
+    assert any(line.startswith('csvvis_request_rss_growth_bytes{route="/api/datasets"} ') for line in lines)
+    peaks = [line for line in lines if line.startswith('csvvis_process_peak_rss_bytes')]
+    assert len(peaks) == 1 and '{' not in peaks[0]
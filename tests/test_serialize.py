@@ -0,0 +1,24 @@
+import msgpack
+
+from app import serialize
+from conftest import upload
+
+CSV = b'region,sales\nnorth,1.5\nsouth,2\nnorth,3.25\neast,\n'
+
+
+def test_msgpack_is_installed():
+    # requirements.txt pins msgpack; without it negotiation silently falls back to JSON
+    assert serialize.msgpack is not None
+
+
+def test_chart_negotiates_msgpack(client):
+    ds_id = upload(client, CSV)
+    url = f'/api/dataset/{ds_id}/chart?x=region&y=sales&type=bar'
+    as_json = client.get(url, headers={'Accept': serialize.JSON})
+    as_msgpack = client.get(url, headers={'Accept': 'application/x-msgpack, application/json;q=0.9'})
+    assert as_json.mimetype == serialize.JSON
+    assert as_msgpack.mimetype == serialize.MSGPACK
+    assert 'Accept' in as_msgpack.vary
+    body = msgpack.unpackb(as_msgpack.data, raw=False)
+    assert body == as_json.get_json()
+    assert body['labels'] == ['east', 'north', 'south']
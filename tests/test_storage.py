@@ -0,0 +1,57 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from app import blobs, ingest, storage
+
+ROWS = 2500
+# rows on both sides of the row index's stride boundaries
+OFFSETS = [0, 1, 997, 998, 999, 1000, 1001, 1998, 1999, 2000, 2001, ROWS - 2]
+
+
+def csv_bytes():
+    """CRLF CSV with quoted embedded newlines and a blank line inside the first indexed block"""
+    lines = ['id,label,value']
+    for i in range(ROWS):
+        label = f'"line one\r\nline two {i}"' if i % 7 == 0 else f'plain {i}'
+        lines.append(f'{i},{label},{i * 0.5}')
+        if i == 500:
+            lines.append('')
+    return ('\r\n'.join(lines) + '\r\n').encode()
+
+
+@pytest.fixture(params=['plain', 'compressed'])
+def upload(request, tmp_path):
+    """(upload folder, file name) of the CSV ingested with its row index"""
+    folder = str(tmp_path)
+    data = csv_bytes()
+    if request.param == 'plain':
+        filename, members = 'data.csv', None
+        with open(os.path.join(folder, filename), 'wb') as f:
+            f.write(data)
+    else:
+        tmp, filename, members = blobs.save(io.BytesIO(data), folder, 'csv')
+        os.replace(tmp, os.path.join(folder, filename))
+    path = os.path.join(folder, filename)
+    ingest.ingest_csv(path, ',', storage.store_path(folder, filename), members=members)
+    return folder, filename
+
+
+@pytest.mark.parametrize('offset', OFFSETS)
+def test_read_rows_matches_pandas(upload, offset):
+    folder, filename = upload
+    expected = pd.read_csv(os.path.join(folder, filename)).iloc[offset:offset + 3].reset_index(drop=True)
+    assert storage.read_row_index(storage.store_path(folder, filename)) is not None
+    got = storage.read_rows(folder, filename, offset, 3)
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('offset', [0, 999, 1000, ROWS - 2])
+def test_read_rows_without_index_matches_pandas(upload, offset):
+    folder, filename = upload
+    storage.remove_store(storage.store_path(folder, filename))
+    expected = pd.read_csv(os.path.join(folder, filename)).iloc[offset:offset + 3].reset_index(drop=True)
+    got = storage.read_rows(folder, filename, offset, 3)
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
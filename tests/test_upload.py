@@ -0,0 +1,25 @@
+from conftest import upload_dataset
+
+CSV = b'city,temp\nOslo,3.5\nLima,18\nOslo,4\n'
+
+
+def test_same_content_shares_one_blob(client):
+    first = upload_dataset(client, CSV, 'first.csv')
+    second = upload_dataset(client, CSV, 'second.csv')
+    assert first['filename'] == second['filename']
+    assert first['filename'].endswith('.csv.gz')
+    assert second['rows'] == first['rows'] == 3
+
+
+def test_download_is_the_uploaded_csv(client):
+    ds = upload_dataset(client, CSV + b'Rome,12\n', 'weather.csv')
+    res = client.get(f"/uploads/{ds['filename']}")
+    assert res.status_code == 200
+    assert res.mimetype == 'text/csv'
+    assert 'Content-Encoding' not in res.headers
+    assert 'filename="weather.csv"' in res.headers['Content-Disposition']
+    assert res.data == CSV + b'Rome,12\n'
+
+
+def test_only_dataset_files_are_served(client):
+    assert client.get('/uploads/.locks/0.lock').status_code == 404